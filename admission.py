@@ -0,0 +1,221 @@
+import asyncio
+import itertools
+import random
+import threading
+import time
+
+# --- ADMISSION CONTROL ---
+# Process-wide gate in front of the providers. At most MAX_RUNNING requests hold a slot;
+# the rest wait in a bounded queue ordered by start-time fair queueing: every tool has a
+# weight, so short purity checks overtake a backlog of essay sections without starving them.
+# While others are waiting, a session runs at most SESSION_RUNNING requests at once (an idle
+# server still lets one user's essay sections all run), and it may queue SESSION_QUEUED, so one
+# heavy user cannot take every slot. Requests are only turned away when the queue is full
+# or a request has waited longer than its timeout.
+
+MAX_RUNNING = 64
+MAX_QUEUE = 512
+SESSION_RUNNING = 2
+SESSION_QUEUED = 8
+QUEUE_TIMEOUT = 90
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 8.0
+RETRY_LIMIT = 4
+SERVICE_GUESS = 5.0
+DEFAULT_WEIGHT = 2
+TOOL_WEIGHTS = {"Nirmal-Bhasha": 4, "Bhasha-Vivek": 3, "Patra-Lekhak": 2, "Nibandh-Lekhan": 1}
+
+QUEUED, RUNNING, RETRYING, DONE = "queued", "running", "retrying", "done"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Ticket:
+    def __init__(self, session, tool, tag, seq, deadline):
+        self.session = session
+        self.tool = tool
+        self.tag = tag
+        self.seq = seq
+        self.deadline = deadline
+        self.state = None
+        self.queued_at = None
+        self.started_at = None
+        self.future = None
+        self.loop = None
+        self.retries = 0
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class AdmissionController:
+    def __init__(self, max_running=MAX_RUNNING, max_queue=MAX_QUEUE, session_running=SESSION_RUNNING,
+                 session_queued=SESSION_QUEUED, timeout=QUEUE_TIMEOUT, weights=None):
+        self.max_running = max_running
+        self.max_queue = max_queue
+        self.session_running = session_running
+        self.session_queued = session_queued
+        self.timeout = timeout
+        self.weights = dict(TOOL_WEIGHTS, **(weights or {}))
+        self._queue = []
+        self._running = 0
+        self._sessions = {}  # session -> [running, queued]
+        self._finish = {}  # tool -> finish tag of its last request
+        self._virtual = 0.0
+        self._service = None  # moving average of seconds a request holds its slot
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.stats = {"admitted": 0, "queued": 0, "retries": 0, "rejected": 0, "timeouts": 0, "wait_seconds": 0.0}
+
+    # Called with the lock held
+    def _counts(self, session):
+        return self._sessions.setdefault(session, [0, 0])
+
+    def _can_start(self, ticket, fair=True):
+        return self._running < self.max_running and (
+            not fair or ticket.session is None or self._counts(ticket.session)[0] < self.session_running)
+
+    def _start(self, ticket):
+        if ticket.state == QUEUED:
+            self._queue.remove(ticket)
+            if ticket.session is not None:
+                self._counts(ticket.session)[1] -= 1
+            self.stats["wait_seconds"] += time.monotonic() - ticket.queued_at
+        ticket.state, ticket.started_at = RUNNING, time.monotonic()
+        self._running += 1
+        if ticket.session is not None:
+            self._counts(ticket.session)[0] += 1
+        self._virtual = max(self._virtual, ticket.tag)
+        self.stats["admitted"] += 1
+
+    def _dispatch(self):
+        # Sessions under their share first, then (if slots are still free) anyone, in tag order
+        for fair in (True, False):
+            for ticket in sorted(self._queue, key=lambda t: (t.tag, t.seq)):
+                if self._running >= self.max_running:
+                    return
+                if self._can_start(ticket, fair):
+                    self._start(ticket)
+                    ticket.loop.call_soon_threadsafe(_wake, ticket.future)
+
+    def _forget(self, session):
+        counts = self._sessions.get(session)
+        if counts == [0, 0]:
+            del self._sessions[session]
+
+    def _enqueue(self, ticket):
+        if len(self._queue) >= self.max_queue:
+            raise QueueFull(f"{len(self._queue)} requests already waiting")
+        if ticket.session is not None and self._counts(ticket.session)[1] >= self.session_queued:
+            raise QueueFull("Too many requests from this session")
+        ticket.state, ticket.queued_at = QUEUED, time.monotonic()
+        ticket.loop = asyncio.get_running_loop()
+        ticket.future = ticket.loop.create_future()
+        self._queue.append(ticket)
+        if ticket.session is not None:
+            self._counts(ticket.session)[1] += 1
+        self.stats["queued"] += 1
+
+    def new_ticket(self, session, tool, timeout=None):
+        with self._lock:
+            # Start-time fair queueing: a tool's next request starts where its previous one finished,
+            # and each request advances the tool's clock by 1/weight
+            start = max(self._virtual, self._finish.get(tool, 0.0))
+            self._finish[tool] = start + 1.0 / self.weights.get(tool, DEFAULT_WEIGHT)
+            return Ticket(session, tool, start, next(self._seq), time.monotonic() + (timeout or self.timeout))
+
+    async def acquire(self, ticket):
+        # Returns once the ticket holds a slot; raises QueueFull when it cannot get one in time
+        with self._lock:
+            # Nobody is waiting means nobody is treated unfairly; otherwise a newcomer under its
+            # session's share may not jump over an earlier request that could run
+            fair = bool(self._queue)
+            ahead = any((t.tag, t.seq) < (ticket.tag, ticket.seq) and self._can_start(t) for t in self._queue)
+            if not ahead and self._can_start(ticket, fair):
+                self._start(ticket)
+                return ticket
+            try:
+                self._enqueue(ticket)
+            except QueueFull:
+                self.stats["rejected"] += 1
+                self._forget(ticket.session)
+                raise
+            # Free slots nobody under their share could use go to the queue right away
+            self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), ticket.remaining())
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if ticket.state == QUEUED:
+                    self._queue.remove(ticket)
+                    if ticket.session is not None:
+                        self._counts(ticket.session)[1] -= 1
+                        self._forget(ticket.session)
+                    ticket.state = DONE
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.stats["timeouts"] += 1
+                        raise QueueFull("Waited too long for a free slot")
+                    raise
+            # Admitted at the same moment: keep the slot unless the caller was cancelled
+            if isinstance(e, asyncio.CancelledError):
+                self.release(ticket)
+                raise
+        return ticket
+
+    def release(self, ticket):
+        with self._lock:
+            if ticket.state != RUNNING:
+                return
+            ticket.state = DONE
+            self._running -= 1
+            if ticket.session is not None:
+                self._counts(ticket.session)[0] -= 1
+                self._forget(ticket.session)
+            held = time.monotonic() - ticket.started_at
+            self._service = held if self._service is None else 0.9 * self._service + 0.1 * held
+            self._dispatch()
+
+    async def retry(self, ticket, retry_after=None, delay=RETRY_DELAY, limit=RETRY_LIMIT):
+        # Providers were busy: give the slot back, wait, and queue again keeping the original
+        # place. The wait is capped exponential backoff with full jitter, so requests throttled
+        # together do not come back together, and never shorter than the provider's Retry-After.
+        # An outage still ends in the fallback after `limit` tries or once the ticket runs out of time.
+        self.release(ticket)
+        with self._lock:
+            ticket.state = RETRYING
+            ticket.retries += 1
+            self.stats["retries"] += 1
+        delay = random.uniform(0, min(MAX_RETRY_DELAY, delay * 2 ** (ticket.retries - 1)))
+        if retry_after:
+            delay += retry_after
+        if ticket.retries > limit or ticket.remaining() <= delay:
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise QueueFull("Providers stayed busy")
+        await asyncio.sleep(delay)
+        return await self.acquire(ticket)
+
+    def describe(self, ticket):
+        # Queue position (1 = next) and a rough wait estimate, or None once the ticket is not waiting
+        with self._lock:
+            if ticket is None or ticket.state not in (QUEUED, RETRYING):
+                return None
+            position = 1 + sum(1 for t in self._queue if (t.tag, t.seq) < (ticket.tag, ticket.seq))
+            service = SERVICE_GUESS if self._service is None else self._service
+            return {"position": position, "eta": round(position * service / self.max_running + 0.5),
+                    "waiting": len(self._queue)}
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, running=self._running, waiting=len(self._queue),
+                         avg_service_seconds=round(self._service or 0.0, 2))
+        wait = stats.pop("wait_seconds")
+        stats["avg_wait_seconds"] = round(wait / stats["queued"], 2) if stats["queued"] else 0.0
+        return stats
@@ -0,0 +1,160 @@
+import glob
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from storage import connect
+from feedback_store import FEEDBACK_FILE
+
+# --- DASHBOARD ANALYTICS ---
+# Incremental per-engine latency aggregates and a Parquet archive of feedback
+# history, so the Admin Dashboard reads small summaries instead of raw logs.
+
+ARCHIVE_DIR = "feedback_archive"
+NEGATIVE_RATINGS = ("Negative", "😞 Bad")
+FLUSH_INTERVAL = 5
+
+
+class EngineStats:
+    # Calls are summed in memory and flushed to SQLite every few seconds
+    def __init__(self, path=FEEDBACK_FILE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._buffer = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._init_db()
+
+    def _db(self):
+        return connect(self.path)
+
+    def _init_db(self):
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS engine_daily ("
+            "day TEXT NOT NULL, engine TEXT NOT NULL, calls INTEGER NOT NULL, errors INTEGER NOT NULL, "
+            "total_ms REAL NOT NULL, max_ms REAL NOT NULL, PRIMARY KEY (day, engine))"
+        )
+
+    def record(self, engine, seconds, ok=True):
+        ms = seconds * 1000
+        key = (date.today().isoformat(), engine)
+        with self._lock:
+            calls, errors, total_ms, max_ms = self._buffer.get(key, (0, 0, 0.0, 0.0))
+            self._buffer[key] = (calls + 1, errors + (0 if ok else 1), total_ms + ms, max(max_ms, ms))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="engine-stats", daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+        if not buffer:
+            return
+        self._db().executemany(
+            "INSERT INTO engine_daily (day, engine, calls, errors, total_ms, max_ms) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (day, engine) DO UPDATE SET calls = calls + excluded.calls, errors = errors + excluded.errors, "
+            "total_ms = total_ms + excluded.total_ms, max_ms = MAX(max_ms, excluded.max_ms)",
+            [key + value for key, value in buffer.items()],
+        )
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def summary(self, days=30):
+        since = (date.today() - timedelta(days=days)).isoformat()
+        return self._db().execute(
+            "SELECT engine, SUM(calls), SUM(errors), SUM(total_ms) / SUM(calls), MAX(max_ms) "
+            "FROM engine_daily WHERE day >= ? GROUP BY engine ORDER BY engine",
+            (since,),
+        ).fetchall()
+
+
+def feedback_summary(store, days=30):
+    since = (date.today() - timedelta(days=days)).isoformat()
+    rows = store.daily_counts(since)
+    total = sum(r[3] for r in rows)
+    negative = sum(r[3] for r in rows if r[2] in NEGATIVE_RATINGS)
+    today = date.today().isoformat()
+    return {
+        "rows": rows,
+        "total": total,
+        "negative": negative,
+        "negative_rate": round(negative / total, 3) if total else 0.0,
+        "today": sum(r[3] for r in rows if r[0] == today),
+    }
+
+
+# --- PARQUET ARCHIVE (needs pyarrow) ---
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _archived_upto(archive_dir):
+    marker = os.path.join(archive_dir, "_archived_upto")
+    try:
+        with open(marker) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def archive_feedback(store, archive_dir=ARCHIVE_DIR, batch=50000):
+    # Appends rows not yet archived as new Parquet parts partitioned by day
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(archive_dir, exist_ok=True)
+    last_id, archived = _archived_upto(archive_dir), 0
+    while True:
+        rows = store.rows_after(last_id, batch)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        table = pa.table({
+            "id": pa.array(columns[0], pa.int64()),
+            "created": columns[1], "day": columns[2], "tool": columns[3], "rating": columns[4],
+            "user_input": columns[5], "ai_output": columns[6], "comment": columns[7],
+        })
+        pq.write_to_dataset(
+            table, archive_dir, partition_cols=["day"],
+            basename_template=f"part-{rows[0][0]}-{{i}}.parquet", compression="zstd",
+        )
+        last_id = rows[-1][0]
+        archived += len(rows)
+        tmp = os.path.join(archive_dir, "_archived_upto.tmp")
+        with open(tmp, "w") as f:
+            f.write(str(last_id))
+        os.replace(tmp, os.path.join(archive_dir, "_archived_upto"))
+    return archived
+
+
+def scan_archive(archive_dir=ARCHIVE_DIR, tool=None, rating=None, since=None, until=None, columns=None, limit=None):
+    # Filtered scan with partition pruning on day and predicate pushdown on tool/rating
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if not glob.glob(os.path.join(archive_dir, "day=*")):
+        return None
+    partitioning = ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive")
+    dataset = ds.dataset(archive_dir, format="parquet", partitioning=partitioning, exclude_invalid_files=True)
+    filters = []
+    if tool: filters.append(ds.field("tool") == tool)
+    if rating: filters.append(ds.field("rating") == rating)
+    if since: filters.append(ds.field("day") >= str(since)[:10])
+    if until: filters.append(ds.field("day") < str(until)[:10])
+    condition = None
+    for expr in filters:
+        condition = expr if condition is None else condition & expr
+    scanner = dataset.scanner(columns=columns, filter=condition)
+    table = scanner.head(limit) if limit else scanner.to_table()
+    return table.to_pandas()
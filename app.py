@@ -1,5 +1,5 @@
 import streamlit as st
-from utils import show_header, get_daily_word, save_subscriber
+from utils import show_header, get_daily_word, save_subscriber, is_valid_email
 
 # --- PAGE CONFIG ---
 st.set_page_config(page_title="ShabdaSankalan Home", page_icon="🪷", layout="centered")
@@ -15,12 +15,14 @@ with st.sidebar:
     
     # 2. LEAD MAGNET (Hormozi Style)
     st.markdown("### 🎁 Free Gift")
-    st.caption("Get the **'100 Most Powerful Hindi Words'** PDF directly in your inbox.")
+    st.caption("Subscribe for the **'100 Most Powerful Hindi Words'** PDF, sent out with our subscriber mailings.")
     email = st.text_input("Enter Email:", placeholder="name@example.com")
-    if st.button("Send me the PDF 📥"):
-        if email and "@" in email:
-            save_subscriber(email)
-            st.success("Success! Check your inbox soon.")
+    if st.button("Subscribe 📥"):
+        if is_valid_email(email):
+            if save_subscriber(email):
+                st.success("You're subscribed! The PDF goes out to new subscribers with our next mailing.")
+            else:
+                st.info("This email is already subscribed.")
         else:
             st.error("Please enter a valid email.")
             
@@ -0,0 +1,142 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+
+# --- HEADLESS BATCH RUNNER ---
+# Streams a JSONL/CSV file through one of the tools and appends JSONL results as they finish.
+# The output file doubles as the checkpoint: re-running the same command skips finished ids and
+# runs records that failed (error or fallback) again, so the last row for an id is the one that counts.
+#
+#   python batch.py submissions.jsonl -o results.jsonl --tool nirmal --engine "Llama 3.3 (via Groq)" -c 8
+#
+# Keys come from .streamlit/secrets.toml or the same names as environment variables.
+
+TOOLS = {
+    "nirmal": "Nirmal-Bhasha",
+    "vivek": "Bhasha-Vivek",
+    "nibandh": "Nibandh-Lekhan",
+}
+
+
+def read_records(path, text_field):
+    # Yields (line_number, record) without loading the whole file
+    handle = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if path.lower().endswith(".csv"):
+            for n, row in enumerate(csv.DictReader(handle), 1):
+                yield n, row
+        else:
+            for n, line in enumerate(handle, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                yield n, record if isinstance(record, dict) else {text_field: record}
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def load_done_ids(output_path):
+    # Drops a half-written last line left by a crash, then returns the ids already finished;
+    # rows with an error or a fallback are not finished, so a resumed run retries them
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[: data.rfind(b"\n") + 1]
+    for line in data.decode("utf-8").splitlines():
+        try:
+            row = json.loads(line)
+            if not row.get("error") and not row.get("fallback"):
+                done.add(str(row["id"]))
+        except (ValueError, KeyError, AttributeError):
+            continue
+    return done
+
+
+def run_tool(tool, record, text_field, engine):
+    text = str(record.get(text_field) or "")
+    reading = utils.prepare_input(text)[0] if tool in ("nirmal", "vivek") else text
+    if tool == "nirmal":
+        scan = utils.scan_purity(reading)
+        if engine == "offline":
+            return {"purity_score": scan["purity_score"], "output": utils.build_purity_report(scan)}
+        # The report is scored by this same scan, long documents included
+        return {"purity_score": scan["purity_score"], "output": utils.analyze_purity(text, engine, scan=scan)}
+    if tool == "vivek":
+        return {"output": utils.get_ai_response(utils.build_vivek_prompt(reading), text, engine, tool=TOOLS[tool], key_text=reading)}
+    return {"output": utils.compose_essay(
+        text, record.get("level", "College"), record.get("style", "Analytical"), record.get("length", "Medium (500)"),
+        record.get("key_points", ""), engine,
+    )}
+
+
+def run_batch(input_path, output_path, tool="nirmal", engine="Llama 3.3 (via Groq)", concurrency=4,
+              text_field=None, id_field="id", log=print):
+    text_field = text_field or ("topic" if tool == "nibandh" else "text")
+    done = load_done_ids(output_path)
+    lock = threading.Lock()
+    # Bounds how far reading runs ahead of the workers, so memory stays flat on huge inputs
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    stats = {"done": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        def process(record_id, record):
+            try:
+                try:
+                    result = run_tool(tool, record, text_field, engine)
+                    result["fallback"] = utils.is_fallback_message(result["output"])
+                except Exception as e:
+                    result = {"error": str(e)}
+                row = json.dumps(dict(result, id=record_id, tool=TOOLS[tool], engine=engine), ensure_ascii=False)
+                with lock:
+                    out.write(row + "\n")
+                    out.flush()
+                    stats["failed" if "error" in result or result.get("fallback") else "done"] += 1
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+            for n, record in read_records(input_path, text_field):
+                record_id = str(record.get(id_field) or n)
+                if record_id in done:
+                    stats["skipped"] += 1
+                    continue
+                slots.acquire()
+                pool.submit(process, record_id, record)
+
+    elapsed = time.perf_counter() - started
+    processed = stats["done"] + stats["failed"]
+    log(f"{processed} processed ({stats['failed']} failed), {stats['skipped']} already done, "
+        f"{elapsed:.1f}s, {processed / elapsed if elapsed else 0:.2f} req/s")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk purity checks, translations and essays without the Streamlit UI.")
+    parser.add_argument("input", help="JSONL or CSV file ('-' for JSONL on stdin)")
+    parser.add_argument("-o", "--output", required=True, help="JSONL output, appended to and used to resume")
+    parser.add_argument("--tool", choices=sorted(TOOLS), default="nirmal")
+    parser.add_argument("--engine", default="Llama 3.3 (via Groq)", help="engine label as in the pages, or 'offline' for nirmal")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--text-field", help="input field holding the text (default: text, or topic for nibandh)")
+    parser.add_argument("--id-field", default="id", help="input field used as the record id (default: line number)")
+    args = parser.parse_args(argv)
+    stats = run_batch(args.input, args.output, args.tool, args.engine, max(1, args.concurrency), args.text_field, args.id_field)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
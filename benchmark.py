@@ -0,0 +1,432 @@
+import argparse
+import asyncio
+import ast
+import glob
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# --- LOAD BENCHMARK ---
+# Starts local stand-ins for the Gemini, Hugging Face, Groq and Anthropic APIs in a separate
+# process, points utils at them and drives get_ai_response / the tool flows at increasing
+# concurrency. No API credits are used.
+#
+#   python benchmark.py -c 1,8,32 -n 200 --latency 0.3 --error-rate 0.02
+#   python benchmark.py --save-baseline benchmark_baseline.json
+#   python benchmark.py --compare benchmark_baseline.json      # exit code 1 on regression
+#   python benchmark.py --importtime                           # cold-start import cost per page
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENGINES = ["groq", "gemini", "huggingface", "claude"]
+SCENARIOS = ["raw", "nirmal", "vivek", "nibandh"]
+STUB_WORDS = "यह एक शुद्ध हिंदी वाक्य है जो परीक्षण के लिए बनाया गया है और इसमें कोई विदेशी शब्द नहीं".split()
+INPUT_WORDS = "मेरा दिमाग आज बहुत खराब है क्योंकि ऑफिस में काम ज्यादा था और टाइम कम".split()
+
+
+# --- STUB PROVIDERS ---
+class StubConfig:
+    def __init__(self, latency=0.2, jitter=0.5, chunks=20, chunk_delay=0.005, error_rate=0.0,
+                 rate_limit=0.0, retry_after=0, seed=None):
+        self.latency, self.jitter = latency, jitter
+        self.chunks, self.chunk_delay = chunks, chunk_delay
+        self.error_rate, self.rate_limit, self.retry_after = error_rate, rate_limit, retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self):
+        # One random outcome per request: 429, 500 or success after a jittered time-to-first-token
+        with self.lock:
+            roll = self.random.random()
+            delay = self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+        if roll < self.rate_limit:
+            return 429, delay
+        if roll < self.rate_limit + self.error_rate:
+            return 500, delay
+        return 200, delay
+
+    def pieces(self):
+        words = [STUB_WORDS[i % len(STUB_WORDS)] for i in range(self.chunks * 3)]
+        return [" ".join(words[i:i + 3]) + " " for i in range(0, len(words), 3)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        payload = json.loads(body or b"{}")
+        url = urlparse(self.path)
+        config = self.server.config
+        status, delay = config.draw()
+        time.sleep(delay)
+        if status != 200:
+            return self.send_json(status, {"error": {"type": "rate_limit_error" if status == 429 else "api_error",
+                                                     "message": f"stub {status}"}})
+        if url.path.endswith(":generateContent"):
+            return self.send_json(200, {"candidates": [{"content": {"parts": [{"text": "".join(config.pieces())}]}}]})
+        if url.path.endswith(":streamGenerateContent") and parse_qs(url.query).get("alt") == ["sse"]:
+            return self.send_sse(({"candidates": [{"content": {"parts": [{"text": p}]}}]} for p in config.pieces()))
+        if url.path.startswith("/hf"):
+            if payload.get("stream"):
+                return self.send_sse(({"token": {"text": p, "special": False}} for p in config.pieces()))
+            return self.send_json(200, [{"generated_text": "".join(config.pieces())}])
+        if url.path.endswith("/chat/completions"):
+            return self.send_sse(self.openai_events(payload, config), done=True)
+        if url.path.endswith("/v1/messages"):
+            return self.send_sse(self.anthropic_events(payload, config), named=True)
+        self.send_json(404, {"error": {"message": f"no stub for {url.path}"}})
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", str(self.server.config.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_sse(self, events, done=False, named=False):
+        # Chunked transfer keeps the connection reusable, like the real APIs
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        first = True
+        for event in events:
+            if not first:
+                time.sleep(self.server.config.chunk_delay)
+            first = False
+            prefix = f"event: {event['type']}\n" if named else ""
+            self.write_chunk(f"{prefix}data: {json.dumps(event, ensure_ascii=False)}\n\n")
+        if done:
+            self.write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    @staticmethod
+    def openai_events(payload, config):
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": payload.get("model", "stub")}
+        for piece in config.pieces():
+            yield dict(base, choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        yield dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+
+    @staticmethod
+    def anthropic_events(payload, config):
+        yield {"type": "message_start", "message": {
+            "id": "msg_stub", "type": "message", "role": "assistant", "content": [], "model": payload.get("model", "stub"),
+            "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": 1, "output_tokens": 1}}}
+        yield {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+        for piece in config.pieces():
+            yield {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}}
+        yield {"type": "content_block_stop", "index": 0}
+        yield {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+               "usage": {"output_tokens": config.chunks}}
+        yield {"type": "message_stop"}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, config):
+        super().__init__(address, StubHandler)
+        self.config = config
+
+
+def serve_stubs(port, options, ready):
+    server = StubServer(("127.0.0.1", port), StubConfig(**options))
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_stubs(options, port=0):
+    # A separate process, so the stubs do not compete with the app for the GIL
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_stubs, args=(port, options, ready), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ready.get(timeout=10)}"
+
+
+# --- APP UNDER TEST ---
+def load_app(base_url, workdir):
+    # utils opens its SQLite files in the working directory, so it runs from a scratch copy
+    shutil.copy(os.path.join(HERE, "corrections.json"), workdir)
+    os.chdir(workdir)
+    sys.path.insert(0, HERE)
+    import utils
+    from provider_health import HealthRegistry
+    from response_cache import ResponseCache
+
+    # Set directly rather than through secrets, which would win over environment variables
+    utils.GEMINI_KEY = utils.HF_KEY = utils.GROQ_KEY = utils.ANTHROPIC_KEY = "stub"
+    utils.GEMINI_URL = f"{base_url}/v1beta/models"
+    utils.HF_URL = f"{base_url}/hf/models/stub"
+    utils.GROQ_BASE_URL = utils.ANTHROPIC_BASE_URL = base_url
+    utils._clients.clear()
+    # Quotas would throttle the load generator itself; breakers and routing stay real
+    utils.health = HealthRegistry({k: 1_000_000 for k in ENGINES})
+    utils.engine_latency = utils.health.latency
+    utils.response_cache = ResponseCache(os.path.join(workdir, "response_cache.sqlite"))
+    return utils
+
+
+def request_text(n):
+    # Unique text per request, so every call misses the response cache and reaches a provider
+    words = [INPUT_WORDS[(n + i) % len(INPUT_WORDS)] for i in range(40)]
+    return " ".join(words) + f" {n}"
+
+
+def make_request(utils, scenario, engine_label, n):
+    text = request_text(n)
+    if scenario == "raw":
+        return lambda: utils.get_ai_response(utils.build_vivek_prompt(text), text, engine_label, tool="benchmark")
+    import batch
+    record = {"text": text, "topic": text}
+    return lambda: batch.run_tool(scenario, record, "topic" if scenario == "nibandh" else "text", engine_label)["output"]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else None
+
+
+def run_level(utils, scenario, engine_key, concurrency, total, counter):
+    label = utils.ENGINE_LABELS[engine_key]
+    latencies, failures = [], [0]
+    lock = threading.Lock()
+
+    def one(n):
+        started = time.perf_counter()
+        output = make_request(utils, scenario, label, n)()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if utils.is_fallback_message(output):
+                failures[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(counter, counter + total)))
+        threads = threading.active_count()
+    elapsed = time.perf_counter() - started
+    return _level_result(scenario, engine_key, concurrency, total, elapsed, latencies, failures[0], threads)
+
+
+def run_level_async(utils, scenario, engine_key, concurrency, total, counter):
+    # Concurrency as coroutines on the app's event loop instead of one thread per request (raw only)
+    label = utils.ENGINE_LABELS[engine_key]
+    latencies, failures, threads = [], [0], [0]
+
+    async def one(n, limit):
+        async with limit:
+            text = request_text(n)
+            started = time.perf_counter()
+            output = await utils.get_ai_response_async(utils.build_vivek_prompt(text), text, label, tool="benchmark")
+            latencies.append(time.perf_counter() - started)
+            failures[0] += utils.is_fallback_message(output)
+            threads[0] = max(threads[0], threading.active_count())
+
+    async def drive():
+        limit = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(one(n, limit) for n in range(counter, counter + total)))
+
+    started = time.perf_counter()
+    utils.run_async(drive())
+    elapsed = time.perf_counter() - started
+    return _level_result(scenario, engine_key, concurrency, total, elapsed, latencies, failures[0], threads[0])
+
+
+def _level_result(scenario, engine_key, concurrency, total, elapsed, latencies, failures, threads):
+    return {
+        "scenario": scenario, "engine": engine_key, "concurrency": concurrency, "requests": total,
+        "rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "error_rate": round(failures / total, 3),
+        "rss_mb": round(rss_mb(), 1),
+        "threads": threads,
+    }
+
+
+def run_benchmark(utils, scenarios, engines, levels, total, log=print, use_async=False):
+    results, counter = [], 0
+    log(f"{'scenario':<9}{'engine':<13}{'conc':>5}{'rps':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'rss MB':>8}{'threads':>8}")
+    for scenario in scenarios:
+        for engine_key in engines:
+            # One unmeasured request first, so the provider SDK import is not counted as a p99 latency
+            make_request(utils, scenario, utils.ENGINE_LABELS[engine_key], -1 - counter)()
+            for concurrency in levels:
+                run = run_level_async if use_async and scenario == "raw" else run_level
+                result = run(utils, scenario, engine_key, concurrency, total, counter)
+                counter += total
+                results.append(result)
+                log(f"{scenario:<9}{engine_key:<13}{concurrency:>5}{result['rps']:>9}{result['p50_ms']:>9}"
+                    f"{result['p99_ms']:>9}{result['error_rate']:>8}{result['rss_mb']:>8}{result['threads']:>8}")
+    return results
+
+
+# --- COLD START ---
+HEAVY_MODULES = ["groq", "anthropic", "smtplib", "email.mime", "pandas", "pyarrow"]
+
+IMPORT_PROBE = """import json, sys, time
+started = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def page_imports(path):
+    # Module-level imports of a page, as plain "import x" so missing names do not stop the probe
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def measure_import(path, runs=5):
+    # Best of several fresh interpreters, each in a scratch directory so no SQLite files are left behind
+    code = IMPORT_PROBE.format(imports="\n".join(f"import {m}" for m in page_imports(path)), heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=HERE + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    best = None
+    for _ in range(runs):
+        workdir = tempfile.mkdtemp(prefix="bench-import-")
+        try:
+            shutil.copy(os.path.join(HERE, "corrections.json"), workdir)
+            output = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, capture_output=True,
+                                    text=True, check=True).stdout
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        result = json.loads(output.strip().splitlines()[-1])
+        if best is None or result["ms"] < best["ms"]:
+            best = result
+    return best
+
+
+def run_importtime(runs=5, log=print):
+    paths = [os.path.join(HERE, "app.py")] + sorted(glob.glob(os.path.join(HERE, "pages", "*.py")))
+    results = []
+    log(f"{'page':<28}{'import ms':>10}  heavy modules loaded")
+    for path in paths:
+        result = dict(measure_import(path, runs), page=os.path.relpath(path, HERE))
+        results.append(result)
+        log(f"{result['page'][:27]:<28}{result['ms']:>10.0f}  {', '.join(result['loaded']) or '-'}")
+    return results
+
+
+# --- BASELINES ---
+def _key(result):
+    return (result["scenario"], result["engine"], result["concurrency"])
+
+
+def compare(results, baseline, tolerance):
+    # Slower throughput, higher p99 or more errors than the baseline (beyond tolerance) is a regression
+    previous = {_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        name = "/".join(str(p) for p in _key(result))
+        if result["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['rps']} req/s vs {old['rps']} baseline")
+        if result["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {result['p99_ms']} ms vs {old['p99_ms']} baseline")
+        if result["error_rate"] > old["error_rate"] + tolerance / 10:
+            regressions.append(f"{name}: error rate {result['error_rate']} vs {old['error_rate']} baseline")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the app against local stub providers.")
+    parser.add_argument("-c", "--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--scenarios", default="raw", help=f"comma-separated, from {','.join(SCENARIOS)}")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub time to first token, seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="+/- fraction applied to the latency")
+    parser.add_argument("--chunks", type=int, default=20, help="streamed chunks per response")
+    parser.add_argument("--chunk-delay", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="drive the raw scenario with coroutines (get_ai_response_async) instead of threads")
+    parser.add_argument("--importtime", action="store_true", help="only measure cold-start import time of each page")
+    args = parser.parse_args(argv)
+
+    if args.importtime:
+        run_importtime()
+        return 0
+
+    stub_options = dict(latency=args.latency, jitter=args.jitter, chunks=args.chunks, chunk_delay=args.chunk_delay,
+                        error_rate=args.error_rate, rate_limit=args.rate_limit, retry_after=args.retry_after,
+                        seed=args.seed)
+    process, base_url = start_stubs(stub_options)
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    cwd = os.getcwd()
+    try:
+        utils = load_app(base_url, workdir)
+        levels = [int(c) for c in args.concurrency.split(",")]
+        results = run_benchmark(utils, args.scenarios.split(","), args.engines.split(","), levels, args.requests,
+                                use_async=args.use_async)
+    finally:
+        os.chdir(cwd)
+        process.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "stub": stub_options, "results": results}
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from lexicon import get_lexicon, tokenize
+
+# --- OFFLINE CORPUS PROFILER ---
+# Purity of large corpora against the lexicon with no LLM calls. Files are memory-mapped
+# and cut into chunks at document boundaries; worker processes match each document against the
+# lexicon and count the (document, rule) pairs with numpy. The result is a compressed NPZ
+# summary that the Admin Dashboard charts.
+#
+#   python corpus_profiler.py archive/*.txt -o corpus_profile.npz --split line -j 8
+#
+# Documents are whole files (--split file), lines (line) or blank-line separated blocks (para).
+# Scores match Lexicon.scan: purity = share of words that are not known foreign words, and a
+# multi-word form ("kuch der") counts as one match, as it does there.
+
+PROFILE_FILE = "corpus_profile.npz"
+CHUNK_BYTES = 16 << 20
+SEPARATORS = {"file": b"\n", "line": b"\n", "para": b"\n\n"}
+HISTOGRAM_BINS = np.arange(0, 101, 10)
+WORST_DOCS = 20
+MIN_DOC_TOKENS = 20
+
+_worker = {"lexicon": None, "rules": 1}
+
+
+def _init_worker(rules_path):
+    # Each process opens the lexicon once (lexicon.bin is shared, corrections.json is parsed)
+    lexicon = get_lexicon(rules_path)
+    _worker["lexicon"], _worker["rules"] = lexicon, max(1, len(lexicon.rules))
+
+
+def plan_chunks(paths, split, chunk_bytes=CHUNK_BYTES):
+    # (file number, start, end) byte ranges that never cut a document (or a word) in two
+    sep = SEPARATORS[split]
+    for file_no, path in enumerate(paths):
+        size = os.path.getsize(path)
+        if not size:
+            continue
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = mm.find(sep, min(size, start + chunk_bytes))
+                end = size if end < 0 else end + len(sep)
+                yield file_no, start, end
+                start = end
+
+
+def _split_docs(data, split):
+    # (byte offset, text) of every non-blank document in the chunk
+    text = data.decode("utf-8", "replace").lower()
+    if split == "file":
+        return [(0, text)]
+    sep, offset, docs = SEPARATORS[split], 0, []
+    for raw, part in zip(data.split(sep), text.split(sep.decode())):
+        if part.strip():
+            docs.append((offset, part))
+        offset += len(raw) + len(sep)
+    return docs
+
+
+def profile_chunk(task):
+    path, file_no, start, end, split = task
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        docs = _split_docs(mm[start:end], split)
+    lexicon, lengths = _worker["lexicon"], np.zeros(len(docs), np.int64)
+    docs_of_foreign, rules = [], []
+    for n, (_, text) in enumerate(docs):
+        # The same tokens and matches as Lexicon.scan, but only rule ids, so no rule is decoded
+        lengths[n] = len(tokenize(text))
+        found = lexicon.match_ids(text)
+        docs_of_foreign += [n] * len(found)
+        rules += found
+    docs_of_foreign, rules = np.array(docs_of_foreign, np.int64), np.array(rules, np.int64)
+    # Per-document counts of each foreign word, as sparse (doc, rule) pairs
+    pairs, pair_counts = np.unique(docs_of_foreign * _worker["rules"] + rules, return_counts=True)
+    return {
+        "file": file_no,
+        "offsets": np.array([start + offset for offset, _ in docs], np.int64),
+        "tokens": lengths,
+        "foreign": np.bincount(docs_of_foreign, minlength=len(docs)),
+        "pair_doc": pairs // _worker["rules"],
+        "pair_rule": pairs % _worker["rules"],
+        "pair_count": pair_counts,
+        "bytes": end - start,
+    }
+
+
+def purity(tokens, foreign):
+    # Same rule as Lexicon.scan: 100 for an empty document
+    tokens, foreign = np.asarray(tokens, np.float64), np.asarray(foreign, np.float64)
+    return np.where(tokens > 0, 100 * (tokens - foreign) / np.maximum(tokens, 1), 100.0)
+
+
+def profile_corpus(paths, split="line", workers=None, rules_path=None, chunk_bytes=CHUNK_BYTES):
+    if split not in SEPARATORS:
+        raise ValueError(f"split must be one of {', '.join(SEPARATORS)}")
+    rules = get_lexicon(rules_path).rules
+    tasks = [(paths[f], f, s, e, split) for f, s, e in plan_chunks(paths, split, chunk_bytes)]
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    parts = {key: [] for key in ("file", "offsets", "tokens", "foreign", "pair_doc", "pair_rule", "pair_count")}
+    total_bytes, doc_base = 0, 0
+    with Pool(workers, initializer=_init_worker, initargs=(rules_path,)) as pool:
+        # imap keeps chunk order, so document numbers follow the files
+        for result in pool.imap(profile_chunk, tasks):
+            n = len(result["tokens"])
+            parts["file"].append(np.full(n, result["file"], np.int32))
+            parts["pair_doc"].append(result.pop("pair_doc") + doc_base)
+            for key in ("offsets", "tokens", "foreign", "pair_rule", "pair_count"):
+                parts[key].append(result[key])
+            total_bytes += result["bytes"]
+            doc_base += n
+    arrays = {key: np.concatenate(value) if value else np.zeros(0, np.int64) for key, value in parts.items()}
+    if split == "file":
+        # A file split across chunks is still one document
+        files, doc_ids = np.unique(arrays["file"], return_inverse=True)
+        arrays["tokens"] = np.bincount(doc_ids, weights=arrays["tokens"]).astype(np.int64)
+        arrays["foreign"] = np.bincount(doc_ids, weights=arrays["foreign"]).astype(np.int64)
+        arrays["pair_doc"] = doc_ids[arrays["pair_doc"]]
+        arrays["file"], arrays["offsets"] = files.astype(np.int32), np.zeros(len(files), np.int64)
+        pairs, inverse = np.unique(arrays["pair_doc"] * max(1, len(rules)) + arrays["pair_rule"], return_inverse=True)
+        arrays["pair_count"] = np.bincount(inverse, weights=arrays["pair_count"]).astype(np.int64)
+        arrays["pair_doc"], arrays["pair_rule"] = pairs // max(1, len(rules)), pairs % max(1, len(rules))
+    seconds = time.perf_counter() - started
+    total_tokens, total_foreign = int(arrays["tokens"].sum()), int(arrays["foreign"].sum())
+    meta = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "split": split,
+        "workers": workers,
+        "chunks": len(tasks),
+        "bytes": total_bytes,
+        "seconds": round(seconds, 2),
+        "mb_per_second": round(total_bytes / 1e6 / seconds, 1) if seconds else 0.0,
+        "documents": len(arrays["tokens"]),
+        "total_words": total_tokens,
+        "foreign_count": total_foreign,
+        "purity_score": round(float(purity(total_tokens, total_foreign)), 2),
+    }
+    return {
+        "meta": meta,
+        "files": np.array(paths, dtype=str),
+        "rule_words": np.array([r.get("word", "") for r in rules], dtype=str),
+        "rule_origins": np.array([r.get("origin", "") for r in rules], dtype=str),
+        "rule_counts": np.bincount(arrays["pair_rule"], weights=arrays["pair_count"], minlength=len(rules)).astype(np.int64),
+        "doc_file": arrays["file"],
+        "doc_offset": arrays["offsets"],
+        "doc_tokens": arrays["tokens"],
+        "doc_foreign": arrays["foreign"],
+        "doc_purity": purity(arrays["tokens"], arrays["foreign"]).astype(np.float32),
+        "pair_doc": arrays["pair_doc"],
+        "pair_rule": arrays["pair_rule"].astype(np.int32),
+        "pair_count": arrays["pair_count"],
+    }
+
+
+def save_profile(profile, path=PROFILE_FILE):
+    # Written next to the target and swapped in, so the dashboard never reads half a file
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **dict(profile, meta=np.array(json.dumps(profile["meta"]))))
+    os.replace(tmp, path)
+
+
+def save_documents_parquet(profile, path):
+    # Per-document table for notebooks and BI tools (needs pyarrow)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pq.write_table(pa.table({
+        "file": profile["files"][profile["doc_file"]],
+        "offset": profile["doc_offset"],
+        "words": profile["doc_tokens"],
+        "foreign": profile["doc_foreign"],
+        "purity": profile["doc_purity"],
+    }), path, compression="zstd")
+
+
+def load_corpus_profile(path=PROFILE_FILE):
+    # Chart-ready summary of a saved profile, or None if there is none
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        profile = {key: data[key] for key in data.files}
+    counts, order = profile["rule_counts"], np.argsort(-profile["rule_counts"], kind="stable")
+    total = max(1, int(counts.sum()))
+    histogram, _ = np.histogram(profile["doc_purity"], bins=HISTOGRAM_BINS)
+    candidates = np.flatnonzero(profile["doc_tokens"] >= MIN_DOC_TOKENS)
+    worst = candidates[np.argsort(profile["doc_purity"][candidates], kind="stable")[:WORST_DOCS]]
+    return {
+        "meta": json.loads(str(profile["meta"])),
+        "words": [{"word": str(profile["rule_words"][i]), "origin": str(profile["rule_origins"][i]),
+                   "count": int(counts[i]), "share": round(int(counts[i]) / total, 3)}
+                  for i in order if counts[i]],
+        "histogram": [{"purity": f"{lo}-{hi}", "documents": int(n)}
+                      for lo, hi, n in zip(HISTOGRAM_BINS[:-1], HISTOGRAM_BINS[1:], histogram)],
+        "worst": [{"file": os.path.basename(str(profile["files"][profile["doc_file"][i]])),
+                   "offset": int(profile["doc_offset"][i]), "words": int(profile["doc_tokens"][i]),
+                   "foreign": int(profile["doc_foreign"][i]), "purity": round(float(profile["doc_purity"][i]), 1)}
+                  for i in worst],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the purity of text corpora against corrections.json.")
+    parser.add_argument("paths", nargs="+", help="UTF-8 text files")
+    parser.add_argument("-o", "--output", default=PROFILE_FILE, help="NPZ summary read by the Admin Dashboard")
+    parser.add_argument("--split", choices=sorted(SEPARATORS), default="line", help="what counts as one document")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--rules", help="lexicon.bin or corrections.json (default: the published lexicon)")
+    parser.add_argument("--parquet", metavar="PATH", help="also write the per-document table as Parquet")
+    args = parser.parse_args(argv)
+    profile = profile_corpus(args.paths, args.split, args.workers, args.rules)
+    save_profile(profile, args.output)
+    if args.parquet:
+        save_documents_parquet(profile, args.parquet)
+    print(json.dumps(profile["meta"], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import json
+import os
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+
+# --- DAILY WORD CALENDAR ---
+# daily_words.json is shuffled once into a fixed calendar (the same in every process, so
+# all sessions show the same word) and cached until the file changes. Today's word is one
+# list index: day number modulo the calendar length. Every word appears once per cycle.
+
+WORDS_FILE = "daily_words.json"
+CALENDAR_SEED = 108
+IST = timezone(timedelta(hours=5, minutes=30))
+FALLBACK_WORD = {"word": "Shabd (शब्द)", "meaning": "अर्थ को प्रकट करने वाली ध्वनि — a word"}
+
+_cache = {"key": None, "calendar": [FALLBACK_WORD]}
+_lock = threading.Lock()
+
+
+def load_words(path=WORDS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return [w for w in json.load(f).get("daily_words", []) if w.get("word") and w.get("meaning")]
+
+
+def build_calendar(words, seed=CALENDAR_SEED):
+    calendar = list(words)
+    random.Random(seed).shuffle(calendar)
+    return calendar or [FALLBACK_WORD]
+
+
+def get_calendar(path=WORDS_FILE):
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        key = (path, None)
+    with _lock:
+        if _cache["key"] != key:
+            try:
+                words = load_words(path)
+            except (OSError, ValueError):
+                words = []
+            _cache["calendar"] = build_calendar(words)
+            _cache["key"] = key
+        return _cache["calendar"]
+
+
+def today():
+    # The word changes at midnight Indian time, wherever the server runs
+    return datetime.now(IST).date()
+
+
+def get_daily_word(day=None, path=WORDS_FILE):
+    calendar = get_calendar(path)
+    return calendar[(day or today()).toordinal() % len(calendar)]
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import date
+from email.message import EmailMessage
+
+import utils
+from daily_words import get_daily_word, today
+from mail_outbox import SMTPConnection
+from provider_health import TokenBucket
+
+# --- BULK DIGEST MAILER ---
+# Sends one message to every active subscriber over a small pool of long-lived SMTP
+# connections, paced by a token bucket. Every delivery is recorded in subscribers.sqlite as
+# it happens, so an interrupted run picks up where it stopped and a finished campaign is
+# never sent twice (a message in flight at a crash may be delivered again).
+#
+#   python digest_mailer.py daily                  # today's word, campaign daily-YYYY-MM-DD
+#   python digest_mailer.py pdf --pdf words.pdf    # lead magnet to everyone who has not had it
+#   python digest_mailer.py status
+#
+# SMTP settings come from the same secrets/environment variables as the app
+# (EMAIL_USER, EMAIL_PASSWORD, SMTP_HOST, SMTP_PORT, SMTP_STARTTLS).
+
+LEAD_MAGNET_PDF = "100_powerful_hindi_words.pdf"
+LEAD_MAGNET_CAMPAIGN = "pdf-100-words"
+CONNECTIONS = int(utils.get_secret("DIGEST_CONNECTIONS", 4))
+PER_MINUTE = int(utils.get_secret("DIGEST_PER_MINUTE", 300))
+MAX_ATTEMPTS = 3
+PAGE_SIZE = 500
+RECIPIENT = "recipient@placeholder.invalid"
+
+
+def _message(subject, html, attachment=None):
+    msg = EmailMessage()
+    msg["From"] = f"ShabdaSankalan <{utils.EMAIL_USER}>"
+    msg["To"] = RECIPIENT
+    msg["Subject"] = subject
+    msg.set_content("This email is best viewed in an HTML-capable mail client.")
+    msg.add_alternative(html, subtype="html")
+    if attachment:
+        with open(attachment, "rb") as f:
+            msg.add_attachment(f.read(), maintype="application", subtype="pdf", filename=os.path.basename(attachment))
+    # Encoded once; each recipient only gets its own To line
+    return msg.as_bytes()
+
+
+def _footer():
+    return ("<p style='font-size: 12px; color: #999; text-align: center;'>You signed up on ShabdaSankalan. "
+            "Reply with UNSUBSCRIBE to stop these emails.</p>")
+
+
+def daily_message(day=None):
+    day = day or today()
+    word = get_daily_word(day)
+    html = f"""
+    <html>
+      <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: auto; border: 1px solid #eee; border-radius: 10px; padding: 20px;">
+          <h2 style="color: #E91E63; text-align: center;">🌟 Aaj Ka Shabd</h2>
+          <p style="font-size: 24px; text-align: center;"><b>{word['word']}</b></p>
+          <p style="text-align: center;">{word['meaning']}</p>
+          {_footer()}
+        </div>
+      </body>
+    </html>
+    """
+    return f"daily-{day.isoformat()}", _message(f"🌟 Aaj Ka Shabd: {word['word']}", html)
+
+
+def lead_magnet_message(pdf_path=LEAD_MAGNET_PDF):
+    if not os.path.isfile(pdf_path):
+        raise FileNotFoundError(f"{pdf_path} not found; pass --pdf with the '100 Most Powerful Hindi Words' PDF")
+    html = f"""
+    <html>
+      <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: auto; border: 1px solid #eee; border-radius: 10px; padding: 20px;">
+          <h2 style="color: #E91E63; text-align: center;">🎁 100 Most Powerful Hindi Words</h2>
+          <p>Namaste,</p>
+          <p>Thank you for joining ShabdaSankalan. Your free PDF is attached.</p>
+          {_footer()}
+        </div>
+      </body>
+    </html>
+    """
+    return LEAD_MAGNET_CAMPAIGN, _message("🎁 Your '100 Most Powerful Hindi Words' PDF", html, pdf_path)
+
+
+def for_recipient(message, email):
+    return message.replace(RECIPIENT.encode("ascii"), email.encode("utf-8"), 1)
+
+
+def _connect():
+    return SMTPConnection(utils.SMTP_HOST, utils.SMTP_PORT, utils.EMAIL_USER, utils.EMAIL_PASSWORD, utils.SMTP_STARTTLS)
+
+
+def send_campaign(campaign, message, store=None, connections=CONNECTIONS, per_minute=PER_MINUTE,
+                  max_attempts=MAX_ATTEMPTS, connect=_connect, progress=None):
+    import smtplib
+    store = store or utils.get_subscribers()
+    added = store.start_campaign(campaign)
+    bucket = TokenBucket(per_minute, burst=connections)
+    stats = {"campaign": campaign, "added": added, "sent": 0, "failed": 0, "retry": 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+            if progress:
+                progress(dict(stats))
+
+    def worker(work):
+        smtp = connect()
+        try:
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                email, attempts = item
+                bucket.try_acquire(timeout=float("inf"))
+                try:
+                    smtp.send(utils.EMAIL_USER, email, for_recipient(message, email))
+                    outcome, error = "sent", None
+                except smtplib.SMTPRecipientsRefused as e:
+                    # A bad address will never succeed
+                    outcome, error = "failed", e
+                except Exception as e:
+                    smtp.close()
+                    outcome, error = ("failed" if attempts + 1 >= max_attempts else "retry"), e
+                # A worker must keep draining the queue whatever happens here, or the producer blocks;
+                # a row left unmarked simply stays pending for the next pass or run
+                try:
+                    if error is None:
+                        store.mark_sent(campaign, email)
+                    else:
+                        store.mark_failed(campaign, email, error, final=outcome == "failed")
+                    count(outcome)
+                except Exception as e:
+                    print(f"digest: could not record {email}: {e}", file=sys.stderr)
+        finally:
+            smtp.close()
+
+    # Each pass walks the pending recipients once; failures still under max_attempts go round again
+    for _ in range(max_attempts):
+        work = queue.Queue(maxsize=connections * 4)
+        threads = [threading.Thread(target=worker, args=(work,), name=f"digest-{i}", daemon=True) for i in range(connections)]
+        for thread in threads:
+            thread.start()
+        after, queued = "", 0
+        while True:
+            page = store.pending(campaign, PAGE_SIZE, after)
+            if not page:
+                break
+            for item in page:
+                work.put(item)
+            queued += len(page)
+            after = page[-1][0]
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+        if not queued or not store.pending(campaign, 1):
+            break
+    stats["pending"] = store.delivery_counts(campaign)["pending"]
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send the daily word or the lead-magnet PDF to all subscribers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    daily_cmd = commands.add_parser("daily", help="send a day's word (default: today)")
+    daily_cmd.add_argument("--day", type=date.fromisoformat)
+    pdf_cmd = commands.add_parser("pdf", help="send the PDF to every subscriber who has not received it")
+    pdf_cmd.add_argument("--pdf", default=LEAD_MAGNET_PDF)
+    commands.add_parser("status", help="show recent campaigns")
+    unsubscribe_cmd = commands.add_parser("unsubscribe", help="stop all digests to an address")
+    unsubscribe_cmd.add_argument("email")
+    for cmd in (daily_cmd, pdf_cmd):
+        cmd.add_argument("-c", "--connections", type=int, default=CONNECTIONS)
+        cmd.add_argument("--per-minute", type=int, default=PER_MINUTE)
+    args = parser.parse_args(argv)
+    if args.command == "status":
+        print(json.dumps(utils.get_subscribers().campaign_progress(), indent=2))
+        return 0
+    if args.command == "unsubscribe":
+        print("unsubscribed" if utils.get_subscribers().unsubscribe(args.email) else "not an active subscriber")
+        return 0
+    if not utils.EMAIL_USER or not utils.EMAIL_PASSWORD:
+        print("Email credentials missing in secrets.", file=sys.stderr)
+        return 1
+    campaign, message = daily_message(args.day) if args.command == "daily" else lead_magnet_message(args.pdf)
+    started = time.time()
+
+    def report(stats):
+        if (stats["sent"] + stats["failed"]) % 100 == 0:
+            print(f"{stats['sent']} sent, {stats['failed']} failed, {stats['retry']} to retry", file=sys.stderr)
+
+    stats = send_campaign(campaign, message, connections=max(1, args.connections), per_minute=args.per_minute, progress=report)
+    stats["seconds"] = round(time.time() - started, 1)
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["pending"] or stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
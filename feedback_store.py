@@ -0,0 +1,193 @@
+import atexit
+import csv
+import io
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from storage import connect
+
+# --- FEEDBACK EVENT STORE ---
+# Append-only SQLite (WAL) store. save calls only enqueue; one writer thread
+# inserts in batches, so concurrent sessions never contend on the file.
+# Per day/tool/rating counts are maintained in the same transaction, so the
+# dashboard never has to scan the raw events.
+
+FEEDBACK_FILE = "feedback.sqlite"
+LEGACY_CSV = "feedback_log.csv"
+CSV_HEADER = ["Date", "Tool Name", "Rating", "User Input", "AI Output", "Comments"]
+FLUSH_INTERVAL = 0.5
+BATCH_SIZE = 200
+WRITE_ATTEMPTS = 5
+MAX_WRITE_BACKOFF = 10
+UNSAVED_CSV = "feedback_unsaved.csv"
+
+
+class FeedbackStore:
+    def __init__(self, path=FEEDBACK_FILE, legacy_csv=LEGACY_CSV, unsaved_csv=UNSAVED_CSV):
+        self.path = path
+        self.unsaved_csv = unsaved_csv
+        self._queue = queue.Queue()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._init_db()
+        if legacy_csv and os.path.isfile(legacy_csv) and self.count() == 0:
+            self.import_csv(legacy_csv)
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _db(self):
+        return connect(self.path)
+
+    def _init_db(self):
+        db = self._db()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS feedback ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created TEXT NOT NULL, day TEXT NOT NULL, tool TEXT NOT NULL, "
+            "rating TEXT NOT NULL, user_input TEXT, ai_output TEXT, comment TEXT)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_feedback_tool_rating ON feedback(tool, rating, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_feedback_rating_id ON feedback(rating, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback(created)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS feedback_daily ("
+            "day TEXT NOT NULL, tool TEXT NOT NULL, rating TEXT NOT NULL, count INTEGER NOT NULL, "
+            "PRIMARY KEY (day, tool, rating))"
+        )
+        if db.execute("SELECT COUNT(*) FROM feedback_daily").fetchone()[0] == 0:
+            # One-time backfill for stores created before the aggregates existed
+            db.execute("INSERT INTO feedback_daily SELECT day, tool, rating, COUNT(*) FROM feedback GROUP BY day, tool, rating")
+
+    # --- WRITES ---
+    def add(self, tool_name, user_input, ai_output, rating, comment="", created=None):
+        created = created or datetime.now()
+        stamp = created.isoformat(sep=" ", timespec="seconds") if isinstance(created, datetime) else str(created)
+        with self._flushed:
+            self._pending += 1
+        self._queue.put((stamp, stamp[:10], tool_name, rating, user_input, ai_output, comment))
+
+    def _write(self, rows):
+        db = self._db()
+        db.execute("BEGIN")
+        try:
+            db.executemany(
+                "INSERT INTO feedback (created, day, tool, rating, user_input, ai_output, comment) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            counts = Counter((row[1], row[2], row[3]) for row in rows)
+            db.executemany(
+                "INSERT INTO feedback_daily (day, tool, rating, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (day, tool, rating) DO UPDATE SET count = count + excluded.count",
+                [key + (n,) for key, n in counts.items()],
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def _write_batch(self, rows):
+        # Retried with backoff. A batch that still fails is appended to unsaved_csv (the old
+        # feedback_log.csv layout, so import_csv can load it back) rather than dropped.
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                self._write(rows)
+                return
+            except Exception as e:
+                print(f"feedback: writing {len(rows)} rows failed (attempt {attempt + 1}): {e}", file=sys.stderr)
+            if attempt + 1 < WRITE_ATTEMPTS:
+                time.sleep(min(MAX_WRITE_BACKOFF, FLUSH_INTERVAL * 2 ** attempt))
+        try:
+            with open(self.unsaved_csv, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows((r[0], r[2], r[3], r[4], r[5], r[6]) for r in rows)
+            print(f"feedback: {len(rows)} rows kept in {self.unsaved_csv}", file=sys.stderr)
+        except OSError as e:
+            print(f"feedback: {len(rows)} rows lost: {e}", file=sys.stderr)
+
+    def _run(self):
+        while True:
+            rows = [self._queue.get()]
+            try:
+                while len(rows) < BATCH_SIZE:
+                    rows.append(self._queue.get(timeout=FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+            self._write_batch(rows)
+            with self._flushed:
+                self._pending -= len(rows)
+                self._flushed.notify_all()
+
+    def flush(self, timeout=10):
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._pending == 0, timeout)
+
+    # --- READS ---
+    def count(self):
+        return self._db().execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+    def query(self, tool=None, rating=None, since=None, until=None, limit=100, offset=0, before_id=None):
+        # before_id gives keyset pagination: each page costs the same however deep it is
+        clauses, params = [], []
+        if before_id:
+            clauses.append("id < ?"); params.append(before_id)
+        if tool:
+            clauses.append("tool = ?"); params.append(tool)
+        if rating:
+            clauses.append("rating = ?"); params.append(rating)
+        if since:
+            clauses.append("created >= ?"); params.append(str(since))
+        if until:
+            clauses.append("created < ?"); params.append(str(until))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        cursor = self._db().execute(
+            f"SELECT id, created, tool, rating, user_input, ai_output, comment FROM feedback {where} "
+            "ORDER BY id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        )
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def daily_counts(self, since=None):
+        sql, params = "SELECT day, tool, rating, count FROM feedback_daily", []
+        if since:
+            sql += " WHERE day >= ?"; params.append(str(since)[:10])
+        return self._db().execute(sql + " ORDER BY day", params).fetchall()
+
+    def max_id(self):
+        return self._db().execute("SELECT COALESCE(MAX(id), 0) FROM feedback").fetchone()[0]
+
+    def rows_after(self, after_id, limit=50000):
+        return self._db().execute(
+            "SELECT id, created, day, tool, rating, user_input, ai_output, comment FROM feedback WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, limit),
+        ).fetchall()
+
+    # --- CSV EXPORT / IMPORT ---
+    def export_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+        cursor = self._db().execute("SELECT created, tool, rating, user_input, ai_output, comment FROM feedback ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            writer.writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+    def import_csv(self, path):
+        # The old feedback_log.csv was written without a header row
+        rows = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) < 5 or row[:2] == CSV_HEADER[:2]:
+                    continue
+                stamp = row[0][:19]
+                rows.append((stamp, stamp[:10], row[1], row[2], row[3], row[4], row[5] if len(row) > 5 else ""))
+        if rows:
+            self._write(rows)
+        return len(rows)
@@ -0,0 +1,63 @@
+import asyncio
+import itertools
+import weakref
+from contextlib import asynccontextmanager
+
+# --- SHARED HTTP TRANSPORT ---
+# Pooled keep-alive httpx clients for the direct provider calls, so requests reuse TCP/TLS
+# connections instead of paying setup on every call.
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 90
+POOL_MAXSIZE = 64
+# Only failed connects are retried here (the request never reached the provider). A 429/5xx
+# goes back to the caller: the admission ticket holds the one retry budget per user request,
+# and admission.retry backs off with jitter and honours Retry-After.
+CONNECT_RETRIES = 2
+ASYNC_MAX_CONNECTIONS = 512
+
+
+# --- ASYNC TRANSPORT ---
+# httpx pools are bound to the event loop that created them, so each loop has its own clients.
+# httpcore rescans every pooled connection (quadratically) whenever a request starts or ends,
+# so the connections are spread over POOL_SHARDS small pools used in turn.
+POOL_SHARDS = 8
+_UNBUILT = object()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def build_async_client(shards=1):
+    import httpx
+    transport = httpx.AsyncHTTPTransport(
+        retries=CONNECT_RETRIES,
+        limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS // shards,
+                            max_keepalive_connections=max(1, POOL_MAXSIZE // shards)),
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        headers={"Accept-Encoding": "gzip, deflate"},
+    )
+
+
+def get_pooled(registry, name, build):
+    # One of POOL_SHARDS instances of build() for the running loop, handed out in turn
+    shards = registry.setdefault(asyncio.get_running_loop(), {})
+    if name not in shards:
+        shards[name] = (itertools.cycle(range(POOL_SHARDS)), [_UNBUILT] * POOL_SHARDS)
+    turn, items = shards[name]
+    i = next(turn)
+    if items[i] is _UNBUILT:
+        items[i] = build()
+    return items[i]
+
+
+def get_async_client():
+    return get_pooled(_async_clients, "http", lambda: build_async_client(POOL_SHARDS))
+
+
+@asynccontextmanager
+async def stream_post(url, **kwargs):
+    # Yields the streaming response, whatever its status
+    async with get_async_client().stream("POST", url, **kwargs) as response:
+        yield response
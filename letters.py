@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+
+# --- PATRA-LEKHAK TEMPLATES ---
+# The fixed parts of a formal letter (address block, date, subject, salutation, closing and
+# signature) come from letter_templates.json; only the body is written by the LLM.
+
+TEMPLATES_FILE = "letter_templates.json"
+BODY_MARKER = "{body}"
+
+_cache = {"key": None, "templates": None}
+_lock = threading.Lock()
+
+
+def load_templates(path=TEMPLATES_FILE):
+    # Re-read only when the file changes on disk
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        key = (path, None)
+    with _lock:
+        if _cache["key"] != key:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    _cache["templates"] = json.load(f)
+            except (OSError, ValueError):
+                _cache["templates"] = {"recipients": {}, "types": {}, "layout": BODY_MARKER}
+            _cache["key"] = key
+        return _cache["templates"]
+
+
+def get_letter_spec(recipient, letter_type, path=TEMPLATES_FILE):
+    templates = load_templates(path)
+    recipients, types = templates.get("recipients", {}), templates.get("types", {})
+    to = recipients.get(recipient) or recipients.get("Other") or {}
+    kind = types.get(letter_type) or {}
+    return {
+        "address": "\n".join(to.get("address", [])),
+        "salutation": to.get("salutation", "महोदय,"),
+        # A recipient-specific sign-off ("आपका आज्ञाकारी शिष्य") wins over the letter type's
+        "sign_off": to.get("sign_off") or kind.get("sign_off", "भवदीय,"),
+        "closing": kind.get("closing", ""),
+        "guidance": kind.get("guidance", ""),
+        "layout": templates.get("layout", BODY_MARKER),
+    }
+
+
+def render_letter_frame(recipient, letter_type, sender, date, subject, path=TEMPLATES_FILE):
+    # Returns (head, tail): the letter is head + body + tail
+    spec = get_letter_spec(recipient, letter_type, path)
+    head, _, tail = spec["layout"].partition(BODY_MARKER)
+    values = dict(spec, date=date.strftime("%d-%m-%Y") if hasattr(date, "strftime") else str(date),
+                  subject=subject, sender=sender)
+    return head.format(**values), tail.format(**values)
@@ -0,0 +1,348 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from collections import deque
+from collections.abc import Sequence
+
+# --- LOCAL LEXICON SCANNER ---
+# Finds known foreign words (from corrections.json) in Devanagari and romanized
+# text without any LLM call, using an Aho-Corasick automaton over all word forms.
+# Large lexicons are compiled by lexicon_build.py into lexicon.bin (see COMPILED LEXICON).
+
+RULES_FILE = "corrections.json"
+COMPILED_FILE = "lexicon.bin"
+
+WORD_PATTERN = re.compile(r"[A-Za-zऀ-ॣ०-ॿ]+")
+DISPLAY_PATTERN = re.compile(r"^\s*([^(\[]+?)\s*(?:\(([^)]*)\))?\s*(?:\[[^\]]*\])?\s*$")
+NUKTA = "़"
+
+
+def _is_word_char(ch):
+    return ("A" <= ch <= "Z") or ("a" <= ch <= "z") or ("ऀ" <= ch <= "ॣ") or ("०" <= ch <= "ॿ")
+
+
+def normalize_form(text):
+    return unicodedata.normalize("NFC", text).strip().lower()
+
+
+def split_display(display):
+    # "Gaadi (गाड़ी)" -> ["Gaadi", "गाड़ी"]; "Vahan (वाहन) [Tatsam]" -> ["Vahan", "वाहन"]
+    match = DISPLAY_PATTERN.match(display or "")
+    if not match:
+        return [display.strip()] if display and display.strip() else []
+    return [part.strip() for part in match.groups() if part and part.strip()]
+
+
+def word_forms(display):
+    forms = set()
+    for part in split_display(display):
+        form = normalize_form(part)
+        if not form:
+            continue
+        forms.add(form)
+        if NUKTA in form:
+            forms.add(form.replace(NUKTA, ""))
+    return forms
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(unicodedata.normalize("NFC", text or ""))
+
+
+def form_key(text):
+    # Lookup key of a word or phrase in the compiled lexicon: its words, lowercased, one space apart
+    return " ".join(WORD_PATTERN.findall(normalize_form(text)))
+
+
+class AhoCorasick:
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add(self, pattern, value):
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = nxt
+        self.output[state].append((len(pattern), value))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                if state:
+                    f = self.fail[state]
+                    while f and ch not in self.goto[f]:
+                        f = self.fail[f]
+                    self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+        return self
+
+    def iter(self, text):
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, value in self.output[state]:
+                yield i - length + 1, i + 1, value
+
+
+class LexiconQueries:
+    # Shared by the in-memory and the compiled lexicon; needs rules, rule_id() and _matches()
+    def find(self, text):
+        # (start, end, surface, rule) of every whole-word, leftmost-longest, non-overlapping match
+        text = unicodedata.normalize("NFC", text or "")
+        return [(start, end, text[start:end], self.rules[rule_id]) for start, end, rule_id in self._matches(text)]
+
+    def match_ids(self, text):
+        # Rule id of every match find() returns, without decoding the rules
+        return [rule_id for _, _, rule_id in self._matches(unicodedata.normalize("NFC", text or ""))]
+
+    def lookup(self, word):
+        rule_id = self.rule_id(word)
+        return None if rule_id is None else self.rules[rule_id]
+
+    def relevant_rules(self, text):
+        seen, rules = set(), []
+        for _, _, _, rule in self.find(text):
+            if id(rule) not in seen:
+                seen.add(id(rule))
+                rules.append(rule)
+        return rules
+
+    def scan(self, text):
+        tokens = tokenize(text)
+        matches = self.find(text)
+        found = {}
+        for _, _, surface, rule in matches:
+            entry = found.setdefault(rule["word"], {"rule": rule, "surfaces": [], "count": 0})
+            entry["count"] += 1
+            if surface not in entry["surfaces"]:
+                entry["surfaces"].append(surface)
+        total = len(tokens)
+        foreign = len(matches)
+        score = 100 if total == 0 else round(100 * (total - foreign) / total)
+        return {
+            "total_words": total,
+            "foreign_count": foreign,
+            "purity_score": score,
+            "found": list(found.values()),
+        }
+
+
+class Lexicon(LexiconQueries):
+    def __init__(self, rules):
+        self.rules = rules
+        self.index = {}
+        self.automaton = AhoCorasick()
+        for rule_id, rule in enumerate(rules):
+            for form in word_forms(rule.get("word", "")):
+                if form not in self.index:
+                    self.index[form] = rule_id
+                    self.automaton.add(form, rule_id)
+        self.automaton.build()
+        # Size of the old str(list) prompt injection, for measuring savings
+        self.full_prompt_tokens = estimate_tokens(str(rules))
+
+    def rule_id(self, word):
+        return self.index.get(normalize_form(word))
+
+    def _matches(self, text):
+        folded = text.lower()
+        candidates = []
+        for start, end, rule_id in self.automaton.iter(folded):
+            if start > 0 and _is_word_char(folded[start - 1]):
+                continue
+            if end < len(folded) and _is_word_char(folded[end]):
+                continue
+            candidates.append((start, -end, rule_id))
+        matches, last_end = [], 0
+        for start, neg_end, rule_id in sorted(candidates):
+            if start >= last_end:
+                matches.append((start, -neg_end, rule_id))
+                last_end = -neg_end
+        return matches
+
+
+def format_rules(rules):
+    # Compact prompt form: one "word → replacement (origin)" per line
+    return "\n".join(f"{r.get('word', '')} → {r.get('replacement', '')} ({r.get('origin', '')})" for r in rules)
+
+
+def estimate_tokens(text):
+    # Rough BPE estimate (about 4 UTF-8 bytes per token), good enough to compare prompt sizes
+    return (len((text or "").encode("utf-8")) + 3) // 4
+
+
+# --- COMPILED LEXICON ---
+# lexicon.bin layout (little-endian): a header, one ENTRY per rule (its JSON in the string pool),
+# then one FORM per lookup key, sorted by the key's UTF-8 bytes, then the string pool. Forms
+# include variants and nukta-less spellings, so exact lookups are a binary search and every
+# form sharing a prefix is one contiguous run. The file is memory-mapped read-only: opening it
+# only reads the header, and all processes share the same page-cache pages.
+MAGIC = b"HLEX"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHIIIQQQd")  # magic, version, max words per form, entries, forms, full prompt tokens, 3 offsets, built
+ENTRY = struct.Struct("<QI")  # pool offset and length of the rule's JSON
+FORM = struct.Struct("<QII")  # pool offset and length of the key, rule id
+
+
+class RuleList(Sequence):
+    # Rules of a compiled lexicon, decoded on first access
+    def __init__(self, lexicon, count):
+        self._lexicon = lexicon
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if not -self._count <= i < self._count:
+            raise IndexError(i)
+        return self._lexicon.rule(i % self._count)
+
+
+class CompiledLexicon(LexiconQueries):
+    def __init__(self, path=COMPILED_FILE):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.max_words, entries, self.form_count, self.full_prompt_tokens,
+             self._entries_at, self._forms_at, self._pool_at, self.built) = HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            magic, version = None, None
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} compiled lexicon")
+        self.rules = RuleList(self, entries)
+        self._decoded = {}
+
+    def _bytes(self, offset, length):
+        start = self._pool_at + offset
+        return self._mm[start:start + length]
+
+    def rule(self, rule_id):
+        # Decoded once, so every lookup of a rule returns the same dict
+        rule = self._decoded.get(rule_id)
+        if rule is None:
+            offset, length = ENTRY.unpack_from(self._mm, self._entries_at + rule_id * ENTRY.size)
+            rule = self._decoded.setdefault(rule_id, json.loads(self._bytes(offset, length)))
+        return rule
+
+    def _form(self, i):
+        offset, length, rule_id = FORM.unpack_from(self._mm, self._forms_at + i * FORM.size)
+        return self._bytes(offset, length), rule_id
+
+    def _bisect(self, key):
+        lo, hi = 0, self.form_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._form(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _rule_id_for_key(self, key):
+        key = key.encode("utf-8")
+        i = self._bisect(key)
+        if i < self.form_count:
+            form, rule_id = self._form(i)
+            if form == key:
+                return rule_id
+        return None
+
+    def rule_id(self, word):
+        return self._rule_id_for_key(form_key(word))
+
+    def prefix(self, text, limit=20):
+        # (form, rule) for forms starting with text, in sorted order, e.g. for autocomplete
+        key = normalize_form(text).encode("utf-8")
+        found = []
+        for i in range(self._bisect(key), self.form_count):
+            form, rule_id = self._form(i)
+            if not form.startswith(key) or len(found) >= limit:
+                break
+            found.append((form.decode("utf-8"), self.rule(rule_id)))
+        return found
+
+    def _matches(self, text):
+        # Forms are looked up for up to max_words words at a time
+        words = list(WORD_PATTERN.finditer(text.lower()))
+        matches, i = [], 0
+        while i < len(words):
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                rule_id = self._rule_id_for_key(" ".join(w.group() for w in words[i:i + n]))
+                if rule_id is not None:
+                    start, end = words[i].start(), words[i + n - 1].end()
+                    matches.append((start, end, rule_id))
+                    i += n
+                    break
+            else:
+                i += 1
+        return matches
+
+
+_cache = {"key": None, "lexicon": None}
+_lock = threading.Lock()
+
+
+def load_rules(path=RULES_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("correction_rules", [])
+
+
+def _open_lexicon(path):
+    if path.endswith(".bin"):
+        try:
+            return CompiledLexicon(path)
+        except (OSError, ValueError):
+            path = RULES_FILE
+    try:
+        rules = load_rules(path)
+    except (OSError, ValueError):
+        rules = []
+    return Lexicon(rules)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_lexicon(path=None):
+    # The published lexicon.bin if there is one, else corrections.json. A corrections.json edited
+    # after the last build wins until lexicon.bin is rebuilt. Reopened only when the file on disk
+    # is replaced; readers still holding the old one keep a valid mapping.
+    if path is None:
+        compiled, rules = _mtime(COMPILED_FILE), _mtime(RULES_FILE)
+        path = COMPILED_FILE if compiled is not None and (rules is None or compiled >= rules) else RULES_FILE
+    try:
+        stat = os.stat(path)
+        key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = (path, None)
+    with _lock:
+        if _cache["key"] != key:
+            _cache["lexicon"] = _open_lexicon(path)
+            _cache["key"] = key
+        return _cache["lexicon"]
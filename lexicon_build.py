@@ -0,0 +1,172 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from analytics import NEGATIVE_RATINGS
+from feedback_store import FEEDBACK_FILE
+from lexicon import (COMPILED_FILE, ENTRY, FORM, FORMAT_VERSION, HEADER, MAGIC, RULES_FILE, CompiledLexicon,
+                     estimate_tokens, form_key, get_lexicon, load_rules, tokenize, word_forms)
+from storage import connect
+
+# --- LEXICON BUILD ---
+# Compiles corrections.json plus any reviewed JSONL sources into lexicon.bin and publishes it
+# with an atomic rename, so running app processes switch over on their next lookup.
+#
+#   python lexicon_build.py build corrections.json reviewed_words.jsonl
+#   python lexicon_build.py mine -o candidates.jsonl
+#
+# A JSONL source has one rule per line: {"word": "Kitaab (किताब)", "origin": "Arabic",
+# "replacement": "Pustak (पुस्तक)", "variants": ["kitab", "kitaabein"]}. Lines without a
+# replacement (e.g. unreviewed mined candidates) are skipped.
+
+MIN_NEGATIVE = 3
+MAX_CANDIDATES = 200
+MIN_WORD_CHARS = 3
+
+
+def read_rules(path):
+    if not path.endswith(".jsonl"):
+        return load_rules(path)
+    rules = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rules.append(json.loads(line))
+    return rules
+
+
+def rule_keys(rule):
+    # Every lookup key of a rule: the display forms, their nukta-less spellings and the variants
+    forms = word_forms(rule.get("word", ""))
+    for variant in rule.get("variants") or []:
+        forms |= word_forms(variant)
+    return {key for key in map(form_key, forms) if key}
+
+
+def compile_lexicon(rules):
+    # Returns the lexicon.bin bytes. The first rule claiming a form keeps it, as in Lexicon.
+    rules = [rule for rule in rules if rule.get("word") and rule.get("replacement")]
+    pool, entries, owner = bytearray(), [], {}
+    for rule_id, rule in enumerate(rules):
+        data = json.dumps(rule, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        entries.append((len(pool), len(data)))
+        pool += data
+        for key in rule_keys(rule):
+            owner.setdefault(key.encode("utf-8"), rule_id)
+    forms = []
+    for key in sorted(owner):
+        forms.append((len(pool), len(key), owner[key]))
+        pool += key
+    max_words = max((key.count(b" ") + 1 for key in owner), default=1)
+    entries_at = HEADER.size
+    forms_at = entries_at + ENTRY.size * len(entries)
+    pool_at = forms_at + FORM.size * len(forms)
+    out = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, max_words, len(entries), len(forms),
+                                estimate_tokens(str(rules)), entries_at, forms_at, pool_at, time.time()))
+    for entry in entries:
+        out += ENTRY.pack(*entry)
+    for form in forms:
+        out += FORM.pack(*form)
+    return bytes(out + pool)
+
+
+def publish(data, path=COMPILED_FILE):
+    # Written beside the target and renamed over it: readers see the old file or the new one,
+    # never a partial write, and processes still mapping the old file keep working
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".lexicon-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        CompiledLexicon(tmp)  # refuse to publish a file that does not open
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def build(sources, output=COMPILED_FILE):
+    rules = []
+    for source in sources:
+        rules += read_rules(source)
+    publish(compile_lexicon(rules), output)
+    lexicon = CompiledLexicon(output)
+    return {"output": output, "rules": len(lexicon.rules), "forms": lexicon.form_count,
+            "bytes": os.path.getsize(output), "max_words": lexicon.max_words}
+
+
+# --- CANDIDATE MINING ---
+def _feedback_rows(source):
+    # (rating, user_input, ai_output) from the feedback store or an exported feedback_log.csv
+    if source.endswith(".csv"):
+        with open(source, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) >= 5 and row[:2] != ["Date", "Tool Name"]:
+                    yield row[2], row[3], row[4]
+    else:
+        yield from connect(source).execute("SELECT rating, user_input, ai_output FROM feedback")
+
+
+def mine_feedback(source=FEEDBACK_FILE, lexicon=None, min_negative=MIN_NEGATIVE, limit=MAX_CANDIDATES):
+    # Words the tools left in their output far more often when users rated the answer badly:
+    # likely foreign words the lexicon does not know yet. Output needs review before building.
+    lexicon = lexicon or get_lexicon()
+    kept = {True: Counter(), False: Counter()}
+    totals = Counter()
+    for rating, user_input, ai_output in _feedback_rows(source):
+        negative = rating in NEGATIVE_RATINGS
+        totals[negative] += 1
+        output = {word.lower() for word in tokenize(ai_output)}
+        kept[negative].update(word for word in {w.lower() for w in tokenize(user_input)} & output
+                              if len(word) >= MIN_WORD_CHARS)
+    candidates = []
+    for word, negative in kept[True].items():
+        if negative < min_negative or lexicon.rule_id(word) is not None:
+            continue
+        positive = kept[False][word]
+        # Smoothed log-odds of the word surviving in a bad answer versus a good one
+        score = math.log((negative + 1) / (totals[True] + 2)) - math.log((positive + 1) / (totals[False] + 2))
+        if score > 0:
+            candidates.append({"word": word, "origin": "", "replacement": "", "negative": negative,
+                               "positive": positive, "score": round(score, 3)})
+    candidates.sort(key=lambda c: (-c["score"], -c["negative"], c["word"]))
+    return candidates[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile and publish the foreign-word lexicon.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_cmd = commands.add_parser("build", help="compile sources into lexicon.bin")
+    build_cmd.add_argument("sources", nargs="*", default=[RULES_FILE], help="corrections.json and/or JSONL files")
+    build_cmd.add_argument("-o", "--output", default=COMPILED_FILE)
+    mine_cmd = commands.add_parser("mine", help="suggest new words from negative feedback")
+    mine_cmd.add_argument("source", nargs="?", default=FEEDBACK_FILE, help="feedback.sqlite or feedback_log.csv")
+    mine_cmd.add_argument("-o", "--output", help="JSONL to fill in and pass to build (default: stdout)")
+    mine_cmd.add_argument("--min-negative", type=int, default=MIN_NEGATIVE)
+    mine_cmd.add_argument("--limit", type=int, default=MAX_CANDIDATES)
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        print(json.dumps(build(args.sources, args.output), indent=2))
+        return 0
+    candidates = mine_feedback(args.source, min_negative=args.min_negative, limit=args.limit)
+    lines = "".join(json.dumps(c, ensure_ascii=False) + "\n" for c in candidates)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(lines)
+    else:
+        sys.stdout.write(lines)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import random
+import threading
+import time
+
+from storage import connect
+
+# --- DURABLE EMAIL OUTBOX ---
+# Messages are written to SQLite and a background worker delivers them in batches
+# over one long-lived, authenticated SMTP connection, with retry and backoff.
+
+OUTBOX_FILE = "outbox.sqlite"
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 30
+MAX_BACKOFF = 3600
+LEASE_SECONDS = 300
+IDLE_DISCONNECT = 60
+POLL_INTERVAL = 5
+
+
+class SMTPConnection:
+    def __init__(self, host, port, user, password, starttls=True, timeout=30):
+        self.host, self.port = host, port
+        self.user, self.password = user, password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._server = None
+        self._last_used = 0
+
+    def _open(self):
+        import smtplib
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        return server
+
+    def _alive(self):
+        try:
+            return self._server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def get(self):
+        if self._server is not None and time.time() - self._last_used > 10 and not self._alive():
+            self.close()
+        if self._server is None:
+            self._server = self._open()
+        self._last_used = time.time()
+        return self._server
+
+    def send(self, sender, recipient, message):
+        import smtplib
+        try:
+            self.get().sendmail(sender, [recipient], message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Stale connection: reconnect once and retry on a fresh session
+            self.close()
+            self.get().sendmail(sender, [recipient], message)
+        self._last_used = time.time()
+
+    def idle_for(self):
+        return time.time() - self._last_used if self._server is not None else 0
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+        self._server = None
+
+
+class MailOutbox:
+    def __init__(self, sender, host="smtp.gmail.com", port=587, user="", password="", starttls=True, path=OUTBOX_FILE):
+        self.sender = sender
+        self.path = path
+        self.smtp = SMTPConnection(host, port, user, password, starttls)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._init_db()
+        # Mail left queued, in backoff or leased by an earlier process is delivered without waiting
+        # for the next enqueue; the worker's first claim takes over the leases that have expired
+        if self.has_pending():
+            self.start()
+
+    def _db(self):
+        return connect(self.path)
+
+    def _init_db(self):
+        db = self._db()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, recipient TEXT NOT NULL, message TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt REAL NOT NULL, claimed_at REAL, last_error TEXT, created REAL NOT NULL, sent_at REAL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt)")
+
+    # --- PRODUCER SIDE ---
+    def enqueue(self, recipient, message):
+        now = time.time()
+        cursor = self._db().execute(
+            "INSERT INTO outbox (recipient, message, next_attempt, created) VALUES (?, ?, ?, ?)",
+            (recipient, message, now, now),
+        )
+        self.start()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def get_status(self, job_id):
+        row = self._db().execute(
+            "SELECT status, attempts, last_error, created, sent_at FROM outbox WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"id": job_id, "status": row[0], "attempts": row[1], "last_error": row[2], "created": row[3], "sent_at": row[4]}
+
+    def has_pending(self):
+        return self._db().execute("SELECT 1 FROM outbox WHERE status IN ('queued', 'sending') LIMIT 1").fetchone() is not None
+
+    def get_counts(self):
+        return dict(self._db().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    # --- WORKER SIDE ---
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.smtp.close()
+
+    def claim_batch(self, limit=BATCH_SIZE):
+        # Several worker processes may share the file; BEGIN IMMEDIATE makes the claim atomic
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT id, recipient, message, attempts FROM outbox "
+                "WHERE (status = 'queued' AND next_attempt <= ?) OR (status = 'sending' AND claimed_at < ?) "
+                "ORDER BY next_attempt LIMIT ?",
+                (now, now - LEASE_SECONDS, limit),
+            ).fetchall()
+            db.executemany("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?", [(now, r[0]) for r in rows])
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _mark_sent(self, job_id):
+        self._db().execute("UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?", (time.time(), job_id))
+
+    def _mark_failed(self, job_id, attempts, error):
+        attempts += 1
+        if attempts >= MAX_ATTEMPTS:
+            self._db().execute(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?", (attempts, str(error), job_id)
+            )
+            return
+        delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+        self._db().execute(
+            "UPDATE outbox SET status = 'queued', attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+            (attempts, time.time() + delay, str(error), job_id),
+        )
+
+    def drain_once(self):
+        # smtplib is only needed once there is mail to send
+        import smtplib
+        rows = self.claim_batch()
+        for job_id, recipient, message, attempts in rows:
+            try:
+                self.smtp.send(self.sender, recipient, message)
+                self._mark_sent(job_id)
+            except smtplib.SMTPRecipientsRefused as e:
+                # A bad address will never succeed, no point retrying it
+                self._db().execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?", (attempts + 1, str(e), job_id))
+            except Exception as e:
+                self.smtp.close()
+                self._mark_failed(job_id, attempts, e)
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.drain_once()
+            except Exception:
+                sent = 0
+            if sent:
+                continue
+            if self.smtp.idle_for() > IDLE_DISCONNECT:
+                self.smtp.close()
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
@@ -0,0 +1,199 @@
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- METRICS ---
+# Minimal Prometheus-style counters and histograms. When disabled every call returns
+# after a single flag check, so instrumented hot paths cost nothing measurable.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+FAST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+enabled = False
+_registry = {}
+_registry_lock = threading.Lock()
+_server = None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not enabled:
+            return
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not enabled:
+            return
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][i] += 1
+                    break
+            else:
+                counts[0][-1] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            return {k: ([*v[0]], v[1], v[2]) for k, v in self._values.items()}
+
+    def quantile(self, q, **labels):
+        # Linear interpolation inside the bucket, as Prometheus' histogram_quantile does
+        key = tuple(labels.get(n, "") for n in self.labels)
+        sample = self.samples().get(key)
+        if not sample or not sample[2]:
+            return None
+        counts, _, total = sample
+        rank, seen, lower = q * total, 0, 0.0
+        for i, count in enumerate(counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if seen + count >= rank and count:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.samples().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter() if enabled else None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        if self.started is not None:
+            self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+            self.started = None
+
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name, help_text, labels=()):
+    return _register(Counter(name, help_text, labels))
+
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, help_text, labels, buckets))
+
+
+def timed(hist, **labels):
+    # Decorator form of hist.time(**labels)
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with hist.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_prometheus():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def enable(port=None, host="127.0.0.1"):
+    # Turns collection on; with a port, also serves /metrics once per process
+    global enabled, _server
+    enabled = True
+    if port and _server is None:
+        with _registry_lock:
+            if _server is None:
+                try:
+                    _server = ThreadingHTTPServer((host, int(port)), _Handler)
+                except OSError:
+                    # Another worker process already serves this port
+                    return
+                threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
@@ -0,0 +1,226 @@
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from storage import connect
+from text_normalize import fold_text
+
+# --- NEAR-DUPLICATE REQUEST INDEX ---
+# MinHash signatures over character shingles of the folded user text, bucketed with LSH,
+# so a request that differs from an earlier one by a typo or a word can reuse its answer.
+# Requests only match within a group (same tool, engine, prompt and token budget).
+# Entries live next to the response cache's table and are pruned with it (see prune).
+
+INDEX_FILE = "response_cache.sqlite"
+NUM_PERM = 64
+BANDS = 16
+SHINGLE = 4
+THRESHOLD = 0.9
+MIN_CHARS = 40
+MAX_ITEMS = 50000
+MERSENNE = (1 << 31) - 1
+
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, MERSENNE, NUM_PERM).astype(np.int64)
+_B = _rng.randint(0, MERSENNE, NUM_PERM).astype(np.int64)
+
+
+def make_group(tool, system_prompt, engine, max_tokens=None):
+    raw = "\x1f".join([tool or "", fold_text(system_prompt), engine or "", str(max_tokens or "")])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def signature(text):
+    # None for texts too short to compare safely (a two-word change would dominate)
+    folded = fold_text(text)
+    if len(folded) < MIN_CHARS:
+        return None
+    shingles = {folded[i:i + SHINGLE] for i in range(len(folded) - SHINGLE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & MERSENNE for s in shingles), np.int64, len(shingles))
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % MERSENNE).min(axis=1).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    def __init__(self, path=INDEX_FILE, threshold=THRESHOLD, max_items=MAX_ITEMS):
+        self.path = path
+        self.threshold = threshold
+        self.max_items = max_items
+        self.rows = NUM_PERM // BANDS
+        self._items = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "near_hits": 0, "indexed": 0}
+        self._load()
+
+    def _db(self):
+        return connect(self.path) if self.path else None
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            db = self._db()
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS near_duplicates ("
+                "key TEXT PRIMARY KEY, grp TEXT NOT NULL, signature BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._delete_orphans(db)
+            rows = db.execute(
+                "SELECT key, grp, signature FROM near_duplicates ORDER BY created DESC LIMIT ?", (self.max_items,)
+            ).fetchall()
+        except Exception:
+            self.path = None
+            return
+        for key, group, blob in reversed(rows):
+            self._insert(key, group, np.frombuffer(blob, dtype=np.uint32))
+
+    def _band_keys(self, group, sig):
+        return [(group, b, sig[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(BANDS)]
+
+    def _insert(self, key, group, sig):
+        if key in self._items:
+            return
+        self._items[key] = (group, sig)
+        for band in self._band_keys(group, sig):
+            self._buckets.setdefault(band, set()).add(key)
+        while len(self._items) > self.max_items:
+            self._remove(next(iter(self._items)))
+
+    def _remove(self, key):
+        group, sig = self._items.pop(key)
+        for band in self._band_keys(group, sig):
+            bucket = self._buckets.get(band)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _delete_orphans(self, db):
+        # Keys whose answer is no longer in the response cache; nothing if there is no such table
+        try:
+            keys = [row[0] for row in db.execute("SELECT key FROM near_duplicates WHERE key NOT IN (SELECT key FROM responses)")]
+            db.executemany("DELETE FROM near_duplicates WHERE key = ?", [(key,) for key in keys])
+        except Exception:
+            return []
+        return keys
+
+    def prune(self):
+        # Called when the response cache evicts: a match could only point at an answer that is gone
+        if not self.path:
+            return 0
+        keys = self._delete_orphans(self._db())
+        with self._lock:
+            for key in keys:
+                if key in self._items:
+                    self._remove(key)
+        return len(keys)
+
+    def add(self, group, text, key):
+        sig = signature(text)
+        if sig is None:
+            return
+        with self._lock:
+            self._insert(key, group, sig)
+            self.stats["indexed"] += 1
+        if self.path:
+            try:
+                self._db().execute(
+                    "INSERT OR REPLACE INTO near_duplicates (key, grp, signature, created) VALUES (?, ?, ?, ?)",
+                    (key, group, sig.tobytes(), time.time()),
+                )
+            except Exception:
+                pass
+
+    def find(self, group, text):
+        # Returns (key, similarity) of the closest earlier request above the threshold, or None
+        sig = signature(text)
+        with self._lock:
+            self.stats["lookups"] += 1
+            if sig is None:
+                return None
+            candidates = set()
+            for band in self._band_keys(group, sig):
+                candidates |= self._buckets.get(band, set())
+            if not candidates:
+                return None
+            # Similarity is the fraction of equal MinHash values (an estimate of shingle Jaccard);
+            # similar texts share many buckets, so all candidates are scored in one array operation
+            keys = list(candidates)
+            scores = (np.stack([self._items[key][1] for key in keys]) == sig).mean(axis=1)
+            i = int(scores.argmax())
+            if scores[i] < self.threshold:
+                return None
+            self.stats["near_hits"] += 1
+            return keys[i], float(scores[i])
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, items=len(self._items))
+        stats["near_hit_rate"] = round(stats["near_hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        return stats
+
+
+# --- DEDUPE REPORT ---
+def dedupe_report(records, threshold=THRESHOLD):
+    # records: iterable of (group, text) in arrival order, e.g. past requests per tool.
+    # Counts how many would have been served without a new generation at each stage.
+    index = NearDuplicateIndex(path=None, threshold=threshold, max_items=10**9)
+    seen_raw, seen_folded = set(), set()
+    report = {"requests": 0, "exact": 0, "normalized": 0, "near": 0}
+    for n, (group, text) in enumerate(records):
+        report["requests"] += 1
+        raw, folded = (group, text), (group, fold_text(text))
+        if raw in seen_raw:
+            report["exact"] += 1
+        elif folded in seen_folded:
+            report["normalized"] += 1
+        elif index.find(group, text):
+            report["near"] += 1
+        seen_raw.add(raw)
+        seen_folded.add(folded)
+        index.add(group, text, str(n))
+    total = report["requests"] or 1
+    report["dedupe_rate"] = round((report["exact"] + report["normalized"] + report["near"]) / total, 3)
+    report["gain_over_exact"] = round((report["normalized"] + report["near"]) / total, 3)
+    return report
+
+
+def _feedback_records(path):
+    # Past requests from the feedback log: (tool, user_input) oldest first
+    for tool, text in connect(path).execute("SELECT tool, user_input FROM feedback ORDER BY id"):
+        if text:
+            yield tool or "", text
+
+
+def _jsonl_records(path, text_field, group_field):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield str(record.get(group_field, "")), str(record.get(text_field) or "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how many past requests were duplicates or near-duplicates.")
+    parser.add_argument("source", nargs="?", default="feedback.sqlite", help="feedback.sqlite or a JSONL request log")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--group-field", default="tool")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+    if args.source.endswith(".jsonl"):
+        records = _jsonl_records(args.source, args.text_field, args.group_field)
+    else:
+        records = _feedback_records(args.source)
+    print(json.dumps(dedupe_report(records, args.threshold), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
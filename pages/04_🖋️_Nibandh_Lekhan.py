@@ -1,33 +1,58 @@
 import streamlit as st
-from utils import get_ai_response, save_feedback
-
-st.set_page_config(page_title="Nibandh-Lekhan", page_icon="🖋️", layout="centered")
-
-col_logo, col_text = st.columns([1.5, 4.5])
-with col_logo: st.markdown("<div style='font-size: 80px; text-align: center;'>🖋️</div>", unsafe_allow_html=True)
-with col_text: st.markdown("<div><h1 style='margin: 0;'>Nibandh-Lekhan</h1><p style='margin: 0; color: #666;'>Expert Hindi Essay Architect</p></div>", unsafe_allow_html=True)
-st.markdown("---")
-
-col1, col2 = st.columns(2)
-with col1:
-    topic = st.text_input("Essay Topic", placeholder="Ex: Aatmanirbhar Bharat")
-    word_limit = st.select_slider("Word Limit", ["Short (250)", "Medium (500)", "Long (800+)"])
-with col2:
-    level = st.selectbox("Level", ["School (6-10)", "College", "UPSC/Govt"])
-    style = st.selectbox("Style", ["Analytical", "Descriptive", "Reflective"])
-
-key_points = st.text_area("Key Points (Optional)")
-with st.expander("⚙️ Settings"): model = st.selectbox("AI Model", ["Gemini 2.5 Flash", "Meta Llama 3"])
-
-if "essay_result" not in st.session_state: st.session_state.essay_result = None
-
-if st.button("Compose Essay", type="primary", use_container_width=True):
-    if topic:
-        sys_prompt = f"You are 'Acharya Nibandh'. Write a Hindi Essay on '{topic}'. Level: {level}, Style: {style}, Length: {word_limit}. STRUCTURE: Prastavana -> Vishay Vastu -> Upsanghar. Language: Shuddh Hindi (No English)."
-        with st.spinner("Writing..."):
-            st.session_state.essay_result = get_ai_response(sys_prompt, f"Topic: {topic}. Points: {key_points}", model)
-
-if st.session_state.essay_result:
-    st.markdown(st.session_state.essay_result)
-    st.download_button("📥 Download", st.session_state.essay_result, f"{topic}_Essay.md")
-    if st.button("👍 Good Structure?"): save_feedback("Nibandh-Lekhan", topic, st.session_state.essay_result, "Positive")
+from utils import (page_timer, stream_ai_response, tee_stream, build_nibandh_prompt, build_nibandh_input, save_feedback,
+                   uses_essay_pipeline, get_essay_outline, iter_essay_sections, format_essay_section, stitch_essay, queue_notice)
+
+with page_timer("Nibandh-Lekhan"):
+    st.set_page_config(page_title="Nibandh-Lekhan", page_icon="🖋️", layout="centered")
+
+    col_logo, col_text = st.columns([1.5, 4.5])
+    with col_logo: st.markdown("<div style='font-size: 80px; text-align: center;'>🖋️</div>", unsafe_allow_html=True)
+    with col_text: st.markdown("<div><h1 style='margin: 0;'>Nibandh-Lekhan</h1><p style='margin: 0; color: #666;'>Expert Hindi Essay Architect</p></div>", unsafe_allow_html=True)
+    st.markdown("---")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        topic = st.text_input("Essay Topic", placeholder="Ex: Aatmanirbhar Bharat")
+        word_limit = st.select_slider("Word Limit", ["Short (250)", "Medium (500)", "Long (800+)"])
+    with col2:
+        level = st.selectbox("Level", ["School (6-10)", "College", "UPSC/Govt"])
+        style = st.selectbox("Style", ["Analytical", "Descriptive", "Reflective"])
+
+    key_points = st.text_area("Key Points (Optional)")
+    with st.expander("⚙️ Settings"): model = st.selectbox("AI Model", ["Gemini 2.5 Flash", "Meta Llama 3", "Auto (Fastest Available)"])
+
+    if "essay_result" not in st.session_state: st.session_state.essay_result = None
+
+    if st.button("Compose Essay", type="primary", use_container_width=True):
+        outline = None
+        if topic and uses_essay_pipeline(word_limit):
+            # Outline first, then every section is written in parallel and shown as soon as it is done
+            with st.spinner("Planning the essay outline..."):
+                outline = get_essay_outline(topic, level, style, key_points, model)
+        if outline:
+            live, texts = st.empty(), {}
+            with live.container():
+                st.markdown(f"## {topic}")
+                slots = [st.empty() for _ in outline]
+                for (heading, _), slot in zip(outline, slots): slot.info(f"✍️ {heading}...")
+                for i, text in iter_essay_sections(outline, topic, level, style, key_points, model):
+                    texts[i] = text
+                    slots[i].markdown(format_essay_section(outline[i][0], text))
+            live.empty()
+            st.session_state.essay_result = stitch_essay(topic, outline, texts)
+        elif topic:
+            sys_prompt = build_nibandh_prompt(topic, level, style, word_limit)
+            live, parts = st.empty(), []
+            with live.container(): st.write_stream(tee_stream(stream_ai_response(sys_prompt, build_nibandh_input(topic, key_points), model, tool="Nibandh-Lekhan", on_wait=queue_notice(st.empty())), parts))
+            live.empty()
+            st.session_state.essay_result = "".join(parts)
+
+    # Reruns on its own, so rating the essay does not re-render it
+    @st.fragment
+    def download_feedback_section():
+        st.download_button("📥 Download", st.session_state.essay_result, f"{topic}_Essay.md")
+        if st.button("👍 Good Structure?"): save_feedback("Nibandh-Lekhan", topic, st.session_state.essay_result, "Positive")
+
+    if st.session_state.essay_result:
+        st.markdown(st.session_state.essay_result)
+        download_feedback_section()
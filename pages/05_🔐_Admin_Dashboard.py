@@ -1,28 +1,173 @@
 import streamlit as st
 import pandas as pd
-import os
+from utils import page_timer, get_metrics_summary, get_metrics_text, get_cache_stats, get_rule_token_stats, get_engine_health, get_admission_stats, query_feedback, export_feedback_csv, feedback_count, get_feedback_summary, get_engine_summary, archive_feedback_history, search_feedback_archive, parquet_available, load_corpus_profile, get_subscriber_summary, get_recent_subscribers, export_subscribers_csv, get_campaign_progress
 
-st.set_page_config(page_title="Admin", page_icon="🔐", layout="centered")
-password = st.text_input("Admin Password:", type="password")
+with page_timer("Admin Dashboard"):
+    FEEDBACK_PAGE_SIZE = 50
 
-if password == "Sudhir123":
-    st.success("Access Granted")
+    st.set_page_config(page_title="Admin", page_icon="🔐", layout="centered")
+    password = st.text_input("Admin Password:", type="password")
+
+    if password == "Sudhir123":
+        st.success("Access Granted")
     
-    # FEEDBACK TAB
-    tab1, tab2 = st.tabs(["Feedback Logs", "Subscribers"])
+        # FEEDBACK TAB
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["Feedback Logs", "Subscribers", "AI Cache", "Metrics", "Corpus Purity"])
     
-    with tab1:
-        if os.path.exists("feedback_log.csv"):
-            df = pd.read_csv("feedback_log.csv")
-            st.dataframe(df)
-            with open("feedback_log.csv", "rb") as f:
-                st.download_button("📥 Download Feedback CSV", f, "feedback.csv")
-        else: st.warning("No feedback yet.")
-
-    with tab2:
-        if os.path.exists("subscribers.csv"):
-            df_sub = pd.read_csv("subscribers.csv")
-            st.dataframe(df_sub)
-            with open("subscribers.csv", "rb") as f:
-                st.download_button("📥 Download Subscribers CSV", f, "subscribers.csv")
-        else: st.warning("No subscribers yet.")
+        with tab1:
+            # Headline numbers and charts come from the incremental aggregates, never from the raw log
+            summary = get_feedback_summary(days=30)
+            if summary["total"] or feedback_count():
+                m1, m2, m3 = st.columns(3)
+                m1.metric("Feedback (30 days)", summary["total"])
+                m2.metric("Negative Rate", f"{summary['negative_rate'] * 100:.1f}%")
+                m3.metric("Today", summary["today"])
+
+                if summary["rows"]:
+                    daily = pd.DataFrame(summary["rows"], columns=["Day", "Tool", "Rating", "Count"])
+                    st.bar_chart(daily.pivot_table(index="Day", columns="Tool", values="Count", aggfunc="sum").fillna(0))
+
+                engines = get_engine_summary(days=30)
+                if engines:
+                    st.markdown("#### ⚡ Engine Latency (30 days)")
+                    st.dataframe(pd.DataFrame(engines, columns=["Engine", "Calls", "Errors", "Avg ms", "Max ms"]).round(0), hide_index=True)
+
+                # Filtered, paginated view (keyset pagination: every page costs the same)
+                st.markdown("#### 🗂️ Feedback Log")
+                f1, f2, f3 = st.columns(3)
+                tool_filter = f1.selectbox("Tool", ["All", "Nirmal-Bhasha", "Patra-Lekhak", "Bhasha-Vivek", "Nibandh-Lekhan"])
+                rating_filter = f2.selectbox("Rating", ["All", "Positive", "Negative", "🤩 Amazing", "🙂 Excellent", "😐 Average", "😞 Bad"])
+                since_filter = f3.date_input("Since", value=None)
+                filters = (tool_filter, rating_filter, since_filter)
+                if st.session_state.get("fb_filters") != filters:
+                    st.session_state.fb_filters = filters
+                    st.session_state.fb_cursors = [None]
+
+                page = query_feedback(
+                    tool=None if tool_filter == "All" else tool_filter,
+                    rating=None if rating_filter == "All" else rating_filter,
+                    since=since_filter, limit=FEEDBACK_PAGE_SIZE, before_id=st.session_state.fb_cursors[-1],
+                )
+                st.dataframe(pd.DataFrame(page), hide_index=True)
+                p1, p2, p3 = st.columns([1, 1, 2])
+                if p1.button("⬅️ Newer", disabled=len(st.session_state.fb_cursors) == 1):
+                    st.session_state.fb_cursors.pop()
+                    st.rerun()
+                if p2.button("Older ➡️", disabled=len(page) < FEEDBACK_PAGE_SIZE):
+                    st.session_state.fb_cursors.append(page[-1]["id"])
+                    st.rerun()
+                p3.caption(f"Page {len(st.session_state.fb_cursors)}")
+
+                with st.expander("📦 Export & Archive"):
+                    if st.button("Prepare CSV Export"):
+                        st.session_state.fb_export = export_feedback_csv()
+                    if st.session_state.get("fb_export"):
+                        st.download_button("📥 Download Feedback CSV", st.session_state.fb_export, "feedback.csv")
+                    if parquet_available():
+                        if st.button("Archive new rows to Parquet"):
+                            st.success(f"Archived {archive_feedback_history()} rows.")
+                        # Same filters as the log above, pruned by day partition in the archive
+                        if st.button("🔎 Search archived history"):
+                            archived = search_feedback_archive(
+                                tool=None if tool_filter == "All" else tool_filter,
+                                rating=None if rating_filter == "All" else rating_filter, since=since_filter,
+                            )
+                            if archived is None: st.info("Nothing archived yet.")
+                            else:
+                                st.dataframe(archived, hide_index=True)
+                                st.caption(f"First {len(archived)} matching archived rows.")
+                    else:
+                        st.caption("Install pyarrow to enable the Parquet history archive.")
+            else: st.warning("No feedback yet.")
+
+        with tab2:
+            subs = get_subscriber_summary()
+            s1, s2, s3 = st.columns(3)
+            s1.metric("Active Subscribers", f"{subs['active']:,}")
+            s2.metric("New Today", subs["today"])
+            s3.metric("Unsubscribed", subs["unsubscribed"])
+            if subs["active"] or subs["unsubscribed"]:
+                st.dataframe(pd.DataFrame(get_recent_subscribers(FEEDBACK_PAGE_SIZE)), hide_index=True)
+                st.caption(f"Newest {FEEDBACK_PAGE_SIZE} signups.")
+                if st.button("Prepare Subscribers CSV"):
+                    st.session_state.sub_export = export_subscribers_csv()
+                if st.session_state.get("sub_export"):
+                    st.download_button("📥 Download Subscribers CSV", st.session_state.sub_export, "subscribers.csv")
+            else: st.warning("No subscribers yet.")
+
+            st.markdown("#### 📬 Digest Campaigns")
+            campaigns = get_campaign_progress()
+            if campaigns:
+                progress = pd.DataFrame(campaigns)
+                progress["updated"] = pd.to_datetime(progress["updated"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+                st.dataframe(progress, hide_index=True)
+            st.caption("Send with: python digest_mailer.py daily  |  python digest_mailer.py pdf --pdf <file>")
+
+        with tab3:
+            stats = get_cache_stats()
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Hit Rate", f"{stats['hit_rate'] * 100:.1f}%")
+            c2.metric("Provider Calls Saved", stats["memory_hits"] + stats["disk_hits"] + stats["coalesced"])
+            c3.metric("Cached Responses", stats["disk_items"])
+            near = stats.pop("near_duplicates")
+            n1, n2 = st.columns(2)
+            n1.metric("Near-Duplicate Matches", near["near_hits"])
+            n2.metric("Near-Duplicate Match Rate", f"{near['near_hit_rate'] * 100:.1f}%")
+            st.json(stats)
+
+            st.markdown("#### ✂️ Correction Rule Prompt Savings")
+            rule_stats = get_rule_token_stats()
+            r1, r2 = st.columns(2)
+            r1.metric("Prompt Tokens Saved / Request", rule_stats["saved_per_request"])
+            r2.metric("Total Tokens Saved", rule_stats["saved_tokens"])
+            st.caption("Estimated against injecting the full correction list into every prompt.")
+            if rule_stats["lexicon_built"]:
+                st.caption(f"Lexicon: {rule_stats['lexicon_rules']:,} words, lexicon.bin published {rule_stats['lexicon_built']}.")
+            else:
+                st.caption(f"Lexicon: {rule_stats['lexicon_rules']:,} words from corrections.json (run lexicon_build.py build to compile).")
+
+            st.markdown("#### 🩺 Engine Health (this process)")
+            st.dataframe(pd.DataFrame(get_engine_health()), hide_index=True)
+
+            st.markdown("#### 🚦 Request Queue (this process)")
+            queue_stats = get_admission_stats()
+            q1, q2, q3, q4 = st.columns(4)
+            q1.metric("Running", queue_stats["running"])
+            q2.metric("Waiting", queue_stats["waiting"])
+            q3.metric("Avg Wait (s)", queue_stats["avg_wait_seconds"])
+            q4.metric("Turned Away", queue_stats["rejected"] + queue_stats["timeouts"])
+            st.json(queue_stats)
+
+        with tab4:
+            summary_rows = get_metrics_summary()
+            if summary_rows is None:
+                st.info("Metrics are off. Set METRICS_ENABLED = true (and optionally METRICS_PORT) in secrets.")
+            else:
+                st.dataframe(pd.DataFrame(summary_rows), hide_index=True)
+                with st.expander("Prometheus text (/metrics)"):
+                    st.code(get_metrics_text(), language="text")
+
+        with tab5:
+            profile = load_corpus_profile()
+            if profile is None:
+                st.info("No corpus profile yet. Run: python corpus_profiler.py archive/*.txt --split line")
+            else:
+                meta = profile["meta"]
+                k1, k2, k3, k4 = st.columns(4)
+                k1.metric("Corpus Purity", f"{meta['purity_score']}%")
+                k2.metric("Documents", f"{meta['documents']:,}")
+                k3.metric("Words", f"{meta['total_words']:,}")
+                k4.metric("Foreign Words", f"{meta['foreign_count']:,}")
+                st.caption(f"Profiled {meta['bytes'] / 1e6:,.0f} MB on {meta['created']} in {meta['seconds']} s "
+                           f"({meta['mb_per_second']} MB/s, {meta['workers']} workers, one document per {meta['split']}).")
+
+                st.markdown("#### 📊 Documents by Purity")
+                st.bar_chart(pd.DataFrame(profile["histogram"]).set_index("purity"))
+                if profile["words"]:
+                    st.markdown("#### 🔤 Most Frequent Foreign Words")
+                    words = pd.DataFrame(profile["words"])
+                    st.bar_chart(words.head(20).set_index("word")["count"])
+                    st.dataframe(words, hide_index=True)
+                if profile["worst"]:
+                    st.markdown("#### 🚩 Least Pure Documents")
+                    st.dataframe(pd.DataFrame(profile["worst"]), hide_index=True)
@@ -0,0 +1,235 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# --- PROVIDER HEALTH REGISTRY ---
+# Process-wide view of every engine shared by all Streamlit sessions: a token bucket
+# per provider quota, a circuit breaker that opens on repeated 429/5xx, and rolling
+# latency stats used to route "Auto" requests to the healthiest engine.
+
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 30
+MAX_RESET_TIMEOUT = 300
+OVERLOAD_STATUSES = {408, 429, 500, 502, 503, 504, 529}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ProviderError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def get_error_status(error):
+    for attr in ("status", "status_code"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int):
+            return status
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def parse_retry_after(value):
+    # Seconds from a Retry-After header (delta seconds or an HTTP date), None if absent or unreadable
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_retry_after(error):
+    # How long the provider asked us to wait, from our own errors or an SDK error's response
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    return parse_retry_after(headers.get("retry-after")) if headers is not None else None
+
+
+def is_overload_error(error):
+    # Overload, server errors, timeouts and dropped connections trip the breaker; bad requests do not
+    status = get_error_status(error)
+    if status is not None:
+        return status in OVERLOAD_STATUSES or status >= 500
+    name = type(error).__name__.lower()
+    return "timeout" in name or "connection" in name
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or max(1, per_minute // 6))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, timeout=0):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate if self.rate else timeout
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.base_reset = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probing = False
+            if self.state == HALF_OPEN and not self.probing:
+                # Exactly one probe request goes through while half-open
+                self.probing = True
+                return True
+            return False
+
+    def would_allow(self):
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            return self.state == CLOSED or not self.probing
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self.probing = CLOSED, 0, False
+            self.reset_timeout = self.base_reset
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                # Failed probe: stay open longer each time
+                self.reset_timeout = min(MAX_RESET_TIMEOUT, self.reset_timeout * 2)
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state, self.opened_at, self.probing = OPEN, time.monotonic(), False
+
+    def release_probe(self):
+        with self._lock:
+            self.probing = False
+
+
+class LatencyTracker:
+    def __init__(self, size=200, min_samples=5):
+        self.size = size
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            samples = self._samples.setdefault(key, [])
+            samples.append(seconds)
+            if len(samples) > self.size:
+                del samples[0]
+
+    def percentile(self, key, q):
+        with self._lock:
+            samples = sorted(self._samples.get(key, []))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ProviderHealth:
+    def __init__(self, name, per_minute):
+        self.name = name
+        self.bucket = TokenBucket(per_minute)
+        self.breaker = CircuitBreaker()
+        self.calls = 0
+        self.errors = 0
+
+    def snapshot(self, latency):
+        return {
+            "engine": self.name,
+            "state": self.breaker.state,
+            "tokens": round(self.bucket.available(), 1),
+            "p50_ttft": latency.percentile(self.name, 0.5),
+            "p95_ttft": latency.percentile(self.name, 0.95),
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+
+class HealthRegistry:
+    def __init__(self, rate_limits):
+        self.providers = {name: ProviderHealth(name, rpm) for name, rpm in rate_limits.items()}
+        self.latency = LatencyTracker()
+
+    def acquire(self, name, wait=0):
+        # Fails fast when the breaker is open or the quota is spent (after waiting up to `wait`)
+        provider = self.providers[name]
+        if not provider.breaker.allow():
+            return False
+        if not provider.bucket.try_acquire(wait):
+            provider.breaker.release_probe()
+            return False
+        return True
+
+    def record_success(self, name):
+        provider = self.providers[name]
+        provider.calls += 1
+        provider.breaker.record_success()
+
+    def record_failure(self, name, error):
+        provider = self.providers[name]
+        provider.calls += 1
+        provider.errors += 1
+        if is_overload_error(error):
+            provider.breaker.record_failure()
+        else:
+            provider.breaker.release_probe()
+
+    def release(self, name):
+        self.providers[name].breaker.release_probe()
+
+    def is_available(self, name):
+        provider = self.providers[name]
+        return provider.breaker.would_allow() and provider.bucket.available() >= 1
+
+    def rank(self, names):
+        # Available engines first, then lowest median time-to-first-token, then fewest errors
+        def score(name):
+            provider = self.providers[name]
+            p50 = self.latency.percentile(name, 0.5)
+            error_rate = provider.errors / provider.calls if provider.calls else 0
+            return (not self.is_available(name), p50 is None, p50 or 0, error_rate)
+        return sorted(names, key=score)
+
+    def snapshot(self):
+        return [p.snapshot(self.latency) for p in self.providers.values()]
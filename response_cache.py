@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from storage import connect
+from text_normalize import clean_text
+
+# --- TWO-TIER RESPONSE CACHE ---
+# In-process LRU in front of a SQLite table shared by every worker, with TTL,
+# size-based eviction and single-flight coalescing of identical requests.
+
+CACHE_FILE = "response_cache.sqlite"
+DEFAULT_TTL = 7 * 24 * 3600
+MEMORY_ITEMS = 512
+DISK_ITEMS = 20000
+EVICT_EVERY = 100
+
+
+def make_key(tool, system_prompt, user_text, engine, max_tokens=None):
+    # Exact hits only: texts are cleaned (NFC, whitespace), never folded. "sleep"/"slip" or हँस/हंस
+    # are different requests; loose matching is the near-duplicate index's job.
+    prompt_hash = hashlib.sha256(clean_text(system_prompt).encode("utf-8")).hexdigest()
+    parts = [tool or "", prompt_hash, clean_text(user_text), engine or ""]
+    if max_tokens:
+        # A capped answer is a different answer; uncapped keys stay as they were
+        parts.append(str(max_tokens))
+    raw = "\x1f".join(parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    # Followers await `done`, a future on the event loop the leader runs on
+    def __init__(self, loop):
+        self.loop = loop
+        self.done = loop.create_future()
+        self.result = None
+
+
+def _settle(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_FILE, ttl=DEFAULT_TTL, memory_items=MEMORY_ITEMS, disk_items=DISK_ITEMS, on_evict=None):
+        # on_evict() runs after an eviction pass that removed rows, e.g. to prune what refers to their keys
+        self.path = path
+        self.on_evict = on_evict
+        self.ttl = ttl
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0}
+        self._init_db()
+
+    def _db(self):
+        return connect(self.path)
+
+    def _init_db(self):
+        try:
+            self._db().execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db().execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+            self.disk_enabled = True
+        except Exception:
+            self.disk_enabled = False
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, value, created):
+        with self._lock:
+            self._memory[key] = (value, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                if now - item[1] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return item[0]
+                del self._memory[key]
+        if self.disk_enabled:
+            try:
+                row = self._db().execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and now - row[1] < self.ttl:
+                    self._db().execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[0], row[1])
+                    self._count("disk_hits")
+                    return row[0]
+            except Exception:
+                pass
+        return None
+
+    def set(self, key, value, writer=None):
+        # With a writer (an Executor) the SQLite write runs on its thread; the memory tier has the value at once
+        now = time.time()
+        self._remember(key, value, now)
+        self._count("stores")
+        if writer is None:
+            self._persist(key, value, now)
+        else:
+            writer.submit(self._persist, key, value, now)
+
+    def _persist(self, key, value, now):
+        if not self.disk_enabled:
+            return
+        try:
+            self._db().execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            with self._lock:
+                self._writes += 1
+                due = self._writes % EVICT_EVERY == 0
+            if due:
+                self.evict()
+        except Exception:
+            pass
+
+    def evict(self):
+        db = self._db()
+        expired = db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)).rowcount
+        overflow = db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.disk_items,),
+        ).rowcount
+        with self._lock:
+            self.stats["evictions"] += max(expired, 0) + max(overflow, 0)
+        if self.on_evict and (expired > 0 or overflow > 0):
+            self.on_evict()
+
+    def lead(self, key):
+        # Returns (flight, is_leader); followers await flight.done, the leader must call finish().
+        # Called from a coroutine on the shared event loop.
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._inflight[key] = _Flight(asyncio.get_running_loop())
+                self.stats["misses"] += 1
+                return flight, True
+            self.stats["coalesced"] += 1
+            return flight, False
+
+    def finish(self, key, flight, result=None, store=True, writer=None):
+        flight.result = result
+        try:
+            if result is not None and store:
+                self.set(key, result, writer)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.loop.call_soon_threadsafe(_settle, flight.done)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_items"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"] + stats["coalesced"]
+        total = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / total, 3) if total else 0.0
+        try:
+            stats["disk_items"] = self._db().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except Exception:
+            stats["disk_items"] = 0
+        return stats
@@ -0,0 +1,21 @@
+import sqlite3
+import threading
+
+# --- SHARED SQLITE HELPERS ---
+# One connection per thread per database file, WAL mode so readers never block writers.
+
+_local = threading.local()
+
+
+def connect(path):
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conns[path] = conn
+    return conn
@@ -0,0 +1,165 @@
+import csv
+import io
+import os
+import re
+import time
+from datetime import datetime
+
+from storage import connect
+
+# --- SUBSCRIBER STORE ---
+# Subscribers live in SQLite keyed by their lowercased email, so a repeat signup is a single
+# primary-key lookup and never a scan. Digest deliveries are tracked per
+# (campaign, email) in the same file: that table is the mailer's resumable progress.
+
+SUBSCRIBERS_FILE = "subscribers.sqlite"
+LEGACY_CSV = "subscribers.csv"
+CSV_HEADER = ["Email", "Subscribed", "Source", "Status"]
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+ACTIVE, UNSUBSCRIBED = "active", "unsubscribed"
+PENDING, SENT, FAILED = "pending", "sent", "failed"
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def is_valid_email(email):
+    return bool(EMAIL_PATTERN.match(normalize_email(email)))
+
+
+class SubscriberStore:
+    def __init__(self, path=SUBSCRIBERS_FILE, legacy_csv=LEGACY_CSV):
+        self.path = path
+        self._init_db()
+        if legacy_csv and os.path.isfile(legacy_csv) and self.count() == 0:
+            self.import_csv(legacy_csv)
+
+    def _db(self):
+        return connect(self.path)
+
+    def _init_db(self):
+        db = self._db()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS subscribers ("
+            "email TEXT PRIMARY KEY, created TEXT NOT NULL, source TEXT, status TEXT NOT NULL DEFAULT 'active') "
+            "WITHOUT ROWID"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_subscribers_created ON subscribers(created)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            "campaign TEXT NOT NULL, email TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+            "attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, updated REAL, PRIMARY KEY (campaign, email)) "
+            "WITHOUT ROWID"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_deliveries_status ON deliveries(campaign, status, email)")
+
+    # --- SUBSCRIBERS ---
+    def add(self, email, source="home", created=None):
+        # True for a new (or returning, previously unsubscribed) subscriber, False for a duplicate
+        email = normalize_email(email)
+        if not EMAIL_PATTERN.match(email):
+            return False
+        stamp = (created or datetime.now()).isoformat(sep=" ", timespec="seconds")
+        cursor = self._db().execute(
+            "INSERT INTO subscribers (email, created, source) VALUES (?, ?, ?) "
+            "ON CONFLICT(email) DO UPDATE SET status = 'active' WHERE status != 'active'",
+            (email, stamp, source),
+        )
+        return cursor.rowcount == 1
+
+    def unsubscribe(self, email):
+        cursor = self._db().execute(
+            "UPDATE subscribers SET status = ? WHERE email = ? AND status = ?", (UNSUBSCRIBED, normalize_email(email), ACTIVE)
+        )
+        return cursor.rowcount == 1
+
+    def count(self, status=None):
+        if status is None:
+            return self._db().execute("SELECT COUNT(*) FROM subscribers").fetchone()[0]
+        return self._db().execute("SELECT COUNT(*) FROM subscribers WHERE status = ?", (status,)).fetchone()[0]
+
+    def summary(self):
+        counts = dict(self._db().execute("SELECT status, COUNT(*) FROM subscribers GROUP BY status").fetchall())
+        today = datetime.now().strftime("%Y-%m-%d")
+        new_today = self._db().execute("SELECT COUNT(*) FROM subscribers WHERE created >= ?", (today,)).fetchone()[0]
+        return {"active": counts.get(ACTIVE, 0), "unsubscribed": counts.get(UNSUBSCRIBED, 0), "today": new_today}
+
+    def recent(self, limit=50, before=None):
+        # Newest first; pass the last row's (created, email) as before for the next page
+        sql = "SELECT email, created, source, status FROM subscribers"
+        params = []
+        if before:
+            sql += " WHERE (created, email) < (?, ?)"
+            params += list(before)
+        rows = self._db().execute(sql + " ORDER BY created DESC, email DESC LIMIT ?", params + [limit]).fetchall()
+        return [dict(zip(("email", "created", "source", "status"), row)) for row in rows]
+
+    def export_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(self._db().execute("SELECT email, created, source, status FROM subscribers ORDER BY created"))
+        return buffer.getvalue().encode("utf-8")
+
+    def import_csv(self, path):
+        # Old subscribers.csv: one email per row, optionally followed by a date
+        rows = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                email = normalize_email(row[0]) if row else ""
+                if EMAIL_PATTERN.match(email):
+                    stamp = row[1][:19] if len(row) > 1 and row[1][:4].isdigit() else datetime.now().isoformat(sep=" ", timespec="seconds")
+                    rows.append((email, stamp, "csv"))
+        self._db().executemany("INSERT OR IGNORE INTO subscribers (email, created, source) VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    # --- DELIVERIES ---
+    def start_campaign(self, campaign):
+        # Adds every active subscriber not yet part of the campaign; re-running only picks up new ones
+        cursor = self._db().execute(
+            "INSERT OR IGNORE INTO deliveries (campaign, email, updated) SELECT ?, email, ? FROM subscribers WHERE status = ?",
+            (campaign, time.time(), ACTIVE),
+        )
+        return cursor.rowcount
+
+    def pending(self, campaign, limit=500, after=""):
+        # Keyset pages of recipients still to send, in email order
+        rows = self._db().execute(
+            "SELECT email, attempts FROM deliveries WHERE campaign = ? AND status = ? AND email > ? ORDER BY email LIMIT ?",
+            (campaign, PENDING, after, limit),
+        ).fetchall()
+        return rows
+
+    def mark_sent(self, campaign, email):
+        self._db().execute(
+            "UPDATE deliveries SET status = ?, attempts = attempts + 1, last_error = NULL, updated = ? WHERE campaign = ? AND email = ?",
+            (SENT, time.time(), campaign, email),
+        )
+
+    def mark_failed(self, campaign, email, error, final=False):
+        # Not final: stays pending for the next pass or run
+        self._db().execute(
+            "UPDATE deliveries SET status = ?, attempts = attempts + 1, last_error = ?, updated = ? WHERE campaign = ? AND email = ?",
+            (FAILED if final else PENDING, str(error)[:500], time.time(), campaign, email),
+        )
+
+    def delivery_counts(self, campaign):
+        counts = dict(self._db().execute(
+            "SELECT status, COUNT(*) FROM deliveries WHERE campaign = ? GROUP BY status", (campaign,)
+        ).fetchall())
+        return {status: counts.get(status, 0) for status in (PENDING, SENT, FAILED)}
+
+    def campaign_progress(self, limit=20):
+        rows = self._db().execute(
+            "SELECT campaign, status, COUNT(*), MAX(updated) FROM deliveries "
+            "WHERE campaign IN (SELECT campaign FROM deliveries GROUP BY campaign ORDER BY MAX(updated) DESC LIMIT ?) "
+            "GROUP BY campaign, status",
+            (limit,),
+        ).fetchall()
+        progress = {}
+        for campaign, status, count, updated in rows:
+            entry = progress.setdefault(campaign, {"campaign": campaign, PENDING: 0, SENT: 0, FAILED: 0, "updated": 0})
+            entry[status] = count
+            entry["updated"] = max(entry["updated"], updated or 0)
+        return sorted(progress.values(), key=lambda p: -p["updated"])
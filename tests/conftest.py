@@ -0,0 +1,46 @@
+import asyncio
+import importlib
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # The stores open their files in the working directory; the data files are read from it too
+    for path in ROOT.glob("*.json"):
+        shutil.copy(path, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    # Connections are cached per thread by (relative) path; start from none
+    import storage
+    monkeypatch.setattr(storage, "_local", threading.local())
+    return tmp_path
+
+
+@pytest.fixture
+def utils(workdir, monkeypatch):
+    sys.modules.pop("utils", None)
+    module = importlib.import_module("utils")
+    monkeypatch.setattr(module, "GROQ_KEY", "test")
+    monkeypatch.setattr(module, "GEMINI_KEY", None)
+    monkeypatch.setattr(module, "HF_KEY", "")
+    monkeypatch.setattr(module, "ANTHROPIC_KEY", "")
+    # A quota wide enough that only admission control can make a request wait
+    monkeypatch.setattr(module, "health", module.HealthRegistry({module.ENGINE_GROQ: 60000}))
+    yield module
+    sys.modules.pop("utils", None)
+
+
+def stub_engine(calls, reply="शुद्ध पाठ", delay=0.0):
+    # Stands in for utils.stream_engine_async: records the user text, waits, then replies
+    async def stream_engine_async(engine_key, system_prompt, user_text, max_tokens=None):
+        calls.append(user_text)
+        await asyncio.sleep(delay)
+        yield reply
+    return stream_engine_async
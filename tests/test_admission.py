@@ -0,0 +1,141 @@
+import asyncio
+import random
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import admission
+import pytest
+from admission import AdmissionController, QueueFull
+from provider_health import ProviderError, get_retry_after, parse_retry_after
+
+
+@pytest.fixture
+def slept(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+    monkeypatch.setattr(admission.asyncio, "sleep", sleep)
+    random.seed(7)
+    return delays
+
+
+def retry_until_given_up(controller, retry_after=None, timeout=None):
+    async def run():
+        ticket = controller.new_ticket("s", "Nirmal-Bhasha", timeout)
+        await controller.acquire(ticket)
+        with pytest.raises(QueueFull):
+            while True:
+                await controller.retry(ticket, retry_after)
+        return ticket
+    return asyncio.run(run())
+
+
+def test_retry_backs_off_exponentially_with_full_jitter(slept):
+    ticket = retry_until_given_up(AdmissionController())
+    assert ticket.retries == admission.RETRY_LIMIT + 1
+    assert len(slept) == admission.RETRY_LIMIT
+    for attempt, delay in enumerate(slept, 1):
+        assert 0 <= delay <= min(admission.MAX_RETRY_DELAY, admission.RETRY_DELAY * 2 ** (attempt - 1))
+
+
+def test_requests_throttled_together_spread_out(slept):
+    controller = AdmissionController()
+
+    async def run():
+        tickets = [controller.new_ticket(f"s{i}", "Nirmal-Bhasha") for i in range(50)]
+        for ticket in tickets:
+            await controller.acquire(ticket)
+        await asyncio.gather(*[controller.retry(ticket) for ticket in tickets])
+    asyncio.run(run())
+    assert len(set(slept)) == 50
+    assert max(slept) - min(slept) > admission.RETRY_DELAY / 2
+
+
+def test_retry_waits_at_least_retry_after(slept):
+    retry_until_given_up(AdmissionController(), retry_after=3)
+    assert len(slept) == admission.RETRY_LIMIT
+    assert all(delay >= 3 for delay in slept)
+
+
+def test_retry_after_beyond_the_ticket_deadline_gives_up_at_once(slept):
+    retry_until_given_up(AdmissionController(), retry_after=120, timeout=30)
+    assert slept == []
+
+
+def test_retry_after_is_read_from_headers_and_errors():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert 25 < parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert get_retry_after(ProviderError("busy", 429, retry_after=2.0)) == 2.0
+    sdk_error = SimpleNamespace(response=SimpleNamespace(status_code=429, headers={"retry-after": "5"}))
+    assert get_retry_after(sdk_error) == 5.0
+    assert get_retry_after(ValueError("no response")) is None
+
+
+def start_order(controller, blocker, tickets):
+    # Releases the running ticket one at a time and records which waiting ticket takes the slot
+    async def run():
+        await controller.acquire(blocker)
+        tasks = [asyncio.create_task(controller.acquire(ticket)) for ticket in tickets]
+        await asyncio.sleep(0)
+        order, running = [], blocker
+        for _ in tickets:
+            controller.release(running)
+            running = next(t for t in tickets if t.state == admission.RUNNING)
+            order.append(running)
+        controller.release(running)
+        await asyncio.gather(*tasks)
+        return order
+    return asyncio.run(run())
+
+
+def test_heavier_tools_get_more_of_a_contended_slot():
+    controller = AdmissionController(max_running=1)
+    blocker = controller.new_ticket("x", "other")
+    tickets = ([controller.new_ticket(f"n{i}", "Nibandh-Lekhan") for i in range(4)]
+               + [controller.new_ticket(f"m{i}", "Nirmal-Bhasha") for i in range(4)])
+    order = [ticket.tool for ticket in start_order(controller, blocker, tickets)]
+    assert order == ["Nibandh-Lekhan"] + ["Nirmal-Bhasha"] * 4 + ["Nibandh-Lekhan"] * 3
+
+
+def test_a_freed_slot_goes_to_the_session_under_its_share():
+    controller = AdmissionController(max_running=2, session_running=1)
+    busy = [controller.new_ticket("busy", "Nirmal-Bhasha") for _ in range(3)]
+    calm = controller.new_ticket("calm", "Nirmal-Bhasha")
+
+    async def run():
+        # Nobody waits yet, so the busy session may take both slots
+        await controller.acquire(busy[0])
+        await controller.acquire(busy[1])
+        tasks = [asyncio.create_task(controller.acquire(ticket)) for ticket in (busy[2], calm)]
+        await asyncio.sleep(0)
+        controller.release(busy[0])
+        assert calm.state == admission.RUNNING and busy[2].state == admission.QUEUED
+        controller.release(busy[1])
+        await asyncio.gather(*tasks)
+        for ticket in (busy[2], calm):
+            controller.release(ticket)
+    asyncio.run(run())
+    assert controller.snapshot()["running"] == 0
+
+
+def test_queue_quotas_reject_instead_of_waiting():
+    controller = AdmissionController(max_running=1, max_queue=3, session_queued=2)
+
+    async def run():
+        await controller.acquire(controller.new_ticket("a", "Nirmal-Bhasha"))
+        waiting = [asyncio.create_task(controller.acquire(controller.new_ticket("a", "Nirmal-Bhasha"))) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull, match="session"):
+            await controller.acquire(controller.new_ticket("a", "Nirmal-Bhasha"))
+        waiting.append(asyncio.create_task(controller.acquire(controller.new_ticket("b", "Nirmal-Bhasha"))))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull, match="already waiting"):
+            await controller.acquire(controller.new_ticket("c", "Nirmal-Bhasha"))
+        for task in waiting:
+            task.cancel()
+    asyncio.run(run())
+    assert controller.snapshot()["rejected"] == 2
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from conftest import stub_engine
+
+
+class Rerun(Exception):
+    # Stands in for Streamlit's RerunException, raised from a widget call inside on_wait
+    pass
+
+
+def raise_rerun(*args):
+    raise Rerun()
+
+
+def test_iter_async_closes_generator_when_on_wait_raises(utils):
+    closed = []
+
+    async def slow():
+        try:
+            yield "first"
+            await asyncio.sleep(10)
+            yield "second"
+        finally:
+            closed.append(True)
+
+    chunks = utils.iter_async(slow(), raise_rerun, poll=0.05)
+    assert next(chunks) == "first"
+    with pytest.raises(Rerun):
+        next(chunks)
+    assert closed == [True]
+
+
+def test_rerun_while_streaming_releases_slot_and_flight(utils, monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine(calls, delay=10))
+    with pytest.raises(Rerun):
+        list(utils.stream_ai_response("prompt", "मेरी गाड़ी", "Llama 3.3 (via Groq)", tool="test", on_wait=raise_rerun))
+    assert calls == ["मेरी गाड़ी"]
+    assert utils.get_admission_stats()["running"] == 0
+    assert not utils.get_response_cache()._inflight
+
+    # The abandoned request left nothing behind, so the next identical one runs normally
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine(calls))
+    assert utils.get_ai_response("prompt", "मेरी गाड़ी", "Llama 3.3 (via Groq)", tool="test") == "शुद्ध पाठ"
+
+
+def test_wait_async_cancels_work_when_on_wait_raises(utils):
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(Rerun):
+        utils.wait_async(slow(), raise_rerun, poll=0.05)
+    utils.run_async(asyncio.sleep(0.05))
+    assert cancelled == [True]
@@ -0,0 +1,44 @@
+import json
+import re
+
+import batch
+from conftest import stub_engine
+
+ENGINE = "Llama 3.3 (via Groq)"
+SENTENCE = "मेरी गाड़ी और मेरा दफ्तर दूर है।"
+
+
+def write_rows(path, rows, tail=""):
+    path.write_text("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows) + tail, encoding="utf-8")
+
+
+def test_resume_skips_finished_and_retries_failed_rows(utils, workdir, monkeypatch):
+    monkeypatch.setattr(batch, "utils", utils)
+    calls = []
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine(calls))
+    source, output = workdir / "in.jsonl", workdir / "out.jsonl"
+    write_rows(source, [{"id": i, "text": f"{SENTENCE[:-1]} {i}।"} for i in range(1, 5)])
+    write_rows(output, [
+        {"id": "1", "output": "ok", "fallback": False},
+        {"id": "2", "error": "Groq Busy"},
+        {"id": "3", "output": "fallback", "fallback": True},
+    ], tail='{"id": "4", "outp')
+
+    assert batch.load_done_ids(output) == {"1"}
+    # The half-written line a crash left behind is dropped
+    assert output.read_text(encoding="utf-8").endswith("\n")
+
+    stats = batch.run_batch(str(source), str(output), engine=ENGINE, concurrency=2, log=lambda *_: None)
+    assert stats == {"done": 3, "skipped": 1, "failed": 0}
+    assert len(calls) == 3
+    assert batch.load_done_ids(output) == {"1", "2", "3", "4"}
+
+
+def test_long_record_reports_the_score_of_its_report(utils, monkeypatch):
+    monkeypatch.setattr(batch, "utils", utils)
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine([], json.dumps({"foreign_words": []})))
+    text = " ".join(f"{SENTENCE[:-1]} {i}।" for i in range(150))
+    assert not utils.check_word_count(text)[0]
+
+    result = batch.run_tool("nirmal", {"text": text}, "text", ENGINE)
+    assert result["purity_score"] == int(re.search(r"\*\*(\d+)%\*\*", result["output"]).group(1))
@@ -0,0 +1,20 @@
+from conftest import stub_engine
+
+ENGINE = "Llama 3.3 (via Groq)"
+
+
+def test_prepare_input_reads_hinglish_in_devanagari(utils):
+    assert utils.prepare_input("meri gaadi kharab hai") == ("मेरी गाड़ी ख़राब है", True)
+    assert utils.prepare_input("Meri gadi kharab hai")[0] == "मेरी गाड़ी ख़राब है"
+    assert utils.prepare_input("मेरी गाड़ी खराब है") == ("मेरी गाड़ी खराब है", False)
+
+
+def test_model_gets_original_text_and_spellings_share_the_cache(utils, monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine(calls))
+    for text in ("Request for leave ke liye application", "request for leave ke liye application"):
+        reading = utils.prepare_input(text)[0]
+        reply = utils.get_ai_response(utils.build_vivek_prompt(reading), text, ENGINE, tool="Bhasha-Vivek", key_text=reading)
+        assert reply == "शुद्ध पाठ"
+    # Mixed input is not mangled on its way to the model, and the second spelling is a cache hit
+    assert calls == ["Request for leave ke liye application"]
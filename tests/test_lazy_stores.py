@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+PROBE = "import sys, utils; print(','.join(m for m in ('numpy', 'near_duplicates', 'corpus_profiler') if m in sys.modules))"
+
+
+def test_importing_utils_opens_no_store_and_skips_numpy(workdir):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    loaded = subprocess.run([sys.executable, "-c", PROBE], cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    assert loaded.stdout.strip() == ""
+    assert not list(workdir.glob("*.sqlite*"))
+
+
+def test_stores_open_on_first_use(utils, workdir):
+    assert utils.response_cache is None and utils.subscribers is None
+    assert utils.save_subscriber("reader@example.com")
+    assert utils.get_subscribers() is utils.subscribers
+    assert (workdir / "subscribers.sqlite").exists()
+    assert not (workdir / "response_cache.sqlite").exists()
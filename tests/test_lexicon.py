@@ -0,0 +1,42 @@
+import os
+
+import lexicon
+import pytest
+from lexicon import CompiledLexicon, Lexicon, get_lexicon, load_rules
+from lexicon_build import compile_lexicon, publish
+
+TEXT = "मेरी गाड़ी में दोस्त की किताब और आज का अख़बार है।"
+
+
+def build_pair():
+    rules = load_rules()
+    return Lexicon(rules), CompiledLexicon(publish(compile_lexicon(rules)))
+
+
+def test_compiled_lexicon_answers_like_the_json_rules(workdir):
+    source, compiled = build_pair()
+    assert len(compiled.rules) == len(source.rules)
+    assert list(compiled.rules) == source.rules
+    for word in ("गाड़ी", "gaadi", "Kitaab", "अखबार", "नहीं"):
+        assert compiled.lookup(word) == source.lookup(word)
+    assert compiled.scan(TEXT) == source.scan(TEXT)
+    assert compiled.match_ids(TEXT) == source.match_ids(TEXT)
+    assert [rule["word"] for _, rule in compiled.prefix("दो")] == ["Dost (दोस्त)"]
+
+
+def test_a_newer_corrections_file_wins_until_rebuilt(workdir):
+    publish(compile_lexicon(load_rules()))
+    assert isinstance(get_lexicon(), CompiledLexicon)
+    later = os.stat(lexicon.COMPILED_FILE).st_mtime_ns + 10**9
+    os.utime(lexicon.RULES_FILE, ns=(later, later))
+    assert isinstance(get_lexicon(), Lexicon)
+    publish(compile_lexicon(load_rules()))
+    os.utime(lexicon.COMPILED_FILE, ns=(later + 10**9, later + 10**9))
+    assert isinstance(get_lexicon(), CompiledLexicon)
+
+
+def test_a_corrupt_file_is_not_published(workdir):
+    with pytest.raises(ValueError):
+        publish(b"not a lexicon")
+    assert not os.path.exists(lexicon.COMPILED_FILE)
+    assert not [name for name in os.listdir(".") if name.startswith(".lexicon-")]
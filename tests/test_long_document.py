@@ -0,0 +1,42 @@
+import json
+
+from conftest import ROOT, stub_engine
+from streamlit.testing.v1 import AppTest
+
+PAGE = ROOT / "pages" / "01_🌸_Nirmal_Bhasha.py"
+# 16 chunks of about 300 words, every sentence different so no two chunks share a cache entry
+LONG_TEXT = " ".join(f"वाक्य {i} में मेरी गाड़ी खराब है और मुझे दफ्तर जाना है।" for i in range(400))
+CHUNK_REPLY = json.dumps({"foreign_words": [], "refined": "शुद्ध पाठ"}, ensure_ascii=False)
+
+
+def analyze(text):
+    at = AppTest.from_file(str(PAGE), default_timeout=60).run()
+    at.selectbox[0].select("Llama 3.3 (via Groq) - Fastest")
+    at.text_area[0].input(text)
+    at.button[0].click().run()
+    assert not at.exception
+    return at, "\n".join(m.value for m in at.markdown)
+
+
+def test_long_document_runs_through_page(utils, monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine(calls, CHUNK_REPLY))
+    at, shown = analyze(LONG_TEXT)
+    parts = len(utils.chunk_text(LONG_TEXT))
+    assert parts > utils.admission.session_queued
+    assert f"analysed in {parts} parts" in shown
+    assert "could not be refined" not in shown
+    assert len(calls) == parts
+
+
+def test_long_document_waits_for_slots_on_busy_server(utils, monkeypatch):
+    # One slot for the whole server: every part but one has to queue, and none may be turned away
+    calls, places = [], []
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine(calls, CHUNK_REPLY, delay=0.1))
+    monkeypatch.setattr(utils, "admission", utils.AdmissionController(max_running=1))
+    monkeypatch.setattr(utils, "queue_notice", lambda slot: places.append)
+    at, shown = analyze(LONG_TEXT)
+    assert "could not be refined" not in shown
+    assert len(calls) == len(utils.chunk_text(LONG_TEXT))
+    assert any(place and place["position"] >= 1 for place in places)
+    assert places[-1] is None
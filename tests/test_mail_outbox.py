@@ -0,0 +1,81 @@
+import smtplib
+import sqlite3
+import time
+
+import mail_outbox
+import pytest
+from mail_outbox import MailOutbox, SMTPConnection
+
+
+@pytest.fixture
+def sent(workdir, monkeypatch):
+    delivered = []
+    monkeypatch.setattr(SMTPConnection, "send", lambda self, sender, recipient, message: delivered.append(recipient))
+    monkeypatch.setattr(SMTPConnection, "close", lambda self: None)
+    return delivered
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_enqueued_mail_is_delivered(sent):
+    outbox = MailOutbox("from@example.com")
+    job = outbox.enqueue("to@example.com", "hello")
+    wait_for(lambda: outbox.get_status(job)["status"] == "sent")
+    outbox.stop()
+    assert sent == ["to@example.com"]
+
+
+def test_failed_send_backs_off_then_gives_up(workdir, monkeypatch):
+    def refuse(self, sender, recipient, message):
+        raise OSError("connection refused")
+    monkeypatch.setattr(SMTPConnection, "send", refuse)
+    outbox = MailOutbox("from@example.com")
+    job = outbox.enqueue("to@example.com", "hello")
+    wait_for(lambda: outbox.get_status(job)["attempts"] == 1)
+    outbox.stop()
+    status = outbox.get_status(job)
+    assert status["status"] == "queued" and "refused" in status["last_error"]
+    assert outbox.claim_batch() == []  # in backoff, not due yet
+    for attempts in range(2, mail_outbox.MAX_ATTEMPTS + 1):
+        outbox._mark_failed(job, attempts - 1, OSError("still down"))
+    assert outbox.get_status(job)["status"] == "failed"
+
+
+def test_refused_recipient_fails_at_once(workdir, monkeypatch):
+    def refuse(self, sender, recipient, message):
+        raise smtplib.SMTPRecipientsRefused({recipient: (550, b"no such user")})
+    monkeypatch.setattr(SMTPConnection, "send", refuse)
+    outbox = MailOutbox("from@example.com")
+    job = outbox.enqueue("nobody@example.com", "hello")
+    wait_for(lambda: outbox.get_status(job)["status"] == "failed")
+    outbox.stop()
+    assert outbox.get_status(job)["attempts"] == 1
+
+
+def test_pending_mail_is_delivered_after_a_restart(sent):
+    # Rows an earlier process left behind: one due, one leased by a worker that died
+    MailOutbox("from@example.com")
+    now = time.time()
+    db = sqlite3.connect(mail_outbox.OUTBOX_FILE, isolation_level=None)
+    db.execute("INSERT INTO outbox (recipient, message, next_attempt, created) VALUES ('due@example.com', 'm', ?, ?)", (now, now))
+    db.execute("INSERT INTO outbox (recipient, message, status, next_attempt, claimed_at, created) "
+               "VALUES ('leased@example.com', 'm', 'sending', ?, ?, ?)", (now, now - mail_outbox.LEASE_SECONDS - 1, now))
+    db.close()
+
+    restarted = MailOutbox("from@example.com")
+    wait_for(lambda: restarted.get_counts() == {"sent": 2})
+    restarted.stop()
+    assert sorted(sent) == ["due@example.com", "leased@example.com"]
+
+
+def test_live_lease_is_not_taken_over(workdir):
+    outbox = MailOutbox("from@example.com")
+    now = time.time()
+    outbox._db().execute("INSERT INTO outbox (recipient, message, status, next_attempt, claimed_at, created) "
+                         "VALUES ('busy@example.com', 'm', 'sending', ?, ?, ?)", (now, now, now))
+    assert outbox.claim_batch() == []
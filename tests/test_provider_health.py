@@ -0,0 +1,53 @@
+import time
+from types import SimpleNamespace
+
+import provider_health
+import pytest
+from provider_health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+    monkeypatch.setattr(provider_health, "time", SimpleNamespace(monotonic=lambda: now[0], sleep=sleep, time=time.time))
+    return now
+
+
+def test_token_bucket_allows_a_burst_then_the_rate(clock):
+    bucket = TokenBucket(60, burst=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    clock[0] += 1
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    # Waiting for a token within the timeout
+    started = clock[0]
+    assert bucket.try_acquire(timeout=2)
+    assert clock[0] - started == pytest.approx(1)
+    clock[0] += 60
+    assert bucket.available() == 2
+
+
+def test_breaker_opens_probes_once_and_backs_off(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow()  # the probe
+    assert breaker.state == HALF_OPEN and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.reset_timeout == 60
+
+    clock[0] += 30
+    assert not breaker.would_allow()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.reset_timeout == 30 and breaker.allow()
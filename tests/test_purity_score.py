@@ -0,0 +1,28 @@
+import json
+import re
+
+from conftest import stub_engine
+
+ENGINE = "Llama 3.3 (via Groq)"
+SENTENCE = "मेरी गाड़ी और मेरा दफ्तर दूर है।"
+ENGINE_REPLY = json.dumps({"foreign_words": [{"word": "दफ्तर", "origin": "Persian", "replacement": "कार्यालय"}],
+                           "refined": "मेरा वाहन और मेरा कार्यालय दूर है।"}, ensure_ascii=False)
+
+
+def score(report):
+    return int(re.search(r"\*\*(\d+)%\*\*", report).group(1))
+
+
+def test_short_and_long_texts_are_scored_alike(utils, monkeypatch):
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine([], ENGINE_REPLY))
+    short_text = SENTENCE
+    long_text = " ".join(f"{SENTENCE[:-1]} {i}।" for i in range(150))
+    assert utils.check_word_count(short_text)[0] and not utils.check_word_count(long_text)[0]
+
+    short_report = utils.analyze_purity(short_text, ENGINE)
+    long_report = utils.analyze_purity(long_text, ENGINE)
+    assert score(short_report) == utils.scan_purity(short_text)["purity_score"]
+    assert score(long_report) == utils.scan_purity(long_text)["purity_score"]
+    assert score(short_report) == score(long_report)
+    # Words only the engine found are listed, not scored
+    assert "### 🔍 Other Foreign Words" in long_report and "| दफ्तर | Persian | कार्यालय |" in long_report
@@ -0,0 +1,101 @@
+import asyncio
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+import response_cache
+from conftest import stub_engine
+from response_cache import ResponseCache
+
+ENGINE = "Llama 3.3 (via Groq)"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_the_ttl(workdir, clock):
+    cache = ResponseCache("cache.sqlite", ttl=60)
+    cache.set("k", "उत्तर")
+    clock[0] += 59
+    assert cache.get("k") == "उत्तर"
+    clock[0] += 2
+    assert cache.get("k") is None
+    # Expired on disk too: a fresh process does not serve it either
+    assert ResponseCache("cache.sqlite", ttl=60).get("k") is None
+
+
+def test_memory_tier_is_lru_and_disk_eviction_keeps_recent_entries(workdir, clock):
+    cache = ResponseCache("cache.sqlite", memory_items=2, disk_items=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+        clock[0] += 1
+    assert cache.get_stats()["memory_items"] == 2
+    assert cache.get("a") == "A"  # from disk, back in memory
+    assert cache.stats["disk_hits"] == 1
+    clock[0] += 1
+    cache.evict()
+    assert cache.get_stats()["disk_items"] == 2
+    fresh = ResponseCache("cache.sqlite")
+    assert fresh.get("b") is None and fresh.get("a") == "A" and fresh.get("c") == "C"
+
+
+def test_identical_requests_in_flight_share_one_call(utils, monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine(calls, delay=0.2))
+
+    async def burst():
+        return await asyncio.gather(*[utils.get_ai_response_async("prompt", "मेरी गाड़ी", ENGINE, tool="test") for _ in range(5)])
+    assert utils.run_async(burst()) == ["शुद्ध पाठ"] * 5
+    assert calls == ["मेरी गाड़ी"]
+    assert utils.get_cache_stats()["coalesced"] == 4
+
+
+def test_locked_cache_file_does_not_stall_generations(utils, monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "stream_engine_async", stub_engine(calls))
+    # The cache and the near-duplicate index create their tables before another process takes the write lock
+    utils.get_cache_stats()
+    lock = sqlite3.connect(utils.get_response_cache().path)
+    lock.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.monotonic()
+        for text in ("पहला पाठ", "दूसरा पाठ", "पहला पाठ"):
+            assert utils.get_ai_response("prompt", text, ENGINE, tool="test") == "शुद्ध पाठ"
+        # The writes wait on the writer thread; the repeat is served from memory meanwhile
+        assert time.monotonic() - started < 2
+        assert calls == ["पहला पाठ", "दूसरा पाठ"]
+    finally:
+        lock.rollback()
+        lock.close()
+    utils.cache_writer.submit(lambda: None).result(timeout=30)
+    rows = sqlite3.connect(utils.get_response_cache().path).execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    assert rows == 2
+
+
+def test_eviction_prunes_the_near_duplicate_index(workdir):
+    from near_duplicates import NearDuplicateIndex, make_group
+    from response_cache import ResponseCache
+
+    index = NearDuplicateIndex("cache.sqlite")
+    cache = ResponseCache("cache.sqlite", disk_items=1, on_evict=index.prune)
+    group = make_group("test", "prompt", ENGINE)
+    old, new = "मेरी गाड़ी और मेरा दफ्तर बहुत दूर है, इसलिए मैं जल्दी निकलता हूँ।", "आज मौसम बहुत सुहावना है और बच्चे बगीचे में खेल रहे हैं।"
+    for key, text in (("old", old), ("new", new)):
+        cache.set(key, "उत्तर")
+        index.add(group, text, key)
+        time.sleep(0.01)
+    assert index.find(group, old)[0] == "old"
+
+    cache.evict()
+    assert index.find(group, old) is None
+    assert index.find(group, new)[0] == "new"
+    rows = sqlite3.connect("cache.sqlite").execute("SELECT key FROM near_duplicates").fetchall()
+    assert rows == [("new",)]
+    # Rows orphaned while no index was open are dropped when one loads
+    sqlite3.connect("cache.sqlite", isolation_level=None).execute("DELETE FROM responses")
+    assert NearDuplicateIndex("cache.sqlite").get_stats()["items"] == 0
@@ -0,0 +1,24 @@
+from subscribers import SubscriberStore, is_valid_email
+
+
+def test_email_validation():
+    assert is_valid_email(" Reader@Example.com ")
+    for email in ("", None, "reader", "reader@example", "a b@example.com", "@example.com"):
+        assert not is_valid_email(email)
+
+
+def test_signups_are_deduplicated_and_can_return(workdir):
+    store = SubscriberStore()
+    assert store.add("Reader@Example.com ")
+    assert not store.add("reader@example.com")
+    assert not store.add("not-an-email")
+    assert store.unsubscribe("READER@example.com")
+    assert store.summary()["unsubscribed"] == 1
+    assert store.add("reader@example.com")
+    assert store.summary() == {"active": 1, "unsubscribed": 0, "today": 1}
+
+
+def test_legacy_csv_is_imported_once(workdir):
+    (workdir / "subscribers.csv").write_text("a@example.com,2024-01-01\nb@example.com\nbad\n", encoding="utf-8")
+    assert SubscriberStore().count() == 2
+    assert SubscriberStore().count() == 2
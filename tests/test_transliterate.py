@@ -0,0 +1,17 @@
+from transliterate import Transliterator, is_hinglish, to_devanagari
+
+
+def test_only_latin_words_change(workdir):
+    assert to_devanagari("Meri gaadi, 2 din se kharab hai! मैं क्या करूँ?") == "मेरी गाड़ी, 2 दिन से ख़राब है! मैं क्या करूँ?"
+
+
+def test_word_list_wins_over_the_rules():
+    transliterator = Transliterator({"gadi": "गाड़ी"})
+    assert transliterator.transliterate("Gadi kamal") == "गाड़ी कमल"
+
+
+def test_hinglish_is_told_apart_from_english(workdir):
+    assert is_hinglish("meri gaadi kharab hai")
+    assert not is_hinglish("My car is broken today")
+    assert not is_hinglish("मेरी गाड़ी खराब है")
+    assert not is_hinglish("")
@@ -0,0 +1,36 @@
+import re
+import unicodedata
+
+# --- INPUT NORMALIZATION ---
+# clean_text() is applied to everything sent to a provider and to exact cache keys; it
+# never changes meaning. fold_text() is far more aggressive and only used by the
+# near-duplicate index, so trivially different inputs look alike there.
+
+INVISIBLE = dict.fromkeys(map(ord, "\u200b\u2060\ufeff\u00ad"))
+# ZWJ/ZWNJ only change how a Devanagari conjunct is drawn, so they are dropped from keys only
+JOINERS = dict.fromkeys(map(ord, "\u200c\u200d"))
+NUKTA = "\u093c"
+CHANDRABINDU, ANUSVARA = "\u0901", "\u0902"
+HORIZONTAL_SPACE = re.compile(r"[^\S\n]+")
+BLANK_LINES = re.compile(r"\n\s*\n\s*")
+SPACE_BEFORE_PUNCT = re.compile(r"\s+([,.;:!?।॥])")
+LATIN_LONG_VOWELS = (("ee", "i"), ("oo", "u"))
+REPEATED_VOWEL = re.compile(r"([aeiou])\1+")
+
+
+def clean_text(text):
+    # NFC, no zero-width characters, single spaces, at most one blank line between paragraphs
+    text = unicodedata.normalize("NFC", (text or "").replace("\r\n", "\n").replace("\r", "\n"))
+    text = text.translate(INVISIBLE)
+    lines = [HORIZONTAL_SPACE.sub(" ", line).strip() for line in text.split("\n")]
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def fold_text(text):
+    # Key form: ज़/ज, ँ/ं, case, whitespace and romanized vowel length ("Aatmanirbhar" = "Atmanirbhar") fold together
+    text = unicodedata.normalize("NFC", text or "").translate(INVISIBLE).translate(JOINERS)
+    text = text.replace(NUKTA, "").replace(CHANDRABINDU, ANUSVARA).casefold()
+    for long, short in LATIN_LONG_VOWELS:
+        text = text.replace(long, short)
+    text = REPEATED_VOWEL.sub(r"\1", text)
+    return SPACE_BEFORE_PUNCT.sub(r"\1", " ".join(text.split()))
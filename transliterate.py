@@ -0,0 +1,159 @@
+import json
+import os
+import re
+import threading
+
+from lexicon import get_lexicon, split_display
+
+# --- HINGLISH TRANSLITERATION ---
+# Romanized Hindi ("Meri gaadi kharab hai") is converted to Devanagari locally, before any
+# LLM call: a dictionary of common spellings first, then a longest-match rule automaton.
+
+WORDS_FILE = "hinglish_words.json"
+
+LATIN_WORD = re.compile(r"[A-Za-z]+")
+DEVANAGARI_WORD = re.compile(r"[ऀ-ॿ]+")
+HALANT = "्"
+ANUSVARA = "ं"
+
+# Romanization -> (independent vowel, matra)
+VOWELS = {
+    "a": ("अ", ""), "aa": ("आ", "ा"), "i": ("इ", "ि"), "ee": ("ई", "ी"), "ii": ("ई", "ी"),
+    "u": ("उ", "ु"), "oo": ("ऊ", "ू"), "uu": ("ऊ", "ू"), "e": ("ए", "े"), "ai": ("ऐ", "ै"),
+    "ei": ("ऐ", "ै"), "o": ("ओ", "ो"), "au": ("औ", "ौ"), "ou": ("औ", "ौ"),
+}
+
+CONSONANTS = {
+    "k": "क", "kh": "ख", "g": "ग", "gh": "घ", "c": "क", "ch": "च", "chh": "छ", "cch": "च्छ", "cchh": "च्छ",
+    "j": "ज", "jh": "झ", "t": "त", "th": "थ", "d": "द", "dh": "ध", "n": "न", "p": "प", "ph": "फ",
+    "f": "फ़", "b": "ब", "bh": "भ", "m": "म", "y": "य", "r": "र", "l": "ल", "v": "व", "w": "व",
+    "s": "स", "sh": "श", "h": "ह", "z": "ज़", "q": "क़", "x": "क्स", "ksh": "क्ष",
+}
+
+
+class RuleAutomaton:
+    # Longest-match tokenizer over the romanization tables, compiled into one lookup
+    def __init__(self, vowels=VOWELS, consonants=CONSONANTS):
+        self.table = {}
+        for pattern, forms in vowels.items():
+            self.table[pattern] = ("V", forms)
+        for pattern, letter in consonants.items():
+            self.table[pattern] = ("C", letter)
+        self.max_len = max(len(p) for p in self.table)
+
+    def tokens(self, word):
+        i, n = 0, len(word)
+        while i < n:
+            for size in range(min(self.max_len, n - i), 0, -1):
+                match = self.table.get(word[i:i + size])
+                if match:
+                    yield match[0], match[1], word[i:i + size]
+                    i += size
+                    break
+            else:
+                yield "O", word[i], word[i]
+                i += 1
+
+    def transliterate(self, word):
+        tokens = list(self.tokens(word))
+        out, prev_consonant = [], False
+        for index, (kind, value, raw) in enumerate(tokens):
+            last = index == len(tokens) - 1
+            if kind == "C":
+                nxt = tokens[index + 1] if not last else None
+                # n/m between a vowel and another consonant is a nasal: "hindi" -> हिंदी
+                if raw in ("n", "m") and index and not prev_consonant and nxt and nxt[0] == "C" and nxt[2] != raw:
+                    out.append(ANUSVARA)
+                    continue
+                if prev_consonant:
+                    out.append(HALANT)
+                out.append(value)
+                prev_consonant = True
+            elif kind == "V":
+                independent, matra = value
+                if prev_consonant:
+                    # Hinglish spells a word-final long vowel short: "mera", "meri"
+                    if last and raw == "a": matra = "ा"
+                    elif last and raw == "i": matra = "ी"
+                    out.append(matra)
+                else:
+                    out.append(independent)
+                prev_consonant = False
+            else:
+                out.append(value)
+                prev_consonant = False
+        return "".join(out)
+
+
+class Transliterator:
+    def __init__(self, words=None, markers=()):
+        self.words = {k.lower(): v for k, v in (words or {}).items()}
+        self.markers = frozenset(m.lower() for m in markers)
+        self.automaton = RuleAutomaton()
+        self._memo = {}
+
+    def word(self, word):
+        key = word.lower()
+        result = self._memo.get(key)
+        if result is None:
+            result = self.words.get(key) or self.automaton.transliterate(key)
+            if len(self._memo) > 100000:
+                self._memo.clear()
+            self._memo[key] = result
+        return result
+
+    def transliterate(self, text):
+        # Only Latin words change; Devanagari, digits, spacing and punctuation are kept as they are
+        return LATIN_WORD.sub(lambda m: self.word(m.group(0)), text or "")
+
+    def is_hinglish(self, text):
+        # Mostly Latin script with several Hindi function words ("hai", "ka", "nahi"), unlike English
+        latin = [w.lower() for w in LATIN_WORD.findall(text or "")]
+        if not latin or len(latin) < len(DEVANAGARI_WORD.findall(text or "")):
+            return False
+        hits = sum(1 for w in latin if w in self.markers)
+        return hits >= 2 or (hits == 1 and len(latin) <= 4)
+
+
+def load_words(path=WORDS_FILE, rules_path=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    words = dict(data.get("words", {}))
+    # Romanized spellings of the lexicon's rules ("Gaadi (गाड़ी)"), so transliterated text matches them
+    for rule in get_lexicon(rules_path).rules:
+        parts = split_display(rule.get("word", ""))
+        if len(parts) == 2 and LATIN_WORD.fullmatch(parts[0]) and DEVANAGARI_WORD.search(parts[1]):
+            words.setdefault(parts[0].lower(), parts[1])
+    return words, data.get("markers", [])
+
+
+_cache = {"key": None, "transliterator": None}
+_lock = threading.Lock()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_transliterator(path=WORDS_FILE, rules_path=None):
+    # Rebuilt only when the word list changes on disk or get_lexicon() reopens the lexicon
+    key = (path, _mtime(path), get_lexicon(rules_path))
+    with _lock:
+        if _cache["key"] != key:
+            _cache["transliterator"] = Transliterator(*load_words(path, rules_path))
+            _cache["key"] = key
+        return _cache["transliterator"]
+
+
+def is_hinglish(text):
+    return get_transliterator().is_hinglish(text)
+
+
+def to_devanagari(text):
+    return get_transliterator().transliterate(text)
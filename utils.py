@@ -1,239 +1,1301 @@
-import streamlit as st
-import requests
-from groq import Groq
-import anthropic
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime
-import json
-import csv
-import os
-
-# --- AUTHENTICATION ---
-GEMINI_KEY = None
-possible_names = ["GEMINI_API_KEY", "GOOGLE_API_KEY", "GEMINI_KEY"]
-for name in possible_names:
-    if name in st.secrets:
-        GEMINI_KEY = st.secrets[name]
-        break
-
-GROQ_KEY = st.secrets.get("GROQ_API_KEY", "")
-ANTHROPIC_KEY = st.secrets.get("ANTHROPIC_API_KEY", "")
-HF_KEY = st.secrets.get("HUGGINGFACE_API_KEY", "")
-
-# Email Credentials
-EMAIL_USER = st.secrets.get("EMAIL_USER", "")
-EMAIL_PASSWORD = st.secrets.get("EMAIL_PASSWORD", "")
-
-# Initialize Clients
-groq_client = Groq(api_key=GROQ_KEY) if GROQ_KEY else None
-try:
-    anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_KEY) if ANTHROPIC_KEY else None
-except:
-    anthropic_client = None
-
-# --- CONSTANTS ---
-MAX_WORD_LIMIT = 1000 
-POE_LINK = "https://poe.com/Nirmal-Bhasha"
-
-# --- HELPER: ROYAL FALLBACK MESSAGE ---
-def get_fallback_message(error_type, details=""):
-    return f"""
-    <div style="background-color: #f8f9fa; border-left: 5px solid #2c3e50; padding: 20px; border-radius: 5px; margin: 20px 0;">
-        <h3 style="color: #2c3e50; margin-top: 0;">🛡️ High Traffic Notification / सर्वर व्यस्त है</h3>
-        <p style="font-size: 16px; color: #444;">
-            **Don't worry! Your experience will not be interrupted.**<br>
-            Our free servers are currently running at full capacity due to high demand.
-        </p>
-        <p style="font-size: 16px; color: #444;">
-            We have reserved a <b>Priority Slot</b> for you on our premium backup server hosted on Poe.
-        </p>
-        <br>
-        <a href="{POE_LINK}" target="_blank" style="text-decoration:none;">
-            <div style="
-                background: linear-gradient(90deg, #1e3c72 0%, #2a5298 100%);
-                color: white;
-                padding: 12px 25px;
-                border-radius: 8px;
-                text-align: center;
-                font-weight: 600;
-                font-size: 16px;
-                box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                display: inline-block;">
-                🚀 Switch to High-Speed Server (Unlimited)
-            </div>
-        </a>
-        <br><br>
-        <small style="color: #7f8c8d;">Technical Code: {error_type} | {details}</small>
-    </div>
-    """
-
-# --- HELPER: SEND EMAIL REPORT ---
-def send_email_report(user_email, report_content, input_text):
-    if not EMAIL_USER or not EMAIL_PASSWORD:
-        return False, "Email credentials missing in secrets."
-
-    msg = MIMEMultipart()
-    msg['From'] = f"Nirmal Bhasha AI <{EMAIL_USER}>"
-    msg['To'] = user_email
-    msg['Subject'] = "🌸 Your Nirmal Bhasha Analysis Report"
-
-    html_report = report_content.replace("\n", "<br>").replace("##", "<h3 style='color:#E91E63;'>").replace("**", "<b>")
-    
-    body = f"""
-    <html>
-      <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-        <div style="max-width: 600px; margin: auto; border: 1px solid #eee; border-radius: 10px; padding: 20px;">
-          <h2 style="color: #E91E63; text-align: center;">🌸 Nirmal Bhasha Report</h2>
-          <p>Namaste,</p>
-          <p>Here is the purity analysis for the text you submitted.</p>
-          
-          <div style="background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin: 20px 0;">
-            <strong style="color: #555;">📥 Your Input:</strong><br>
-            <i>"{input_text[:200]}..."</i>
-          </div>
-          
-          <hr style="border: 0; border-top: 1px solid #eee;">
-          
-          <h3>📊 Analysis Results</h3>
-          <div>{html_report}</div>
-          
-          <hr style="border: 0; border-top: 1px solid #eee;">
-          
-          <div style="text-align: center; font-size: 12px; color: #999; margin-top: 20px;">
-            Generated by <b>ShabdaSankalan AI</b><br>
-            <a href="https://shabdasankalan.com" style="color: #E91E63; text-decoration: none;">Visit Website</a>
-          </div>
-        </div>
-      </body>
-    </html>
-    """
-    msg.attach(MIMEText(body, 'html'))
-
-    try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(EMAIL_USER, user_email, text)
-        server.quit()
-        return True, "Email sent successfully!"
-    except Exception as e:
-        return False, str(e)
-
-# --- HELPER FUNCTIONS ---
-def check_word_count(text):
-    word_count = len(text.split())
-    if word_count > MAX_WORD_LIMIT:
-        return False, word_count
-    return True, word_count
-
-def load_correction_rules():
-    try:
-        with open("corrections.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return str(data["correction_rules"])
-    except:
-        return "No correction rules found."
-
-def save_feedback(tool_name, user_input, ai_output, rating, comment=""):
-    try:
-        file_name = "feedback_log.csv"
-        with open(file_name, mode="a", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            if not os.path.isfile(file_name):
-                writer.writerow(["Date", "Tool Name", "Rating", "User Input", "AI Output", "Comments"])
-            writer.writerow([datetime.now(), tool_name, rating, user_input, ai_output, comment])
-            return True
-    except:
-        return False
-
-# --- API CALLS ---
-def call_gemini_direct(model_name, prompt):
-    # Forced to v1beta for better model access
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={GEMINI_KEY}"
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "safetySettings": [{"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"}]
-    }
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code == 200:
-        return response.json()['candidates'][0]['content']['parts'][0]['text']
-    else:
-        raise Exception(f"Google Error {response.status_code}: {response.text}")
-
-def call_huggingface_direct(prompt):
-    # Using Microsoft Phi-3.5-mini-instruct via the standard Inference API (Not Router)
-    API_URL = "https://api-inference.huggingface.co/models/microsoft/Phi-3.5-mini-instruct"
-    headers = {"Authorization": f"Bearer {HF_KEY}"}
-    payload = {
-        "inputs": prompt,
-        "parameters": {"max_new_tokens": 1500, "return_full_text": False}
-    }
-    response = requests.post(API_URL, headers=headers, json=payload)
-    if response.status_code == 200:
-        return response.json()[0]['generated_text']
-    else:
-        raise Exception(f"HF Error {response.status_code}: {response.text}")
-
-# --- MAIN LOGIC ---
-def get_ai_response(system_prompt, user_text, engine):
-    
-    try:
-        is_ok, count = check_word_count(user_text)
-        if not is_ok: return get_fallback_message("Limit Exceeded", f"Text is {count} words.")
-
-        # 1. LLAMA (Groq) - The Reliable ONE (Moved to Top)
-        if "Llama" in engine or "Groq" in engine:
-            if not groq_client: return get_fallback_message("Setup Error", "Groq Key Missing")
-            try:
-                completion = groq_client.chat.completions.create(
-                    messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_text}],
-                    model="llama-3.3-70b-versatile", temperature=0.3
-                )
-                return completion.choices[0].message.content
-            except Exception as e: return get_fallback_message("Groq Busy", str(e))
-
-        # 2. GEMINI (Google) - The Backup
-        elif "Gemini" in engine:
-            if not GEMINI_KEY: return get_fallback_message("Setup Error", "API Key Missing.")
-            full_prompt = system_prompt + "\n\nUser Input: " + user_text
-            
-            # ATTEMPT 1: Gemini 2.5 Flash Lite (Primary)
-            try: 
-                return call_gemini_direct("gemini-2.5-flash-lite", full_prompt)
-            except Exception as e1:
-                # ATTEMPT 2: Gemini 1.5 Flash (Standard Backup) - CHANGED HERE
-                try: 
-                    # 'gemini-pro' काम नहीं कर रहा है, इसलिए हम 'gemini-1.5-flash' उपयोग करेंगे
-                    return call_gemini_direct("gemini-1.5-flash", full_prompt)
-                except Exception as e2:
-                    return get_fallback_message("Google Busy", f"Primary: {e1} | Backup: {e2}")
-
-        # 3. MISTRAL / PHI (Hugging Face) - The Safety Net
-        elif "Mistral" in engine or "Hugging Face" in engine or "Phi" in engine:
-            if not HF_KEY: return get_fallback_message("Setup Error", "HF Key Missing")
-            full_prompt = f"<s>[INST] {system_prompt} \n\n Analyze this text: {user_text} [/INST]"
-            try: return call_huggingface_direct(full_prompt)
-            except Exception as e: return get_fallback_message("Hugging Face Busy", str(e))
-
-        # 4. CLAUDE (Anthropic) - Premium
-        elif "Claude" in engine:
-            if not anthropic_client: return get_fallback_message("Setup Error", "Anthropic Key Missing")
-            try:
-                message = anthropic_client.messages.create(
-                    model="claude-3-5-sonnet-20240620", max_tokens=1024, system=system_prompt,
-                    messages=[{"role": "user", "content": user_text}]
-                )
-                return message.content[0].text
-            except Exception as e: return get_fallback_message("Claude Busy", str(e))
-            
-        else:
-            return get_fallback_message("Error", "Unknown Engine")
-            
-    except Exception as e:
-        return get_fallback_message("System Crash", str(e))
-
-
+import streamlit as st
+import http_transport
+import metrics
+import asyncio
+import base64
+import importlib
+import json
+import re
+import os
+import sys
+import threading
+import time
+import weakref
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+from lexicon import get_lexicon, format_rules, estimate_tokens
+from transliterate import is_hinglish, to_devanagari
+from letters import get_letter_spec, render_letter_frame
+from response_cache import ResponseCache, make_key
+from text_normalize import clean_text
+from mail_outbox import MailOutbox, OUTBOX_FILE
+from feedback_store import FeedbackStore
+from analytics import EngineStats, feedback_summary, archive_feedback, scan_archive, parquet_available
+from provider_health import HealthRegistry, ProviderError, get_error_status, get_retry_after, is_overload_error, parse_retry_after
+from admission import AdmissionController, QueueFull
+from subscribers import SubscriberStore, is_valid_email
+from daily_words import get_daily_word
+
+# --- AUTHENTICATION ---
+def _load_secrets():
+    # Read once per process; st.secrets is empty (or missing) when run headless
+    try:
+        return dict(st.secrets)
+    except Exception:
+        return {}
+
+_secrets = _load_secrets()
+
+def get_secret(name, default=""):
+    # st.secrets inside Streamlit; environment variables when run headless (batch CLI)
+    if name in _secrets:
+        return _secrets[name]
+    return os.environ.get(name, default)
+
+def get_secret_flag(name, default=False):
+    value = get_secret(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+GEMINI_KEY = None
+possible_names = ["GEMINI_API_KEY", "GOOGLE_API_KEY", "GEMINI_KEY"]
+for name in possible_names:
+    if get_secret(name):
+        GEMINI_KEY = get_secret(name)
+        break
+
+GROQ_KEY = get_secret("GROQ_API_KEY", "")
+ANTHROPIC_KEY = get_secret("ANTHROPIC_API_KEY", "")
+HF_KEY = get_secret("HUGGINGFACE_API_KEY", "")
+
+# Email Credentials
+EMAIL_USER = get_secret("EMAIL_USER", "")
+EMAIL_PASSWORD = get_secret("EMAIL_PASSWORD", "")
+SMTP_HOST = get_secret("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(get_secret("SMTP_PORT", 587))
+SMTP_STARTTLS = get_secret_flag("SMTP_STARTTLS", True)
+
+# Requests per minute allowed per provider (see PROVIDER HEALTH)
+GROQ_RPM = int(get_secret("GROQ_RPM", 30))
+GEMINI_RPM = int(get_secret("GEMINI_RPM", 15))
+HF_RPM = int(get_secret("HF_RPM", 60))
+CLAUDE_RPM = int(get_secret("CLAUDE_RPM", 50))
+
+# Race a second engine when the first is slow (see HEDGED DISPATCH)
+HEDGE_REQUESTS = get_secret_flag("HEDGE_REQUESTS", False)
+
+# Concurrent provider calls per process and how many more may wait for one (see ADMISSION CONTROL)
+ADMISSION_SLOTS = int(get_secret("ADMISSION_SLOTS", 64))
+ADMISSION_QUEUE = int(get_secret("ADMISSION_QUEUE", 512))
+QUEUE_TIMEOUT = float(get_secret("QUEUE_TIMEOUT", 90))
+
+# Serve a cached answer to a request that differs only slightly from an earlier one (see RESPONSE CACHE).
+# Off by default: the answer was written for the other text, so a one-word edit is lost. The index
+# still counts would-be hits, shown on the Admin page, to judge whether turning it on is worth it.
+NEAR_DUPLICATE_REUSE = get_secret_flag("NEAR_DUPLICATE_REUSE", False)
+
+# Provider endpoints, overridable for proxies and the local stubs in benchmark.py
+GEMINI_URL = get_secret("GEMINI_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+HF_URL = get_secret("HF_URL", "https://api-inference.huggingface.co/models/microsoft/Phi-3.5-mini-instruct")
+GROQ_BASE_URL = get_secret("GROQ_BASE_URL", "") or None
+ANTHROPIC_BASE_URL = get_secret("ANTHROPIC_BASE_URL", "") or None
+
+# --- PROVIDER CLIENTS ---
+# The Groq and Anthropic SDKs take over a second to import, so they are loaded on first use.
+# An async client's connection pool belongs to one event loop, so every loop gets its own
+# (sharded, see http_transport) clients: in practice the shared ASYNC BRIDGE loop.
+# The SDKs' own retries are off; busy providers are retried by ADMISSION CONTROL only.
+_clients = weakref.WeakKeyDictionary()
+
+def _build_groq():
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=GROQ_KEY, base_url=GROQ_BASE_URL, max_retries=0)
+
+def _build_anthropic():
+    import anthropic
+    return anthropic.AsyncAnthropic(api_key=ANTHROPIC_KEY, base_url=ANTHROPIC_BASE_URL, max_retries=0)
+
+_client_builders = {"groq": (lambda: GROQ_KEY, _build_groq), "anthropic": (lambda: ANTHROPIC_KEY, _build_anthropic)}
+_client_modules = {"groq": "groq", "anthropic": "anthropic"}
+
+def get_client(name):
+    # Must be called on a running event loop; None when the key is missing or the SDK cannot be set up
+    has_key, build = _client_builders[name]
+
+    def build_client():
+        try:
+            return build() if has_key() else None
+        except Exception:
+            return None
+    return http_transport.get_pooled(_clients, name, build_client)
+
+async def get_client_async(name):
+    # The first import of an SDK runs on a worker thread, so it does not stall the shared loop
+    module = _client_modules[name]
+    if module not in sys.modules:
+        try:
+            await asyncio.to_thread(importlib.import_module, module)
+        except ImportError:
+            pass
+    return get_client(name)
+
+# --- ASYNC BRIDGE ---
+# Provider calls are coroutines. Sync callers (pages, batch threads) run them on one shared
+# event loop thread, so hundreds of in-flight generations cost sockets, not OS threads.
+_loop = None
+_loop_lock = threading.Lock()
+
+def get_event_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ai-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def submit_async(coro):
+    # concurrent.futures.Future for a coroutine scheduled on the shared loop
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+def run_async(coro):
+    return submit_async(coro).result()
+
+def wait_async(coro, on_wait=None, poll=0.5):
+    # run_async with iter_async's on_wait polling; on_wait() runs once more at the end if it ran at all
+    future, waited = submit_async(coro), False
+    try:
+        while True:
+            try:
+                result = future.result(timeout=poll if on_wait else None)
+                break
+            except FutureTimeout:
+                waited = True
+                on_wait()
+    except BaseException:
+        # A stopped page should not leave its requests queued on the loop
+        future.cancel()
+        raise
+    if waited:
+        on_wait()
+    return result
+
+async def _aclose_async(agen):
+    # A cancelled __anext__ still unwinds on the loop, and aclose() raises until it has
+    while agen.ag_running:
+        await asyncio.sleep(0.01)
+    await agen.aclose()
+
+def iter_async(agen, on_wait=None, poll=0.5):
+    # Drives an async generator from sync code; closing this generator closes the async one.
+    # on_wait() is called on the caller's thread every `poll` seconds while no chunk arrives;
+    # if it raises (Streamlit's rerun does), the pending chunk is cancelled before closing.
+    future = None
+    try:
+        while True:
+            future = submit_async(agen.__anext__())
+            while True:
+                try:
+                    chunk = future.result(timeout=poll if on_wait else None)
+                    break
+                except FutureTimeout:
+                    on_wait()
+                except StopAsyncIteration:
+                    return
+            yield chunk
+    finally:
+        if future is not None:
+            future.cancel()
+        run_async(_aclose_async(agen))
+
+def get_session_id():
+    # The Streamlit session of the calling script thread; None in batch jobs and other scripts
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+    return ctx.session_id if ctx else None
+
+# --- CONSTANTS ---
+MAX_WORD_LIMIT = 1000 
+POE_LINK = "https://poe.com/Nirmal-Bhasha"
+
+# --- INSTRUMENTATION ---
+# Off unless METRICS_ENABLED is set; METRICS_PORT serves Prometheus text at /metrics
+if get_secret_flag("METRICS_ENABLED", False):
+    metrics.enable(get_secret("METRICS_PORT", 9108))
+
+REQUEST_SECONDS = metrics.histogram("nirmal_request_seconds", "AI request duration as seen by the page", ["tool", "source"])
+PROVIDER_SECONDS = metrics.histogram("nirmal_provider_seconds", "Provider call duration until the last chunk", ["engine"])
+TTFT_SECONDS = metrics.histogram("nirmal_provider_ttft_seconds", "Provider time to first token", ["engine"])
+PROVIDER_ERRORS = metrics.counter("nirmal_provider_errors_total", "Provider errors by type", ["engine", "type"])
+PROMPT_TOKENS = metrics.counter("nirmal_prompt_tokens_total", "Estimated prompt tokens sent", ["engine"])
+COMPLETION_TOKENS = metrics.counter("nirmal_completion_tokens_total", "Estimated completion tokens received", ["engine"])
+CACHE_LOOKUPS = metrics.counter("nirmal_cache_lookups_total", "Response cache lookups by result", ["result"])
+FUNCTION_SECONDS = metrics.histogram("nirmal_function_seconds", "Duration of helper calls", ["function"], metrics.FAST_BUCKETS + (10, 30))
+PAGE_RERUN_SECONDS = metrics.histogram("nirmal_page_rerun_seconds", "Streamlit page rerun duration", ["page"], metrics.FAST_BUCKETS + (10, 30, 60))
+
+def page_timer(page):
+    # Wraps a page script's body: `with page_timer("Page"):`. A run is recorded however it ends,
+    # including st.rerun() and st.stop(), which leave the script by raising.
+    return PAGE_RERUN_SECONDS.time(page=page)
+
+def get_metrics_summary():
+    if not metrics.enabled:
+        return None
+    rows = []
+    for name, hist in (("Provider total", PROVIDER_SECONDS), ("Time to first token", TTFT_SECONDS)):
+        for (engine,), (_, _, count) in sorted(hist.samples().items()):
+            rows.append({"Metric": name, "Label": engine, "Count": count,
+                         **{f"p{int(q * 100)} (s)": hist.quantile(q, engine=engine) for q in (0.5, 0.95, 0.99)}})
+    for (page,), (_, _, count) in sorted(PAGE_RERUN_SECONDS.samples().items()):
+        rows.append({"Metric": "Page rerun", "Label": page, "Count": count,
+                     **{f"p{int(q * 100)} (s)": PAGE_RERUN_SECONDS.quantile(q, page=page) for q in (0.5, 0.95, 0.99)}})
+    return rows
+
+def get_metrics_text():
+    return metrics.render_prometheus()
+
+# --- PAGE ASSETS ---
+# Logos are read from disk once per process instead of on every rerun
+@st.cache_resource(show_spinner=False)
+def load_asset(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+@st.cache_data(show_spinner=False)
+def get_base64_image(image_path):
+    data = load_asset(image_path)
+    return base64.b64encode(data).decode() if data else None
+
+# --- STORES ---
+# Every page imports utils, so the stores open their SQLite files on first use, not at import.
+# Each is a module global until then; assigning one (as benchmark.py does) replaces it.
+_stores_lock = threading.Lock()
+
+def _get_store(name, build):
+    store = globals()[name]
+    if store is None:
+        with _stores_lock:
+            store = globals()[name]
+            if store is None:
+                store = globals()[name] = build()
+    return store
+
+# --- RESPONSE CACHE ---
+response_cache = None
+near_index = None
+# Cache and near-duplicate writes leave the event loop for this one thread, in order; a locked
+# SQLite file then delays the write, not every generation in flight
+cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+
+def _prune_near_index():
+    # An index not opened yet drops the evicted keys when it loads
+    if near_index is not None:
+        near_index.prune()
+
+def get_response_cache():
+    return _get_store("response_cache", lambda: ResponseCache(on_evict=_prune_near_index))
+
+def _build_near_index():
+    # near_duplicates pulls in numpy, which only the cached request path needs
+    from near_duplicates import NearDuplicateIndex
+    return NearDuplicateIndex()
+
+def get_near_index():
+    return _get_store("near_index", _build_near_index)
+
+def _find_near_duplicate(tool, system_prompt, engine, max_tokens, key_text):
+    # (group, closest cached key or None); runs on a worker thread
+    from near_duplicates import make_group
+    group = make_group(tool, system_prompt, engine, max_tokens)
+    return group, get_near_index().find(group, key_text)
+
+def get_cache_stats():
+    stats = get_response_cache().get_stats()
+    stats["near_duplicates"] = get_near_index().get_stats()
+    return stats
+
+# --- HELPER: ROYAL FALLBACK MESSAGE ---
+FALLBACK_MARKER = "🛡️ High Traffic Notification"
+
+def is_fallback_message(text):
+    return bool(text) and FALLBACK_MARKER in text
+
+def get_fallback_message(error_type, details=""):
+    return f"""
+    <div style="background-color: #f8f9fa; border-left: 5px solid #2c3e50; padding: 20px; border-radius: 5px; margin: 20px 0;">
+        <h3 style="color: #2c3e50; margin-top: 0;">🛡️ High Traffic Notification / सर्वर व्यस्त है</h3>
+        <p style="font-size: 16px; color: #444;">
+            **Don't worry! Your experience will not be interrupted.**<br>
+            Our free servers are currently running at full capacity due to high demand.
+        </p>
+        <p style="font-size: 16px; color: #444;">
+            We have reserved a <b>Priority Slot</b> for you on our premium backup server hosted on Poe.
+        </p>
+        <br>
+        <a href="{POE_LINK}" target="_blank" style="text-decoration:none;">
+            <div style="
+                background: linear-gradient(90deg, #1e3c72 0%, #2a5298 100%);
+                color: white;
+                padding: 12px 25px;
+                border-radius: 8px;
+                text-align: center;
+                font-weight: 600;
+                font-size: 16px;
+                box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+                display: inline-block;">
+                🚀 Switch to High-Speed Server (Unlimited)
+            </div>
+        </a>
+        <br><br>
+        <small style="color: #7f8c8d;">Technical Code: {error_type} | {details}</small>
+    </div>
+    """
+
+# --- HELPER: SEND EMAIL REPORT ---
+# Reports are queued in the outbox and delivered by a background worker (see mail_outbox.py)
+email_outbox = None
+
+def get_email_outbox():
+    return _get_store("email_outbox", lambda: MailOutbox(EMAIL_USER, SMTP_HOST, SMTP_PORT, EMAIL_USER, EMAIL_PASSWORD, SMTP_STARTTLS))
+
+# Mail an earlier process left pending is resumed at startup; with no outbox file there is none
+if os.path.exists(OUTBOX_FILE):
+    get_email_outbox()
+
+def get_email_status(job_id):
+    return get_email_outbox().get_status(job_id)
+
+@metrics.timed(FUNCTION_SECONDS, function="send_email_report")
+def send_email_report(user_email, report_content, input_text):
+    if not EMAIL_USER or not EMAIL_PASSWORD:
+        return False, "Email credentials missing in secrets."
+
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
+    msg = MIMEMultipart()
+    msg['From'] = f"Nirmal Bhasha AI <{EMAIL_USER}>"
+    msg['To'] = user_email
+    msg['Subject'] = "🌸 Your Nirmal Bhasha Analysis Report"
+
+    html_report = report_content.replace("\n", "<br>").replace("##", "<h3 style='color:#E91E63;'>").replace("**", "<b>")
+    
+    body = f"""
+    <html>
+      <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: auto; border: 1px solid #eee; border-radius: 10px; padding: 20px;">
+          <h2 style="color: #E91E63; text-align: center;">🌸 Nirmal Bhasha Report</h2>
+          <p>Namaste,</p>
+          <p>Here is the purity analysis for the text you submitted.</p>
+          
+          <div style="background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin: 20px 0;">
+            <strong style="color: #555;">📥 Your Input:</strong><br>
+            <i>"{input_text[:200]}..."</i>
+          </div>
+          
+          <hr style="border: 0; border-top: 1px solid #eee;">
+          
+          <h3>📊 Analysis Results</h3>
+          <div>{html_report}</div>
+          
+          <hr style="border: 0; border-top: 1px solid #eee;">
+          
+          <div style="text-align: center; font-size: 12px; color: #999; margin-top: 20px;">
+            Generated by <b>ShabdaSankalan AI</b><br>
+            <a href="https://shabdasankalan.com" style="color: #E91E63; text-decoration: none;">Visit Website</a>
+          </div>
+        </div>
+      </body>
+    </html>
+    """
+    msg.attach(MIMEText(body, 'html'))
+
+    # Returns (True, outbox job id) once queued; delivery status via get_email_status
+    try:
+        return True, get_email_outbox().enqueue(user_email, msg.as_string())
+    except Exception as e:
+        return False, str(e)
+
+# --- HOME PAGE ---
+# Signups go to the indexed subscriber store; digests are sent in bulk by digest_mailer.py
+subscribers = None
+
+def get_subscribers():
+    return _get_store("subscribers", SubscriberStore)
+
+def save_subscriber(email, source="home"):
+    # True for a new subscriber, False for a duplicate or an invalid address
+    return get_subscribers().add(email, source)
+
+def get_subscriber_summary():
+    return get_subscribers().summary()
+
+def get_recent_subscribers(limit=50, before=None):
+    return get_subscribers().recent(limit, before)
+
+def export_subscribers_csv():
+    return get_subscribers().export_csv()
+
+def get_campaign_progress():
+    return get_subscribers().campaign_progress()
+
+def show_header():
+    col_logo, col_text = st.columns([1.5, 4.5])
+    with col_logo: st.markdown("<div style='font-size: 80px; text-align: center;'>🪷</div>", unsafe_allow_html=True)
+    with col_text: st.markdown("<div><h1 style='margin: 0;'>ShabdaSankalan</h1><p style='margin: 0; color: #666;'>AI tools for pure, confident Hindi</p></div>", unsafe_allow_html=True)
+    st.markdown("---")
+
+# --- HELPER FUNCTIONS ---
+def check_word_count(text):
+    word_count = len(text.split())
+    if word_count > MAX_WORD_LIMIT:
+        return False, word_count
+    return True, word_count
+
+# Only the rules whose words occur in the text are injected into prompts
+rule_token_stats = {"requests": 0, "full_tokens": 0, "injected_tokens": 0}
+_rule_stats_lock = threading.Lock()
+
+def load_correction_rules(text=None):
+    lexicon = get_lexicon()
+    if not lexicon.rules:
+        return "No correction rules found."
+    rules = lexicon.rules if text is None else lexicon.relevant_rules(text)
+    injected = format_rules(rules) if rules else "None found in this text."
+    if text is not None:
+        with _rule_stats_lock:
+            rule_token_stats["requests"] += 1
+            rule_token_stats["full_tokens"] += lexicon.full_prompt_tokens
+            rule_token_stats["injected_tokens"] += estimate_tokens(injected)
+    return injected
+
+def get_rule_token_stats():
+    with _rule_stats_lock:
+        stats = dict(rule_token_stats)
+    saved = stats["full_tokens"] - stats["injected_tokens"]
+    stats["saved_tokens"] = saved
+    stats["saved_per_request"] = round(saved / stats["requests"], 1) if stats["requests"] else 0.0
+    lexicon = get_lexicon()
+    stats["lexicon_rules"] = len(lexicon.rules)
+    stats["lexicon_built"] = time.strftime("%Y-%m-%d %H:%M", time.localtime(lexicon.built)) if hasattr(lexicon, "built") else None
+    return stats
+
+# Feedback goes to an append-only SQLite store; feedback_log.csv is now an export
+feedback_store = None
+
+def get_feedback_store():
+    return _get_store("feedback_store", FeedbackStore)
+
+@metrics.timed(FUNCTION_SECONDS, function="save_feedback")
+def save_feedback(tool_name, user_input, ai_output, rating, comment=""):
+    try:
+        get_feedback_store().add(tool_name, user_input, ai_output, rating, comment)
+        return True
+    except:
+        return False
+
+def query_feedback(tool=None, rating=None, since=None, until=None, limit=100, offset=0, before_id=None):
+    return get_feedback_store().query(tool, rating, since, until, limit, offset, before_id)
+
+def feedback_count():
+    return get_feedback_store().max_id()
+
+def export_feedback_csv():
+    return get_feedback_store().export_csv()
+
+# Per-engine call counts and latency, aggregated per day for the Admin Dashboard
+engine_stats = None
+
+def get_engine_stats():
+    return _get_store("engine_stats", EngineStats)
+
+def get_feedback_summary(days=30):
+    return feedback_summary(get_feedback_store(), days)
+
+def get_engine_summary(days=30):
+    return get_engine_stats().summary(days)
+
+def archive_feedback_history():
+    return archive_feedback(get_feedback_store())
+
+ARCHIVE_SEARCH_LIMIT = 500
+
+def search_feedback_archive(tool=None, rating=None, since=None):
+    # Archived history (DataFrame, None if nothing is archived), filtered like the Feedback Log
+    return scan_archive(tool=tool, rating=rating, since=since, limit=ARCHIVE_SEARCH_LIMIT,
+                        columns=["id", "created", "tool", "rating", "user_input", "ai_output", "comment"])
+
+def load_corpus_profile():
+    # Saved corpus profile for the Admin Dashboard, or None; corpus_profiler (numpy) is imported here only
+    from corpus_profiler import load_corpus_profile as load
+    return load()
+
+# --- HINGLISH INPUT ---
+def prepare_input(text):
+    # Devanagari reading of romanized Hindi ("gadi", "gaadi" -> गाड़ी) for the lexicon, the prompt's
+    # correction rules and the cache keys. The model is still sent the original text: mixed or
+    # English words come out mangled ("computer" -> कोंपुतेर). Returns (reading, converted).
+    if is_hinglish(text):
+        return to_devanagari(text), True
+    return text, False
+
+# --- LOCAL PURITY SCAN (No LLM) ---
+def scan_purity(text):
+    return get_lexicon().scan(text)
+
+def get_purity_verdict(score):
+    if score >= 95: return "Outstanding! Pure Hindi (उत्कृष्ट)"
+    if score >= 80: return "Very good, just a few touches left (बहुत अच्छा)"
+    if score >= 60: return "Good start, keep refining (अच्छा प्रयास)"
+    return "Every journey starts somewhere, let's refine it (शुरुआत अच्छी है)"
+
+def build_purity_report(scan):
+    score = scan["purity_score"]
+    filled = round(score / 20)
+    progress = "🟩" * filled + "⬜" * (5 - filled)
+    lines = [
+        "| 🏆 Purity Score | 🚩 Foreign Words | ✨ Verdict |",
+        "|---|---|---|",
+        f"| **{score}%** | {scan['foreign_count']} of {scan['total_words']} | {get_purity_verdict(score)} |",
+        "",
+        f"{progress} {score}%",
+        "",
+    ]
+    if scan["found"]:
+        lines += ["### 📖 Word Correction Table", "", "| Word | Found As | Origin | Pure Hindi (Tatsam) |", "|---|---|---|---|"]
+        for entry in scan["found"]:
+            rule = entry["rule"]
+            lines.append(f"| {rule.get('word', '')} | {', '.join(entry['surfaces'])} | {rule.get('origin', '')} | {rule.get('replacement', '')} |")
+    else:
+        lines.append("✅ No words from our correction list were found.")
+    return "\n".join(lines)
+
+# --- TOOL PROMPTS ---
+# Shared by the pages and the headless batch runner (batch.py)
+def build_nirmal_prompt(text):
+    return f"""
+    You are 'Nirmal-Bhasha'. The Purity Scorecard and the Word Correction Table for these words are ALREADY shown to the user:
+    ALREADY CORRECTED (do not repeat):
+    {load_correction_rules(text)}
+
+    OUTPUT FORMAT REQUIREMENTS:
+    1. **Other Foreign Words:** A Markdown Table (Word | Origin | Pure Hindi) of any OTHER foreign words (Urdu, English, Persian). Write "None" if there are none.
+    2. **The Fix:** Refined Sentence (Practical Pure Hindi / व्यावहारिक शुद्ध हिंदी).
+       - **IMPORTANT RULE:** Rewrite the sentence using Pure Hindi (Tatsam) words, BUT prioritize **READABILITY**.
+       - Use the ALREADY CORRECTED replacements above.
+       - Do NOT use obscure, archaic, or strictly medical Sanskrit terms.
+       - Use standard, educated Hindi words that a common person understands.
+       - If a Pure Hindi word is too difficult, rephrase the sentence to keep it natural.
+    """
+
+def build_vivek_prompt(text):
+    return f"You are 'Bhasha-Vivek'. Translate to Pure & Practical Hindi. GOLDEN RULE: No Urdu/English words, but keep it flowing. CRITICAL RULES: {load_correction_rules(text)}"
+
+# The model writes the body plus the Hindi subject line and the sender's name in Devanagari;
+# the rest of the letter comes from letter_templates.json
+LETTER_BODY_MAX_TOKENS = 450
+LETTER_SUBJECT, LETTER_SENDER = "विषय:", "प्रेषक:"
+
+def build_patra_prompt(recipient, letter_type):
+    guidance = get_letter_spec(recipient, letter_type)["guidance"]
+    return (f"You are 'Patra-Lekhak'. Write a {letter_type} letter to a {recipient} in Perfect Formal Hindi. "
+            f"Reply in exactly this format: first line '{LETTER_SUBJECT} <the subject as one short line of formal Hindi>', "
+            f"second line '{LETTER_SENDER} <the sender's name in Devanagari>', a blank line, then only the body "
+            f"(2-3 short paragraphs). {guidance} No address, date, salutation, closing or signature.")
+
+def build_patra_input(topic, sender_name):
+    return f"Subject: {topic}. Sender: {sender_name}."
+
+def split_letter_reply(reply, subject, sender):
+    # (subject, sender, body) from the model's reply; the given values stand in for missing header lines
+    header, body = {}, []
+    for line in (reply or "").strip().split("\n"):
+        plain = line.replace("*", "").strip()
+        label = next((l for l in (LETTER_SUBJECT, LETTER_SENDER) if plain.startswith(l)), None)
+        if not body and label and label not in header:
+            header[label] = plain[len(label):].strip()
+        elif body or plain:
+            body.append(line)
+    return header.get(LETTER_SUBJECT) or subject, header.get(LETTER_SENDER) or sender, "\n".join(body).strip()
+
+def compose_letter(recipient, letter_type, sender_name, date, topic, reply):
+    subject, sender, body = split_letter_reply(reply, topic, sender_name)
+    head, tail = render_letter_frame(recipient, letter_type, sender, date, subject)
+    return head + body + tail
+
+def build_nibandh_prompt(topic, level, style, word_limit):
+    return f"You are 'Acharya Nibandh'. Write a Hindi Essay on '{topic}'. Level: {level}, Style: {style}, Length: {word_limit}. STRUCTURE: Prastavana -> Vishay Vastu -> Upsanghar. Language: Shuddh Hindi (No English)."
+
+def build_nibandh_input(topic, key_points=""):
+    return f"Topic: {topic}. Points: {key_points}"
+
+def combine_purity_report(local_report, ai_part):
+    if is_fallback_message(ai_part):
+        return local_report + "\n\n" + ai_part
+    return local_report + "\n\n---\n\n" + ai_part
+
+def analyze_purity(text, engine, tool="Nirmal-Bhasha", scan=None):
+    # Non-streaming Nirmal-Bhasha analysis: local scorecard plus the LLM's part. A caller that
+    # already has the scan of the text's reading passes it, and the report is scored by it.
+    if not check_word_count(text)[0]:
+        return analyze_long_document(text, engine, tool=tool, scan=scan)
+    reading = prepare_input(text)[0]
+    local_report = build_purity_report(scan or scan_purity(reading))
+    return combine_purity_report(local_report, get_ai_response(build_nirmal_prompt(reading), text, engine, tool=tool, key_text=reading))
+
+# --- API CALLS ---
+HF_MAX_NEW_TOKENS = 1500
+
+def _gemini_payload(prompt, max_tokens=None):
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "safetySettings": [{"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"}]
+    }
+    if max_tokens:
+        payload["generationConfig"] = {"maxOutputTokens": max_tokens}
+    return payload
+
+async def _iter_sse_data(response):
+    # Server-Sent Events: yields the decoded JSON of every "data:" line
+    async for line in response.aiter_lines():
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data and data != "[DONE]":
+            yield json.loads(data)
+
+async def _raise_for_provider(response, name):
+    if response.status_code != 200:
+        body = (await response.aread()).decode("utf-8", "replace")
+        raise ProviderError(f"{name} Error {response.status_code}: {body}", response.status_code,
+                            parse_retry_after(response.headers.get("retry-after")))
+
+async def stream_gemini_direct_async(model_name, prompt, max_tokens=None):
+    url = f"{GEMINI_URL}/{model_name}:streamGenerateContent?alt=sse&key={GEMINI_KEY}"
+    headers = {"Content-Type": "application/json"}
+    async with http_transport.stream_post(url, headers=headers, json=_gemini_payload(prompt, max_tokens)) as response:
+        await _raise_for_provider(response, "Google")
+        async for event in _iter_sse_data(response):
+            for candidate in event.get("candidates", [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
+async def stream_huggingface_direct_async(prompt, max_tokens=None):
+    headers = {"Authorization": f"Bearer {HF_KEY}"}
+    payload = {
+        "inputs": prompt,
+        "parameters": {"max_new_tokens": max_tokens or HF_MAX_NEW_TOKENS, "return_full_text": False},
+        "stream": True
+    }
+    async with http_transport.stream_post(HF_URL, headers=headers, json=payload) as response:
+        await _raise_for_provider(response, "HF")
+        async for event in _iter_sse_data(response):
+            token = event.get("token") or {}
+            if token.get("text") and not token.get("special"):
+                yield token["text"]
+
+# --- ENGINES ---
+ENGINE_GROQ = "groq"
+ENGINE_GEMINI = "gemini"
+ENGINE_HF = "huggingface"
+ENGINE_CLAUDE = "claude"
+ENGINE_AUTO = "auto"
+ENGINE_PREFERENCE = [ENGINE_GROQ, ENGINE_GEMINI, ENGINE_CLAUDE, ENGINE_HF]
+
+ENGINE_LABELS = {
+    ENGINE_GROQ: "Llama 3.3 (via Groq)",
+    ENGINE_GEMINI: "Gemini 2.5 Flash (Google)",
+    ENGINE_HF: "Phi 3.5 (via Hugging Face)",
+    ENGINE_CLAUDE: "Claude 3.5 Sonnet (Anthropic)",
+}
+
+ENGINE_BUSY_CODES = {
+    ENGINE_GROQ: "Groq Busy",
+    ENGINE_GEMINI: "Google Busy",
+    ENGINE_HF: "Hugging Face Busy",
+    ENGINE_CLAUDE: "Claude Busy",
+    ENGINE_AUTO: "All Engines Busy",
+}
+
+def resolve_engine(engine):
+    # Maps a selectbox label to an engine key
+    if "Auto" in engine: return ENGINE_AUTO
+    if "Llama" in engine or "Groq" in engine: return ENGINE_GROQ
+    if "Gemini" in engine: return ENGINE_GEMINI
+    if "Mistral" in engine or "Hugging Face" in engine or "Phi" in engine: return ENGINE_HF
+    if "Claude" in engine: return ENGINE_CLAUDE
+    return None
+
+def get_engine_setup_error(engine_key):
+    if engine_key == ENGINE_GROQ and not GROQ_KEY: return "Groq Key Missing"
+    if engine_key == ENGINE_GEMINI and not GEMINI_KEY: return "API Key Missing."
+    if engine_key == ENGINE_HF and not HF_KEY: return "HF Key Missing"
+    if engine_key == ENGINE_CLAUDE and not ANTHROPIC_KEY: return "Anthropic Key Missing"
+    return None
+
+# Anthropic requires an explicit budget; use the model's full output limit so answers are not cut short
+CLAUDE_MAX_TOKENS = 4096
+
+async def stream_engine_async(engine_key, system_prompt, user_text, max_tokens=None):
+    # Raw provider stream: yields text chunks, raises on provider errors.
+    # max_tokens caps the completion; None keeps each provider's usual budget.
+
+    # 1. LLAMA (Groq) - The Reliable ONE (Moved to Top)
+    if engine_key == ENGINE_GROQ:
+        limit = {"max_tokens": max_tokens} if max_tokens else {}
+        client = await get_client_async("groq")
+        stream = await client.chat.completions.create(
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_text}],
+            model="llama-3.3-70b-versatile", temperature=0.3, stream=True, **limit
+        )
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    # 2. GEMINI (Google) - The Backup
+    elif engine_key == ENGINE_GEMINI:
+        full_prompt = system_prompt + "\n\nUser Input: " + user_text
+        started = False
+        # ATTEMPT 1: Gemini 2.5 Flash Lite (Primary)
+        try:
+            async with aclosing(stream_gemini_direct_async("gemini-2.5-flash-lite", full_prompt, max_tokens)) as stream:
+                async for text in stream:
+                    started = True
+                    yield text
+        except Exception as e1:
+            # Text already shown to the user cannot be retracted, so only fall back before the first chunk.
+            # An overloaded Gemini is not asked twice; the request waits its turn in ADMISSION CONTROL.
+            if started or is_overload_error(e1): raise
+            # ATTEMPT 2: Gemini 1.5 Flash (Standard Backup)
+            try:
+                # 'gemini-pro' काम नहीं कर रहा है, इसलिए हम 'gemini-1.5-flash' उपयोग करेंगे
+                async with aclosing(stream_gemini_direct_async("gemini-1.5-flash", full_prompt, max_tokens)) as stream:
+                    async for text in stream:
+                        yield text
+            except Exception as e2:
+                raise ProviderError(f"Primary: {e1} | Backup: {e2}", get_error_status(e2), get_retry_after(e2))
+
+    # 3. MISTRAL / PHI (Hugging Face) - The Safety Net
+    elif engine_key == ENGINE_HF:
+        full_prompt = f"<s>[INST] {system_prompt} \n\n Analyze this text: {user_text} [/INST]"
+        async with aclosing(stream_huggingface_direct_async(full_prompt, max_tokens)) as stream:
+            async for text in stream:
+                yield text
+
+    # 4. CLAUDE (Anthropic) - Premium
+    elif engine_key == ENGINE_CLAUDE:
+        client = await get_client_async("anthropic")
+        async with client.messages.stream(
+            model="claude-3-5-sonnet-20240620", max_tokens=max_tokens or CLAUDE_MAX_TOKENS, system=system_prompt,
+            messages=[{"role": "user", "content": user_text}]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+    else:
+        raise ValueError(f"Unknown engine: {engine_key}")
+
+# --- PROVIDER HEALTH ---
+# Shared by every session in the process: quotas, circuit breakers and latency (see provider_health.py)
+RATE_WAIT = 2.0
+health = HealthRegistry({ENGINE_GROQ: GROQ_RPM, ENGINE_GEMINI: GEMINI_RPM, ENGINE_HF: HF_RPM, ENGINE_CLAUDE: CLAUDE_RPM})
+engine_latency = health.latency
+
+def get_engine_health():
+    return health.snapshot()
+
+def get_configured_engines(exclude=None):
+    return [k for k in ENGINE_PREFERENCE if k != exclude and not get_engine_setup_error(k)]
+
+def route_engine(engine_key):
+    # The requested engine if it has capacity, else the healthiest other engine; None fails fast
+    if engine_key != ENGINE_AUTO and health.acquire(engine_key, RATE_WAIT):
+        return engine_key
+    for candidate in health.rank(get_configured_engines(exclude=engine_key)):
+        if health.acquire(candidate):
+            return candidate
+    return None
+
+async def route_engine_async(engine_key):
+    if engine_key != ENGINE_AUTO and health.acquire(engine_key):
+        return engine_key
+    # Waiting for quota sleeps, so it happens off the event loop
+    return await asyncio.to_thread(route_engine, engine_key)
+
+# --- HEDGED DISPATCH ---
+# If the chosen engine has not produced its first chunk by its p95 time-to-first-token,
+# a second configured engine is started; the first to answer wins and the other is cancelled.
+HEDGE_DEFAULT_DEADLINE = 4.0
+HEDGE_MIN_DEADLINE = 1.0
+HEDGE_MAX_RACERS = 2
+
+def get_hedge_deadline(engine_key):
+    p95 = engine_latency.percentile(engine_key, 0.95)
+    return HEDGE_DEFAULT_DEADLINE if p95 is None else max(HEDGE_MIN_DEADLINE, p95)
+
+def get_hedge_candidates(primary):
+    return [k for k in health.rank(get_configured_engines(exclude=primary)) if health.is_available(k)]
+
+async def _timed_stream_async(engine_key, system_prompt, user_text, max_tokens=None):
+    # Caller must already hold a health.acquire() slot for engine_key
+    started = time.perf_counter()
+    first, finished, completion_chars = True, False, 0
+    PROMPT_TOKENS.inc(estimate_tokens(system_prompt) + estimate_tokens(user_text), engine=engine_key)
+    try:
+        async with aclosing(stream_engine_async(engine_key, system_prompt, user_text, max_tokens)) as stream:
+            async for chunk in stream:
+                if first:
+                    ttft = time.perf_counter() - started
+                    engine_latency.record(engine_key, ttft)
+                    TTFT_SECONDS.observe(ttft, engine=engine_key)
+                    first = False
+                completion_chars += len(chunk)
+                yield chunk
+        finished = True
+    except Exception as e:
+        finished = True
+        health.record_failure(engine_key, e)
+        get_engine_stats().record(engine_key, time.perf_counter() - started, ok=False)
+        PROVIDER_ERRORS.inc(engine=engine_key, type=str(get_error_status(e) or type(e).__name__))
+        raise
+    finally:
+        if not finished:
+            # Cancelled (hedge loser or abandoned stream): neither success nor failure
+            health.release(engine_key)
+        # Rough estimate from characters, the streaming APIs do not all report usage
+        COMPLETION_TOKENS.inc((completion_chars + 2) // 3, engine=engine_key)
+    elapsed = time.perf_counter() - started
+    health.record_success(engine_key)
+    get_engine_stats().record(engine_key, elapsed)
+    PROVIDER_SECONDS.observe(elapsed, engine=engine_key)
+
+async def _run_racer(racer_id, engine_key, system_prompt, user_text, events, max_tokens=None):
+    # Cancelling the task closes the stream, and with it the provider's HTTP response
+    try:
+        async with aclosing(_timed_stream_async(engine_key, system_prompt, user_text, max_tokens)) as stream:
+            async for chunk in stream:
+                events.put_nowait((racer_id, "chunk", chunk))
+        events.put_nowait((racer_id, "done", None))
+    except Exception as e:
+        events.put_nowait((racer_id, "error", e))
+
+async def stream_hedged_async(primary, system_prompt, user_text, max_tokens=None):
+    events = asyncio.Queue()
+    engines, racers, errors = [], [], {}
+    candidates = iter(get_hedge_candidates(primary))
+
+    def start(engine_key):
+        engines.append(engine_key)
+        racers.append(asyncio.ensure_future(_run_racer(len(engines) - 1, engine_key, system_prompt, user_text, events, max_tokens)))
+
+    def start_next():
+        if len(engines) >= HEDGE_MAX_RACERS: return False
+        for engine_key in candidates:
+            if health.acquire(engine_key):
+                start(engine_key)
+                return True
+        return False
+
+    start(primary)
+    deadline = time.monotonic() + get_hedge_deadline(primary)
+    winner = None
+    try:
+        while True:
+            try:
+                if deadline is None:
+                    racer_id, kind, payload = await events.get()
+                else:
+                    racer_id, kind, payload = await asyncio.wait_for(events.get(), max(0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                start_next()
+                deadline = None
+                continue
+            if winner is None and kind == "error":
+                errors[racer_id] = payload
+                if len(errors) == len(engines) and not start_next():
+                    raise Exception(" | ".join(f"{engines[i]}: {e}" for i, e in errors.items()))
+                continue
+            if winner is None:
+                winner = racer_id
+                deadline = None
+                for i, racer in enumerate(racers):
+                    if i != winner: racer.cancel()
+            if racer_id != winner:
+                continue
+            if kind == "chunk": yield payload
+            elif kind == "done": return
+            else: raise payload
+    finally:
+        for racer in racers:
+            racer.cancel()
+
+# --- ADMISSION CONTROL ---
+# Every provider call first takes a slot from the process-wide controller (see admission.py).
+# When all engines are busy or overloaded, a request gives its slot back and waits for another
+# turn; the fallback card only appears when the queue is full or the wait runs out.
+admission = AdmissionController(max_running=ADMISSION_SLOTS, max_queue=ADMISSION_QUEUE, timeout=QUEUE_TIMEOUT)
+
+def get_admission_stats():
+    return admission.snapshot()
+
+def queue_notice(slot):
+    # on_wait callback for stream_ai_response: shows the request's place in the queue in `slot`
+    def show(place):
+        if place:
+            slot.info(f"⏳ Many requests right now. You are number {place['position']} in the queue, "
+                      f"about {place['eta']} s to go. / आपका अनुरोध कतार में है, कृपया प्रतीक्षा करें।")
+        else:
+            slot.empty()
+    return show
+
+def _queue_watcher(on_wait, tickets):
+    # Calls on_wait with the best place among a request's waiting tickets (None once none waits)
+    if not on_wait:
+        return None
+    def notify():
+        places = [place for place in map(admission.describe, list(tickets)) if place]
+        on_wait(min(places, key=lambda place: place["position"]) if places else None)
+    return notify
+
+# --- MAIN LOGIC ---
+# get_ai_response_async / stream_ai_response_async are the primitives; the sync functions
+# run them on the shared event loop (see ASYNC BRIDGE).
+async def _stream_uncached_async(system_prompt, user_text, engine, hedge=False, max_tokens=None, tool="", session=None, waiting=None):
+    # Provider errors are turned into the fallback card, appended after any text already streamed
+    try:
+        is_ok, count = check_word_count(user_text)
+        if not is_ok:
+            yield get_fallback_message("Limit Exceeded", f"Text is {count} words.")
+            return
+        requested = resolve_engine(engine)
+        if requested is None:
+            yield get_fallback_message("Error", "Unknown Engine")
+            return
+        setup_error = get_engine_setup_error(requested) if requested != ENGINE_AUTO else None
+        if setup_error:
+            yield get_fallback_message("Setup Error", setup_error)
+            return
+        ticket = admission.new_ticket(session, tool)
+        if waiting is not None: waiting.append(ticket)
+        busy_code, busy = "Queue Full", None
+        try:
+            await admission.acquire(ticket)
+            while True:
+                engine_key, started, retry_after = await route_engine_async(requested), False, None
+                if engine_key is None:
+                    busy_code, busy = ENGINE_BUSY_CODES[requested], "Circuit open or rate limit reached on every engine"
+                else:
+                    try:
+                        if hedge and get_hedge_candidates(engine_key):
+                            stream = stream_hedged_async(engine_key, system_prompt, user_text, max_tokens)
+                        else:
+                            stream = _timed_stream_async(engine_key, system_prompt, user_text, max_tokens)
+                        async with aclosing(stream):
+                            async for chunk in stream:
+                                started = True
+                                yield chunk
+                        return
+                    except Exception as e:
+                        # Only an overload before the first chunk is worth waiting out
+                        if started or not is_overload_error(e):
+                            yield get_fallback_message(ENGINE_BUSY_CODES[engine_key], str(e))
+                            return
+                        busy_code, busy, retry_after = ENGINE_BUSY_CODES[engine_key], str(e), get_retry_after(e)
+                await admission.retry(ticket, retry_after)
+        except QueueFull as e:
+            yield get_fallback_message(busy_code, f"{e}. {busy}" if busy else str(e))
+        finally:
+            admission.release(ticket)
+    except Exception as e:
+        yield get_fallback_message("System Crash", str(e))
+
+async def stream_ai_response_async(system_prompt, user_text, engine, tool="", hedge=None, max_tokens=None, session=None, waiting=None,
+                                   key_text=None):
+    # Yields text chunks as they arrive. Identical requests (same tool, prompt, text and engine)
+    # are served from cache or wait on the one in-flight call instead of hitting the provider again;
+    # near-identical ones reuse the closest cached answer. key_text stands in for user_text in the
+    # cache and near-duplicate keys (the Devanagari reading of Hinglish input, see prepare_input).
+    system_prompt, user_text = clean_text(system_prompt), clean_text(user_text)
+    key_text = clean_text(key_text) if key_text else user_text
+    key = make_key(tool, system_prompt, key_text, engine, max_tokens)
+    timer = REQUEST_SECONDS.time(tool=tool, source="cache").start()
+    # Opening the stores, SQLite reads and the MinHash scoring run on worker threads, off the shared loop
+    cache = await asyncio.to_thread(get_response_cache)
+    while True:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            CACHE_LOOKUPS.inc(result="hit")
+            timer.stop()
+            yield cached
+            return
+        flight, leader = cache.lead(key)
+        if leader:
+            break
+        # Shielded: a follower that gives up must not cancel the flight for the others
+        await asyncio.shield(flight.done)
+        if flight.result is not None:
+            CACHE_LOOKUPS.inc(result="coalesced")
+            timer.stop()
+            yield flight.result
+            return
+    try:
+        group, match = await asyncio.to_thread(_find_near_duplicate, tool, system_prompt, engine, max_tokens, key_text)
+        cached = await asyncio.to_thread(cache.get, match[0]) if match and NEAR_DUPLICATE_REUSE else None
+    except BaseException:
+        # Cancelled while leading: release the followers so they retry
+        cache.finish(key, flight)
+        raise
+    if cached is not None:
+        # Stored under this key too, so the next identical request is an exact hit
+        cache.finish(key, flight, cached, writer=cache_writer)
+        CACHE_LOOKUPS.inc(result="near")
+        timer.stop()
+        yield cached
+        return
+    CACHE_LOOKUPS.inc(result="miss")
+    timer.labels["source"] = "provider"
+
+    parts, complete = [], False
+    try:
+        stream = _stream_uncached_async(system_prompt, user_text, engine, HEDGE_REQUESTS if hedge is None else hedge,
+                                        max_tokens, tool, session, waiting)
+        async with aclosing(stream):
+            async for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        complete = True
+    finally:
+        # An abandoned stream releases its followers without a result so they retry
+        result = "".join(parts) if complete else None
+        stored = complete and not is_fallback_message(result)
+        cache.finish(key, flight, result, store=stored, writer=cache_writer)
+        if stored: cache_writer.submit(get_near_index().add, group, key_text, key)
+        if complete: timer.stop()
+
+async def get_ai_response_async(system_prompt, user_text, engine, tool="", hedge=None, max_tokens=None, session=None, waiting=None,
+                                key_text=None):
+    parts = []
+    async with aclosing(stream_ai_response_async(system_prompt, user_text, engine, tool, hedge, max_tokens, session, waiting,
+                                                 key_text)) as stream:
+        async for chunk in stream:
+            parts.append(chunk)
+    return "".join(parts)
+
+def stream_ai_response(system_prompt, user_text, engine, tool="", hedge=None, max_tokens=None, on_wait=None, key_text=None):
+    # on_wait(place) is called while the request waits for a slot (place is None once it has one)
+    waiting = []
+    return iter_async(stream_ai_response_async(system_prompt, user_text, engine, tool, hedge, max_tokens,
+                                               get_session_id(), waiting, key_text), _queue_watcher(on_wait, waiting))
+
+def get_ai_response(system_prompt, user_text, engine, tool="", hedge=None, max_tokens=None, key_text=None):
+    return run_async(get_ai_response_async(system_prompt, user_text, engine, tool, hedge, max_tokens, get_session_id(),
+                                           key_text=key_text))
+
+def tee_stream(chunks, parts):
+    # For st.write_stream: collects every chunk into parts but only shows plain text live
+    for chunk in chunks:
+        parts.append(chunk)
+        if not is_fallback_message(chunk):
+            yield chunk
+
+# --- LONG DOCUMENT MODE ---
+# Texts above MAX_WORD_LIMIT are split at sentence boundaries and analysed chunk by chunk
+# in parallel (spread across configured engines), then merged into one report.
+CHUNK_WORDS = 300
+LONG_DOC_WORKERS = 12
+SENTENCE_END = re.compile(r"(?<=[।॥?!.])\s+|\n+")
+JSON_BLOCK = re.compile(r"\{.*\}", re.DOTALL)
+
+CHUNK_PROMPT = """You are 'Nirmal-Bhasha'. Find foreign words (Urdu, English, Persian) in this part of a longer document
+and rewrite it in Practical Pure Hindi (readable Tatsam, no obscure Sanskrit).
+Known corrections for this part:
+{rules}
+Reply ONLY with JSON: {{"foreign_words": [{{"word": "...", "origin": "...", "replacement": "..."}}], "refined": "..."}}"""
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_END.split(text or "") if s and s.strip()]
+
+def chunk_text(text, max_words=CHUNK_WORDS):
+    chunks, current, count = [], [], 0
+    for sentence in split_sentences(text):
+        words = sentence.split()
+        # A single run-on sentence longer than a chunk is cut at word boundaries
+        while len(words) > max_words:
+            if current:
+                chunks.append(" ".join(current)); current, count = [], 0
+            chunks.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        if count + len(words) > max_words and current:
+            chunks.append(" ".join(current)); current, count = [], 0
+        current.append(" ".join(words))
+        count += len(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def _parse_chunk_result(output):
+    match = JSON_BLOCK.search(output or "")
+    if match:
+        try:
+            data = json.loads(match.group(0))
+            return data.get("foreign_words") or [], data.get("refined") or ""
+        except ValueError:
+            pass
+    return [], output or ""
+
+async def _analyze_chunk_async(chunk, reading, engine, tool, limit, session, waiting):
+    async with limit:
+        output = await get_ai_response_async(CHUNK_PROMPT.format(rules=load_correction_rules(reading)), chunk, engine, tool=tool,
+                                             session=session, waiting=waiting, key_text=reading)
+    if is_fallback_message(output):
+        return None, output
+    return _parse_chunk_result(output), None
+
+async def _analyze_chunks_async(chunks, readings, engines, tool, max_workers, session, waiting):
+    limit = asyncio.Semaphore(max(1, max_workers))
+    return await asyncio.gather(*[_analyze_chunk_async(chunk, reading, engines[i % len(engines)], tool, limit, session, waiting)
+                                  for i, (chunk, reading) in enumerate(zip(chunks, readings))])
+
+def get_long_document_engines(engine):
+    primary = resolve_engine(engine)
+    others = get_configured_engines(exclude=primary)
+    return [engine] + [ENGINE_LABELS[k] for k in others]
+
+def analyze_long_document(text, engine, tool="Nirmal-Bhasha", spread_engines=True, max_workers=LONG_DOC_WORKERS, on_wait=None,
+                          scan=None):
+    # on_wait(place) is called while any part waits for a slot, as in stream_ai_response;
+    # scan is the caller's scan of the text's reading, as in analyze_purity
+    chunks = chunk_text(text)
+    # Transliterated here, off the event loop; the engines are sent the original chunks
+    readings = [prepare_input(chunk)[0] for chunk in chunks]
+    engines = get_long_document_engines(engine) if spread_engines else [engine]
+    session, waiting = get_session_id(), []
+    if session is not None:
+        # A busy server lets one session queue only session_queued requests; more parts in
+        # flight would be turned away with the fallback card instead of waiting their turn
+        max_workers = min(max_workers, admission.session_queued)
+    results = wait_async(_analyze_chunks_async(chunks, readings, engines, tool, max_workers, session, waiting),
+                         _queue_watcher(on_wait, waiting))
+
+    # Scored like every other report: the lexicon scan of the whole text's reading. Words only the
+    # engines found are listed separately, as the LLM part of a short report does, not scored.
+    scan = scan or scan_purity(prepare_input(text)[0])
+    known = {e["rule"].get("word", "").lower() for e in scan["found"]}
+    known |= {f.lower() for e in scan["found"] for f in e["surfaces"]}
+    extra, refined, failures = {}, [], []
+    for chunk, (parsed, fallback) in zip(chunks, results):
+        if parsed is None:
+            refined.append(chunk)
+            failures.append(fallback)
+            continue
+        words, rewritten = parsed
+        refined.append(rewritten.strip() or chunk)
+        for item in words:
+            word = str(item.get("word", "")).strip() if isinstance(item, dict) else ""
+            if word and word.lower() not in known:
+                extra.setdefault(word.lower(), (word, item.get("origin", ""), item.get("replacement", "")))
+
+    report = [
+        f"📚 **Long Document Mode:** {scan['total_words']} words analysed in {len(chunks)} parts.",
+        "",
+        build_purity_report(scan),
+        "",
+    ]
+    if extra:
+        report += ["### 🔍 Other Foreign Words", "", "| Word | Origin | Pure Hindi |", "|---|---|---|"]
+        report += [f"| {word} | {origin} | {replacement} |" for word, origin, replacement in extra.values()]
+        report.append("")
+    report += [
+        "### ✨ Refined Text (व्यावहारिक शुद्ध हिंदी)",
+        "",
+        "\n\n".join(refined),
+    ]
+    if failures:
+        report += ["", f"⚠️ {len(failures)} of {len(chunks)} parts could not be refined and are shown unchanged.", failures[0]]
+    return "\n".join(report)
+
+# --- ESSAY PIPELINE ---
+# Long essays are planned first (a short outline call), then Prastavana, each Vishay Vastu
+# sub-section and Upsanghar are written in parallel and stitched in outline order.
+# Wall-clock time is the outline plus the slowest section, and no single call's token cap
+# limits the essay's length. Sections are cached individually, so a retry after a failed
+# section only regenerates that one.
+ESSAY_PIPELINE_LENGTHS = ("Long (800+)",)
+ESSAY_WORDS = 1000
+ESSAY_OUTLINE_MAX_TOKENS = 400
+ESSAY_SECTION_MAX_TOKENS = 1500
+
+ESSAY_OUTLINE_PROMPT = """You are 'Acharya Nibandh'. Plan a Hindi essay on '{topic}'. Level: {level}, Style: {style}.
+Reply ONLY with JSON, headings and points in Shuddh Hindi:
+{{"prastavana": "points for the introduction", "sections": [{{"heading": "...", "points": "..."}}], "upsanghar": "points for the conclusion"}}
+Give 3 to 5 Vishay Vastu sections, each with 2-3 short points."""
+
+ESSAY_SECTION_PROMPT = """You are 'Acharya Nibandh', writing one part of a Hindi essay on '{topic}'. Level: {level}, Style: {style}.
+Essay outline:
+{outline}
+Write ONLY the part "{heading}" in about {words} words, covering: {points}
+No heading, do not repeat the other parts. Language: Shuddh Hindi (No English)."""
+
+def uses_essay_pipeline(word_limit):
+    return word_limit in ESSAY_PIPELINE_LENGTHS
+
+def _parse_essay_outline(output):
+    # [(heading, points), ...] from Prastavana to Upsanghar, or None if the reply is not a usable outline
+    match = JSON_BLOCK.search(output or "")
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    sections = [(str(s.get("heading", "")).strip(), str(s.get("points", "")).strip())
+                for s in data.get("sections") or [] if isinstance(s, dict)]
+    sections = [s for s in sections if s[0]][:5]
+    if not sections:
+        return None
+    return [("प्रस्तावना", str(data.get("prastavana", "")))] + sections + [("उपसंहार", str(data.get("upsanghar", "")))]
+
+def get_essay_outline(topic, level, style, key_points, engine):
+    prompt = ESSAY_OUTLINE_PROMPT.format(topic=topic, level=level, style=style)
+    output = get_ai_response(prompt, build_nibandh_input(topic, key_points), engine, tool="Nibandh-Lekhan",
+                             max_tokens=ESSAY_OUTLINE_MAX_TOKENS)
+    return None if is_fallback_message(output) else _parse_essay_outline(output)
+
+def _essay_section_words(outline, index):
+    # Introduction and conclusion get a fixed share, the body splits the rest
+    if index in (0, len(outline) - 1):
+        return ESSAY_WORDS // 8
+    return (ESSAY_WORDS - 2 * (ESSAY_WORDS // 8)) // (len(outline) - 2)
+
+def iter_essay_sections(outline, topic, level, style, key_points, engine):
+    # Yields (index, text) in completion order so the page can fill each slot as soon as it is ready
+    plan = "\n".join(f"{i + 1}. {heading}" for i, (heading, _) in enumerate(outline))
+    user_text, session = build_nibandh_input(topic, key_points), get_session_id()
+    futures = {
+        submit_async(get_ai_response_async(ESSAY_SECTION_PROMPT.format(
+            topic=topic, level=level, style=style, outline=plan, heading=heading,
+            words=_essay_section_words(outline, i), points=points or heading,
+        ), user_text, engine, "Nibandh-Lekhan", max_tokens=ESSAY_SECTION_MAX_TOKENS, session=session)): i
+        for i, (heading, points) in enumerate(outline)
+    }
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+def format_essay_section(heading, text):
+    return f"### {heading}\n\n{text.strip()}"
+
+def stitch_essay(topic, outline, texts):
+    # texts: {index: section text}. Any failed section fails the essay (its fallback is returned)
+    for i in range(len(outline)):
+        if is_fallback_message(texts.get(i)):
+            return texts[i]
+    return "\n\n".join([f"## {topic}"] + [format_essay_section(h, texts.get(i, "")) for i, (h, _) in enumerate(outline)])
+
+def compose_essay(topic, level, style, word_limit, key_points, engine):
+    # Non-streaming Nibandh-Lekhan, used by batch.py
+    if uses_essay_pipeline(word_limit):
+        outline = get_essay_outline(topic, level, style, key_points, engine)
+        if outline:
+            return stitch_essay(topic, outline, dict(iter_essay_sections(outline, topic, level, style, key_points, engine)))
+    return get_ai_response(build_nibandh_prompt(topic, level, style, word_limit), build_nibandh_input(topic, key_points),
+                           engine, tool="Nibandh-Lekhan")